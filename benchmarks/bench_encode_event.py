@@ -0,0 +1,83 @@
+"""
+Microbenchmark of `encode_event` against the previous encoder
+(`model_dump()` followed by the recursive `convert_dict_to_camel_case`),
+and of the serialized size of the JSON and msgpack `agui_event` frames.
+
+Run with:
+    uv run python -m benchmarks.bench_encode_event
+"""
+import json
+import timeit
+from typing import Any
+from ag_ui.core import (
+    EventType,
+    TextMessageContentEvent,
+    ToolCallArgsEvent,
+    RunStartedEvent,
+    CustomEvent
+)
+from ag_ui.core.events import Event
+
+from src.agui_util import encode_event, convert_dict_to_camel_case
+from src.agui_codec import decode_msgpack_frame, encode_msgpack_frame
+from src.outbound import build_agui_payload
+
+
+def legacy_encode_event(event: Event) -> dict[str, Any]:
+    return convert_dict_to_camel_case(event.model_dump())
+
+
+EVENTS: dict[str, Event] = {
+    "TextMessageContentEvent": TextMessageContentEvent(
+        type=EventType.TEXT_MESSAGE_CONTENT,
+        message_id="run-1",
+        delta="Hello"
+    ),
+    "ToolCallArgsEvent": ToolCallArgsEvent(
+        type=EventType.TOOL_CALL_ARGS,
+        tool_call_id="call-1",
+        delta='{"cv_url": "',
+        raw_event={"message_id": "run-1"}
+    ),
+    "RunStartedEvent": RunStartedEvent(
+        type=EventType.RUN_STARTED,
+        thread_id="thread-1",
+        run_id="run-1",
+        raw_event={
+            "metadata": {"langgraph_node": "agent", "checkpoint_ns": "agent:1"},
+            "tags": ["graph:step:1"],
+            "parent_run_id": "None",
+            "run_id": "run-1"
+        }
+    ),
+    "CustomEvent": CustomEvent(
+        type=EventType.CUSTOM,
+        name="progress_event",
+        value={"progress": 0.5, "strategy": "replace", "message": "The progress is 50%"}
+    ),
+}
+
+
+def main(number: int = 20000):
+    print(f"{'event':<26}{'legacy (us)':>14}{'encode (us)':>14}{'speedup':>10}")
+    for name, event in EVENTS.items():
+        assert encode_event(event) == legacy_encode_event(event), f"{name} encodes differently"
+
+        legacy = timeit.timeit(lambda: legacy_encode_event(event), number=number) / number * 1e6
+        current = timeit.timeit(lambda: encode_event(event), number=number) / number * 1e6
+        print(f"{name:<26}{legacy:>14.2f}{current:>14.2f}{legacy / current:>9.1f}x")
+
+    # Frames as sent on the socket, the JSON one is serialized by the socket.io client
+    print(f"\n{'event':<26}{'json (us)':>12}{'msgpack (us)':>14}{'json (B)':>10}{'msgpack (B)':>13}")
+    for name, event in EVENTS.items():
+        payload = build_agui_payload("thread-1", "session-1", event, 1)
+        frame = encode_msgpack_frame("thread-1", "session-1", event, 1)
+        assert decode_msgpack_frame(frame) == payload, f"{name} decodes differently"
+
+        json_time = timeit.timeit(lambda: json.dumps(build_agui_payload("thread-1", "session-1", event, 1)), number=number) / number * 1e6
+        msgpack_time = timeit.timeit(lambda: encode_msgpack_frame("thread-1", "session-1", event, 1), number=number) / number * 1e6
+        print(f"{name:<26}{json_time:>12.2f}{msgpack_time:>14.2f}{len(json.dumps(payload).encode('utf-8')):>10}{len(frame):>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+End-to-end benchmark of the serve path (broker -> handler -> graph -> llm stream -> AG-UI events -> runtime)
+with the example graphs, using the local stand-ins of `benchmarks.fakes` for the runtime, RabbitMQ and the llm.
+
+Run with:
+    uv run python -m benchmarks.bench_serve
+    uv run python -m benchmarks.bench_serve --graphs simple_agent --concurrency 1 8 32 --tasks 200 --tokens-per-second 0
+    uv run python -m benchmarks.bench_serve --agui-codec msgpack
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import ModuleType
+from typing import Any, Callable
+from unittest import mock
+
+import aio_pika
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph.state import CompiledStateGraph
+
+from examples.simple_agent import graph as simple_agent
+from examples.no_stream_mode import graph as no_stream_mode
+from examples.agent_with_base_tool_sub_class import graph as agent_with_base_tool_sub_class
+from examples.agent_with_client_tool_call import graph as agent_with_client_tool_call
+from examples.custom_event_graph import graph as custom_event_graph
+from src import LoggingConfig, MessageEvent, RabbitMQConfig, SocketConfig, default_message_handler, init_runtime, model_registry
+
+from .fakes import FakeBroker, FakeRuntimeServer, FakeStreamingChatModel
+
+NAMESPACE = "benchmark"
+NAMESPACE_API_KEY = "benchmark-secret"
+RUNTIME_ENDPOINT = "http://fake-runtime"
+
+GRAPHS: dict[str, ModuleType] = {
+    "simple_agent": simple_agent,
+    "no_stream_mode": no_stream_mode,
+    "agent_with_base_tool_sub_class": agent_with_base_tool_sub_class,
+    "agent_with_client_tool_call": agent_with_client_tool_call,
+    # Sleeps about 10s per task by design, only useful at high concurrency
+    "custom_event_graph": custom_event_graph,
+}
+DEFAULT_GRAPHS = ["simple_agent", "no_stream_mode", "agent_with_base_tool_sub_class"]
+
+
+@dataclass
+class LevelResult:
+    graph: str
+    concurrency: int
+    tasks: int
+    failed: int
+    elapsed: float
+    latencies: list[float]
+    events: int
+    out_of_order: int
+    payload_bytes: int
+    content_events: int
+
+    @property
+    def tasks_per_second(self) -> float:
+        return self.tasks / self.elapsed
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.elapsed
+
+    @property
+    def bytes_per_event(self) -> float:
+        return self.payload_bytes / self.events if self.events else 0.0
+
+    def percentile(self, percent: float) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[int(percent) - 1]
+
+
+def fake_chat_model_factory(tokens_per_second: float, response_tokens: int) -> Callable[..., FakeStreamingChatModel]:
+    def init_chat_model(*args: Any, **kwargs: Any) -> FakeStreamingChatModel:
+        return FakeStreamingChatModel(tokens_per_second=tokens_per_second, response_tokens=response_tokens, streaming=kwargs.get("streaming", True))
+    return init_chat_model
+
+
+def task_body(thread_id: str, message: dict[str, Any], agent_name: str) -> bytes:
+    return json.dumps({
+        "namespace": NAMESPACE,
+        "agentName": agent_name,
+        "sentAt": datetime.now(timezone.utc).isoformat(),
+        "message": {
+            "id": message["id"],
+            "thread": thread_id,
+            "content": message["content"],
+            "role": "user"
+        },
+        "config": {}
+    }).encode("utf-8")
+
+
+async def run_level(graph_name: str, concurrency: int, tasks: int, logging_config: LoggingConfig | None = None, agui_codec: str = "json") -> LevelResult:
+    server = FakeRuntimeServer(NAMESPACE, NAMESPACE_API_KEY, agui_codecs=[agui_codec])
+    broker = FakeBroker()
+
+    graph: CompiledStateGraph[Any, Any, Any] = GRAPHS[graph_name].get_graph(checkpointer=MemorySaver())
+    runtime = init_runtime(
+        namespace=NAMESPACE,
+        namespace_api_key=NAMESPACE_API_KEY,
+        runtime_endpoint=RUNTIME_ENDPOINT,
+        socket_config=SocketConfig(url=RUNTIME_ENDPOINT, transport_mode="async"),
+        agents={graph_name: graph},
+        max_concurrent_workers=concurrency,
+        rabbitmq_config=RabbitMQConfig(url="amqp://fake-broker"),
+        logging_config=logging_config
+    )
+    server.attach(runtime)
+
+    queue_name = f"tasks_queue:{NAMESPACE}"
+    for index in range(tasks):
+        thread_id = f"{graph_name}-{concurrency}-{index}"
+        message = server.seed_thread(thread_id, "Hi, please scan my CV at https://example.com/cv.pdf")
+        broker.publish(queue_name, task_body(thread_id, message, graph_name))
+
+    latencies: list[float] = []
+    failed = 0
+    finished = asyncio.Event()
+
+    async def handler(agent: CompiledStateGraph[Any, Any, Any], event: MessageEvent) -> bool:
+        nonlocal failed
+        started_at = time.perf_counter()
+        success = await default_message_handler(agent, event)
+        latencies.append(time.perf_counter() - started_at)
+        if not success:
+            failed += 1
+        if len(latencies) == tasks:
+            finished.set()
+        return success
+
+    with mock.patch.object(aio_pika, "connect_robust", broker.connect_robust):
+        started_at = time.perf_counter()
+        serve_task = asyncio.create_task(runtime.serve(handler))
+        await finished.wait()
+        elapsed = time.perf_counter() - started_at
+
+        serve_task.cancel()
+        await asyncio.gather(serve_task, return_exceptions=True)
+
+    return LevelResult(
+        graph_name, concurrency, tasks, failed, elapsed, latencies, server.events, server.out_of_order, server.payload_bytes,
+        server.events_by_type.get("TEXT_MESSAGE_CONTENT", 0)
+    )
+
+
+async def run(graphs: list[str], concurrency_levels: list[int], tasks: int, tokens_per_second: float, response_tokens: int, verbose: bool, agui_codec: str):
+    chat_model = fake_chat_model_factory(tokens_per_second, response_tokens)
+    # The sdk logs every task at the info level, filtered out like in production unless --verbose
+    logging_config = LoggingConfig(level="DEBUG" if verbose else "WARNING")
+    print(f"{'graph':<32}{'workers':>8}{'tasks':>7}{'failed':>7}{'tasks/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'events/s':>11}{'bytes/ev':>10}")
+
+    for graph_name in graphs:
+        for concurrency in concurrency_levels:
+            # Some example graphs print their responses
+            with open(os.devnull, "w") as devnull, \
+                    contextlib.redirect_stdout(sys.stdout if verbose else devnull), \
+                    mock.patch.object(model_registry, "init_chat_model", chat_model):
+                result = await run_level(graph_name, concurrency, tasks, logging_config, agui_codec)
+
+            print(
+                f"{graph_name:<32}{concurrency:>8}{result.tasks:>7}{result.failed:>7}{result.tasks_per_second:>10.1f}"
+                f"{result.percentile(50) * 1000:>10.1f}{result.percentile(99) * 1000:>10.1f}{result.events_per_second:>11.0f}"
+                f"{result.bytes_per_event:>10.1f}"
+            )
+            if result.out_of_order:
+                print(f"  {result.out_of_order} AG-UI events arrived out of order", file=sys.stderr)
+            if not result.content_events:
+                # The llm did not stream, the token path this benchmark measures was never exercised
+                raise SystemExit(f"{graph_name}: no TEXT_MESSAGE_CONTENT event received, the chat model did not stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graphs", nargs="+", default=DEFAULT_GRAPHS, choices=list(GRAPHS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--tasks", type=int, default=100, help="tasks per graph and concurrency level")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="llm token rate, 0 streams without delay")
+    parser.add_argument("--response-tokens", type=int, default=40, help="tokens per llm response")
+    parser.add_argument("--agui-codec", default="json", choices=["json", "msgpack"], help="codec the fake runtime accepts for the agui_event frames")
+    parser.add_argument("--verbose", action="store_true", help="show the sdk output")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.graphs, args.concurrency, args.tasks, args.tokens_per_second, args.response_tokens, args.verbose, args.agui_codec))
+
+
+if __name__ == "__main__":
+    main()
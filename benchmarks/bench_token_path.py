@@ -0,0 +1,304 @@
+"""
+Microbenchmark of the per-token callback hot path, driven by synthetic `ChatGenerationChunk` streams.
+
+Every stage is measured per streamed chunk, in CPU time and in bytes allocated:
+    encode       build_agui_payload (encode_event and the frame) of the events the handler produces
+    send         runtime.asend_agui_event with a no-op socket (encode, metrics and the emit call)
+    handler      on_llm_new_token down to the no-op socket, one event per token
+    coalesced    on_llm_new_token with text token coalescing enabled
+
+The costs can be compared against a stored baseline, the run fails when a stage grows past the tolerance.
+CPU times are compared relative to a pure python reference workload timed in the same run, which absorbs most of
+the difference between machines and runs. The baseline still depends on the installed versions, record it where the check runs.
+
+Run with:
+    uv run python -m benchmarks.bench_token_path --save-baseline
+    uv run python -m benchmarks.bench_token_path --check
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from ag_ui.core.events import Event
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+from src import JarvisKitCallbackHandler, SocketConfig, StreamConfig
+from src.jarvis_runtime import JarvisKitRuntime
+from src.outbound import build_agui_payload
+
+from .fakes import LOREM, FakeStreamingChatModel
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), ".baselines", "token_path.json")
+THREAD_ID = "thread-1"
+SESSION_ID = "session-1"
+
+
+def text_stream(tokens: int) -> list[ChatGenerationChunk]:
+    chunks = [ChatGenerationChunk(message=AIMessageChunk(content=f"{LOREM[i % len(LOREM)]} ")) for i in range(tokens)]
+    chunks.append(ChatGenerationChunk(message=AIMessageChunk(content=""), generation_info={"finish_reason": "stop"}))
+    return chunks
+
+
+def tool_call_stream(args_chunks: int) -> list[ChatGenerationChunk]:
+    arguments = json.dumps({"cv_url": "https://example.com/cv.pdf", "sections": ["experience", "education", "skills"]})
+    size = max(1, -(-len(arguments) // args_chunks))
+    return [
+        FakeStreamingChatModel._tool_call_chunk("call_1", "scan_cv", ""),
+        *(FakeStreamingChatModel._tool_call_chunk(None, None, arguments[start:start + size]) for start in range(0, len(arguments), size)),
+        ChatGenerationChunk(message=AIMessageChunk(content=""), generation_info={"finish_reason": "tool_calls"})
+    ]
+
+
+STREAMS: dict[str, list[ChatGenerationChunk]] = {
+    "text": text_stream(200),
+    "tool_call": tool_call_stream(40),
+    # Explain, then call a tool, the shape of most agent turns
+    "mixed": text_stream(50)[:-1] + tool_call_stream(20),
+}
+
+
+class NoopSocket:
+    """Stand-in for the async socket.io client that drops every frame"""
+
+    async def emit(self, event: str, data: Any = None):
+        pass
+
+
+def create_runtime(stream_config: StreamConfig | None = None) -> JarvisKitRuntime:
+    # The async transport does not connect before serve(), so the runtime can be created offline
+    runtime = JarvisKitRuntime(
+        namespace="benchmark",
+        namespace_api_key="benchmark-secret",
+        runtime_endpoint="http://fake-runtime",
+        socket_config=SocketConfig(url="http://fake-runtime", transport_mode="async"),
+        agents={},
+        stream_config=stream_config
+    )
+    runtime.sio = NoopSocket()  # type: ignore[assignment]
+    return runtime
+
+
+async def start_handler(runtime: JarvisKitRuntime, run_id: uuid.UUID) -> JarvisKitCallbackHandler:
+    handler = JarvisKitCallbackHandler(runtime, THREAD_ID)
+    handler.root_run_id = uuid.uuid4()
+    await handler.on_chat_model_start({}, [], run_id=run_id, metadata={"ls_model_name": "benchmark"})
+    return handler
+
+
+async def capture_events(chunks: list[ChatGenerationChunk]) -> list[Event]:
+    """Events the handler sends for a stream, one per chunk at most"""
+    runtime = create_runtime()
+    events: list[Event] = []
+
+    async def asend_agui_event(thread_id: str, session_id: str, event: Event, order: int):
+        events.append(event)
+
+    runtime.asend_agui_event = asend_agui_event  # type: ignore[method-assign]
+    run_id = uuid.uuid4()
+    handler = await start_handler(runtime, run_id)
+    events.clear()
+    for chunk in chunks:
+        await handler.on_llm_new_token(chunk.text, chunk=chunk, run_id=run_id)
+    return events
+
+
+# A step processes the index-th chunk of the stream
+Step = Callable[[int], Awaitable[Any]]
+
+
+async def encode_steps(chunks: list[ChatGenerationChunk]) -> Step:
+    events = await capture_events(chunks)
+    # Chunks without an event (the empty text tokens) cost nothing in this stage
+    padded: list[Event | None] = [*events, *([None] * (len(chunks) - len(events)))]
+
+    async def step(index: int):
+        event = padded[index]
+        if event is not None:
+            build_agui_payload(THREAD_ID, SESSION_ID, event, index)
+    return step
+
+
+async def send_steps(chunks: list[ChatGenerationChunk]) -> Step:
+    events = await capture_events(chunks)
+    padded: list[Event | None] = [*events, *([None] * (len(chunks) - len(events)))]
+    runtime = create_runtime()
+
+    async def step(index: int):
+        event = padded[index]
+        if event is not None:
+            await runtime.asend_agui_event(THREAD_ID, SESSION_ID, event, index)
+    return step
+
+
+def handler_steps(stream_config: StreamConfig) -> Callable[[list[ChatGenerationChunk]], Awaitable[Step]]:
+    async def create(chunks: list[ChatGenerationChunk]) -> Step:
+        runtime = create_runtime(stream_config)
+        run_id = uuid.uuid4()
+        handler = await start_handler(runtime, run_id)
+
+        async def step(index: int):
+            chunk = chunks[index]
+            await handler.on_llm_new_token(chunk.text, chunk=chunk, run_id=run_id)
+        return step
+    return create
+
+
+STAGES: dict[str, Callable[[list[ChatGenerationChunk]], Awaitable[Step]]] = {
+    "encode": encode_steps,
+    "send": send_steps,
+    "handler": handler_steps(StreamConfig()),
+    # A window long enough that only the byte threshold flushes during the run
+    "coalesced": handler_steps(StreamConfig(token_coalesce_window_ms=60_000, token_coalesce_max_bytes=256)),
+}
+
+
+@dataclass
+class StageResult:
+    ns_per_token: float
+    bytes_per_token: float
+
+
+async def measure_cpu(create: Callable[[list[ChatGenerationChunk]], Awaitable[Step]], chunks: list[ChatGenerationChunk], repeat: int) -> float:
+    """Best CPU time per chunk over `repeat` runs of the stream, each run on a fresh handler"""
+    best = float("inf")
+    # The first run warms up the caches and is not counted, the collector is paused like timeit does
+    for run_index in range(repeat + 1):
+        step = await create(chunks)
+        gc.disable()
+        try:
+            started_at = time.process_time_ns()
+            for index in range(len(chunks)):
+                await step(index)
+            elapsed = time.process_time_ns() - started_at
+        finally:
+            gc.enable()
+        if run_index > 0:
+            best = min(best, elapsed / len(chunks))
+    return best
+
+
+async def measure_allocations(create: Callable[[list[ChatGenerationChunk]], Awaitable[Step]], chunks: list[ChatGenerationChunk]) -> float:
+    """Mean bytes allocated per chunk, measured as the peak of traced memory during each step"""
+    step = await create(chunks)
+    # Warm up the caches (camelCase keys, metric label sets) so only the steady state is measured
+    for index in range(len(chunks)):
+        await step(index)
+
+    step = await create(chunks)
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for index in range(len(chunks)):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await step(index)
+            allocated += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return allocated / len(chunks)
+
+
+def reference_workload():
+    # Small dicts, strings and lists, the kind of work the hot path does
+    for index in range(200):
+        {"threadId": str(index), "event": {"delta": f"token {index}", "order": [index]}}
+
+
+def measure_reference(repeat: int) -> float:
+    """Best CPU time of the reference workload"""
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat + 1):
+            started_at = time.process_time_ns()
+            reference_workload()
+            best = min(best, time.process_time_ns() - started_at)
+    finally:
+        gc.enable()
+    return best
+
+
+@dataclass
+class Results:
+    reference_ns: float
+    streams: dict[str, dict[str, StageResult]]
+
+
+async def run(repeat: int) -> Results:
+    streams: dict[str, dict[str, StageResult]] = {}
+    reference_ns = measure_reference(repeat)
+    for stream_name, chunks in STREAMS.items():
+        for stage_name, create in STAGES.items():
+            streams.setdefault(stream_name, {})[stage_name] = StageResult(
+                ns_per_token=await measure_cpu(create, chunks, repeat),
+                bytes_per_token=await measure_allocations(create, chunks)
+            )
+    # Timed again at the end so a slow start of the process is not mistaken for a faster hot path
+    reference_ns = min(reference_ns, measure_reference(repeat))
+    return Results(reference_ns, streams)
+
+
+def check(results: Results, baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Stages whose cost grew past the baseline by more than `tolerance` (a fraction)"""
+    # CPU times scaled to the speed of the baseline run
+    scale = baseline["reference_ns"] / results.reference_ns
+    regressions: list[str] = []
+    for stream_name, stages in results.streams.items():
+        for stage_name, result in stages.items():
+            expected = baseline["streams"].get(stream_name, {}).get(stage_name)
+            if expected is None:
+                continue
+            for metric, value in asdict(result).items():
+                if metric == "ns_per_token":
+                    value *= scale
+                limit = expected[metric] * (1 + tolerance)
+                if value > limit:
+                    regressions.append(f"{stream_name}/{stage_name} {metric}: {value:.0f} > {limit:.0f} (baseline {expected[metric]:.0f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100, help="runs of each stream, the best cpu time is kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--check", action="store_true", help="exit with an error when a stage is slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed growth over the baseline, as a fraction")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.repeat))
+
+    print(f"{'stream':<12}{'stage':<12}{'cpu ns/token':>14}{'alloc B/token':>15}")
+    for stream_name, stages in results.streams.items():
+        for stage_name, result in stages.items():
+            print(f"{stream_name:<12}{stage_name:<12}{result.ns_per_token:>14.0f}{result.bytes_per_token:>15.0f}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(asdict(results), file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline at {args.baseline}, record one with --save-baseline")
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = check(results, json.load(file), args.tolerance)
+        if regressions:
+            print("Per-token cost regressions:", *regressions, sep="\n  ", file=sys.stderr)
+            sys.exit(1)
+        print(f"No stage grew more than {args.tolerance:.0%} over the baseline")
+
+
+if __name__ == "__main__":
+    main()
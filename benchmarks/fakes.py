@@ -0,0 +1,435 @@
+"""
+Local stand-ins for the services the runtime talks to, so the serve path can be benchmarked without network access:
+- `FakeRuntimeServer`: the agent runtime (Socket.IO events and the thread messages http api)
+- `FakeBroker`: RabbitMQ, patched in place of `aio_pika.connect_robust`
+- `FakeStreamingChatModel`: a deterministic chat model streaming tokens at a fixed rate
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Sequence, cast
+
+import aio_pika
+import httpx
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage, message_chunk_to_message
+from langchain_core.messages.ai import add_ai_message_chunks
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src import JarvisKitRuntime
+from src.agui_codec import decode_msgpack_frame
+
+
+# Runtime
+class FakeSocketClient:
+    """Replaces the runtime's socket.io client, events are delivered in-process to the fake runtime server"""
+
+    def __init__(self, server: "FakeRuntimeServer", handlers: dict[str, Callable[..., Any]]):
+        self.server = server
+        self.handlers = handlers
+        self.connected = False
+
+    def on(self, event: str, handler: Callable[..., Any]):
+        self.handlers[event] = handler
+
+    async def connect(self, **kwargs: Any):
+        self.connected = True
+        await self._trigger("connect")
+
+    async def disconnect(self):
+        self.connected = False
+        await self._trigger("disconnect")
+
+    async def emit(self, event: str, data: Any = None, callback: Callable[..., Any] | None = None):
+        if isinstance(data, bytes):
+            # Binary frames are sent as is by the real client
+            self.server.payload_bytes += len(data)
+            ack = self.server.receive(event, data)
+        else:
+            # The real client serializes every frame, keep that cost in the measurements
+            frame = json.dumps(data, default=str)
+            self.server.payload_bytes += len(frame.encode("utf-8"))
+            ack = self.server.receive(event, json.loads(frame))
+        if callback:
+            callback(ack)
+
+    async def _trigger(self, event: str, *args: Any):
+        handler = self.handlers.get(event)
+        if handler is None:
+            return
+        result = handler(*args)
+        if asyncio.iscoroutine(result):
+            await result
+
+
+class FakeRuntimeServer:
+    """
+    The agent runtime: accepts `join_agent_space` and `agui_event`, answers client tool calls with `client_response`
+    and serves `/agents/get-thread-messages` from the threads seeded by the benchmark.
+    The first of `agui_codecs` offered by the sdk at join_agent_space is picked for the agui_event frames.
+    """
+
+    def __init__(self, namespace: str, namespace_api_key: str, client_response_delay: float = 0.01, agui_codecs: Sequence[str] = ("json",)):
+        self.namespace = namespace
+        self.namespace_api_key = namespace_api_key
+        self.client_response_delay = client_response_delay
+        self.agui_codecs = agui_codecs
+
+        self.threads: dict[str, list[dict[str, Any]]] = {}
+        self.joined = False
+        self.client: FakeSocketClient | None = None
+
+        # Stats
+        self.events = 0
+        self.events_by_type: dict[str, int] = {}
+        self.payload_bytes = 0
+        self.out_of_order = 0
+        self.http_requests = 0
+        self._last_order: dict[str, int] = {}
+        # Tool calls waiting for their result. Every tool call is answered like a client tool,
+        # the runtime ignores the responses that no tool is waiting for
+        self._open_tool_calls: set[str] = set()
+
+    def attach(self, runtime: JarvisKitRuntime):
+        """Connect a runtime created with the async transport to this server instead of the network"""
+        handlers = dict(getattr(runtime.sio, "handlers", {}).get("/", {}))
+        self.client = FakeSocketClient(self, handlers)
+        runtime.sio = cast(Any, self.client)
+
+        transport = httpx.MockTransport(self.handle_http)
+        runtime._http_client = httpx.Client(transport=transport)
+        runtime._async_http_client = httpx.AsyncClient(transport=transport)
+
+    def seed_thread(self, thread_id: str, content: str) -> dict[str, Any]:
+        now = datetime.now(timezone.utc).isoformat()
+        message = {
+            "id": f"{thread_id}-message-{len(self.threads.get(thread_id, []))}",
+            "thread": thread_id,
+            "content": content,
+            "role": "user",
+            "createdAt": now,
+            "updatedAt": now
+        }
+        self.threads.setdefault(thread_id, []).append(message)
+        return message
+
+    # Socket.IO
+    def receive(self, event: str, data: Any) -> Any:
+        if event == "join_agent_space":
+            self.joined = data["name"] == self.namespace and data["api_key"] == self.namespace_api_key
+            codec = next((codec for codec in self.agui_codecs if codec in data.get("agui_codecs", ["json"])), "json")
+            return {"agui_codec": codec}
+        elif event == "agui_event":
+            self._receive_agui_event(decode_msgpack_frame(data) if isinstance(data, bytes) else data)
+        return None
+
+    def _receive_agui_event(self, data: dict[str, Any]):
+        self.events += 1
+        event = data["event"]
+        event_type = event["type"]
+        self.events_by_type[event_type] = self.events_by_type.get(event_type, 0) + 1
+
+        session_id = data["sessionId"]
+        if data["order"] <= self._last_order.get(session_id, -1):
+            self.out_of_order += 1
+        self._last_order[session_id] = data["order"]
+
+        if event_type == "TOOL_CALL_START":
+            self._open_tool_calls.add(event["toolCallId"])
+        elif event_type == "TOOL_CALL_END" and event["toolCallId"] in self._open_tool_calls:
+            asyncio.get_running_loop().call_later(self.client_response_delay, self._send_client_response, event["toolCallId"])
+        elif event_type == "TOOL_CALL_RESULT":
+            self._open_tool_calls.discard(event["toolCallId"])
+
+    def _send_client_response(self, tool_call_id: str):
+        # Like a user acting in the ui, the response is repeated until the tool result shows the agent received it
+        if tool_call_id not in self._open_tool_calls or self.client is None:
+            return
+
+        handler = self.client.handlers.get("client_response")
+        if handler:
+            handler({"toolCallId": tool_call_id, "response": {"success": True, "content": "Done by the client"}})
+        asyncio.get_running_loop().call_later(self.client_response_delay * 10, self._send_client_response, tool_call_id)
+
+    # Http
+    def handle_http(self, request: httpx.Request) -> httpx.Response:
+        self.http_requests += 1
+        if request.url.path != "/agents/get-thread-messages":
+            return httpx.Response(404, json={"success": False, "message": "Not found"})
+        if request.headers.get("x-agent-namespace-secret") != self.namespace_api_key:
+            return httpx.Response(401, json={"success": False, "message": "Unauthorized"})
+
+        thread_id = request.url.params.get("threadId", "")
+        limit = int(request.url.params.get("limit", 30))
+        updated_after = request.url.params.get("updatedAfter")
+
+        messages = self.threads.get(thread_id, [])
+        if updated_after:
+            messages = [message for message in messages if message["updatedAt"] > updated_after]
+        return httpx.Response(200, json={"success": True, "data": messages[-limit:], "nextCursor": None})
+
+    def reset_stats(self):
+        self.events = 0
+        self.events_by_type = {}
+        self.out_of_order = 0
+        self.http_requests = 0
+
+
+# Broker
+class FakeIncomingMessage:
+    def __init__(self, queue: "FakeQueue", body: bytes, headers: dict[str, Any]):
+        self.queue = queue
+        self.body = body
+        self.headers = headers
+        self.processed = False
+
+    @asynccontextmanager
+    async def process(self, requeue: bool = False, ignore_processed: bool = False) -> AsyncIterator["FakeIncomingMessage"]:
+        try:
+            yield self
+        except Exception:
+            if not self.processed:
+                await self.reject(requeue=requeue)
+            raise
+        else:
+            if not self.processed and not ignore_processed:
+                await self.ack()
+
+    async def ack(self):
+        self._settle()
+
+    async def reject(self, requeue: bool = False):
+        self._settle()
+        if requeue:
+            self.queue.put(self.body, self.headers)
+
+    def _settle(self):
+        if self.processed:
+            raise RuntimeError("Message already processed")
+        self.processed = True
+        self.queue.channel.release()
+
+
+class FakeQueue:
+    def __init__(self, channel: "FakeChannel", name: str, arguments: dict[str, Any] | None):
+        self.channel = channel
+        self.name = name
+        self.arguments = arguments or {}
+        self.messages: deque[tuple[bytes, dict[str, Any]]] = deque()
+        self.consumer: Callable[[FakeIncomingMessage], Awaitable[None]] | None = None
+
+    def put(self, body: bytes, headers: dict[str, Any]):
+        self.messages.append((body, headers))
+        self.channel.deliver()
+
+    async def consume(self, callback: Callable[[FakeIncomingMessage], Awaitable[None]]):
+        self.consumer = callback
+        self.channel.deliver()
+
+
+class FakeExchange:
+    def __init__(self, broker: "FakeBroker"):
+        self.broker = broker
+
+    async def publish(self, message: aio_pika.Message, routing_key: str):
+        self.broker.publish(routing_key, message.body, dict(message.headers or {}), message.expiration)
+
+
+class FakeChannel:
+    def __init__(self, broker: "FakeBroker"):
+        self.broker = broker
+        self.default_exchange = FakeExchange(broker)
+        self.prefetch_count = 0
+        self.unacked = 0
+        self.is_closed = False
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def set_qos(self, prefetch_count: int = 0):
+        self.prefetch_count = prefetch_count
+        self.deliver()
+
+    async def declare_queue(self, name: str, durable: bool = False, arguments: dict[str, Any] | None = None) -> FakeQueue:
+        return self.broker.declare_queue(self, name, arguments)
+
+    def deliver(self):
+        for queue in self.broker.queues.values():
+            while queue.consumer and queue.messages and (self.prefetch_count == 0 or self.unacked < self.prefetch_count):
+                body, headers = queue.messages.popleft()
+                self.unacked += 1
+                task = asyncio.get_running_loop().create_task(queue.consumer(FakeIncomingMessage(queue, body, headers)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    def release(self):
+        self.unacked -= 1
+        self.deliver()
+
+    async def close(self):
+        self.is_closed = True
+
+
+class FakeConnection:
+    def __init__(self, broker: "FakeBroker"):
+        self.broker = broker
+        self.is_closed = False
+
+    async def channel(self) -> FakeChannel:
+        self.broker.channel = FakeChannel(self.broker)
+        return self.broker.channel
+
+    async def close(self):
+        self.is_closed = True
+
+
+class FakeBroker:
+    """In-process RabbitMQ with per-channel prefetch, per-message TTL and dead-lettering (enough for the retry queues)"""
+
+    def __init__(self):
+        self.queues: dict[str, FakeQueue] = {}
+        self.channel: FakeChannel | None = None
+        self._pending: list[tuple[str, bytes, dict[str, Any]]] = []
+
+    async def connect_robust(self, *args: Any, **kwargs: Any) -> FakeConnection:
+        return FakeConnection(self)
+
+    def declare_queue(self, channel: FakeChannel, name: str, arguments: dict[str, Any] | None) -> FakeQueue:
+        queue = self.queues.get(name)
+        if queue is None:
+            queue = self.queues[name] = FakeQueue(channel, name, arguments)
+            # Messages published before the queue existed (by the benchmark) are moved in
+            for routing_key, body, headers in [pending for pending in self._pending if pending[0] == name]:
+                queue.messages.append((body, headers))
+            self._pending = [pending for pending in self._pending if pending[0] != name]
+        return queue
+
+    def publish(self, routing_key: str, body: bytes, headers: dict[str, Any] | None = None, expiration: Any = None):
+        queue = self.queues.get(routing_key)
+        if queue is None:
+            self._pending.append((routing_key, body, headers or {}))
+            return
+
+        dead_letter_key = queue.arguments.get("x-dead-letter-routing-key")
+        if dead_letter_key and expiration is not None:
+            # Retry queue: the message comes back to the task queue when its TTL expires
+            delay = expiration.total_seconds() if hasattr(expiration, "total_seconds") else float(expiration)
+            asyncio.get_running_loop().call_later(delay, self.publish, dead_letter_key, body, headers)
+            return
+
+        queue.put(body, headers or {})
+
+    def depth(self, queue_name: str) -> int:
+        queue = self.queues.get(queue_name)
+        return len(queue.messages) if queue else len([pending for pending in self._pending if pending[0] == queue_name])
+
+
+# LLM
+LOREM = (
+    "Sure, I can help with that. Let me look at the details of your request and explain what I am going to do "
+    "before I do it, so you always know what happens next and why it is the right step for this task."
+).split(" ")
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Deterministic chat model streaming `response_tokens` tokens at `tokens_per_second` (0 streams without delay).
+    With tools bound it calls the first tool when the last message comes from the user, and answers with text otherwise,
+    so the example graphs go through their tool nodes once per task.
+    """
+
+    tokens_per_second: float = 200
+    response_tokens: int = 40
+    tool_args_chunks: int = 5
+    streaming: bool = False
+    tools: list[dict[str, Any]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        # Part of the llm cache key, the bound tools change the response like the tools bound to a real model do
+        return {"response_tokens": self.response_tokens, "tools": self.tools}
+
+    def _should_stream(self, *, async_api: bool, run_manager: Any = None, **kwargs: Any) -> bool:
+        # Like ChatOpenAI, the `streaming` field is honored: older langchain-core versions ignore it and call _generate
+        if self.streaming:
+            return True
+        return super()._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeStreamingChatModel":  # type: ignore[override]
+        return self.model_copy(update={"tools": [convert_to_openai_tool(tool) for tool in tools]})
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        chunks = [cast(AIMessageChunk, chunk.message) for chunk in self._chunks(messages)]
+        return ChatResult(generations=[ChatGeneration(message=message_chunk_to_message(add_ai_message_chunks(chunks[0], *chunks[1:])))])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        # The base class reports every chunk to the callbacks (on_llm_new_token)
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        next_at = time.monotonic()
+        for chunk in self._chunks(messages):
+            next_at += delay
+            await asyncio.sleep(max(0, next_at - time.monotonic()))
+            yield chunk
+
+    def _chunks(self, messages: list[BaseMessage]) -> Iterator[ChatGenerationChunk]:
+        text_tokens = [f"{LOREM[i % len(LOREM)]} " for i in range(self.response_tokens)]
+
+        last_message = next((message for message in reversed(messages) if message.type != "system"), None)
+        if not self.tools or not isinstance(last_message, HumanMessage):
+            for token in text_tokens:
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=""), generation_info={"finish_reason": "stop"})
+            return
+
+        # Explain, then call the tool like the example prompts ask for
+        for token in text_tokens[:max(1, len(text_tokens) // 4)]:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+        function = self.tools[0]["function"]
+        tool_call_id = f"call_{last_message.id or len(messages)}"
+        yield self._tool_call_chunk(tool_call_id, function["name"], "")
+
+        arguments = json.dumps(self._tool_args(function.get("parameters", {})))
+        size = max(1, -(-len(arguments) // self.tool_args_chunks))
+        for start in range(0, len(arguments), size):
+            yield self._tool_call_chunk(None, None, arguments[start:start + size])
+
+        yield ChatGenerationChunk(message=AIMessageChunk(content=""), generation_info={"finish_reason": "tool_calls"})
+
+    @staticmethod
+    def _tool_call_chunk(tool_call_id: str | None, name: str | None, arguments: str) -> ChatGenerationChunk:
+        # Same shape as the OpenAI integration: raw tool call deltas in additional_kwargs and parsed tool call chunks
+        return ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            additional_kwargs={"tool_calls": [{"index": 0, "id": tool_call_id, "type": "function", "function": {"name": name, "arguments": arguments}}]},
+            tool_call_chunks=[{"index": 0, "id": tool_call_id, "name": name, "args": arguments}]
+        ))
+
+    @staticmethod
+    def _tool_args(parameters: dict[str, Any]) -> dict[str, Any]:
+        samples = {"string": "https://example.com/cv.pdf", "integer": 1, "number": 1.0, "boolean": True, "array": [], "object": {}}
+        properties = parameters.get("properties", {})
+        return {
+            name: samples.get(schema.get("type", "string"), "value")
+            for name, schema in properties.items()
+            if name in parameters.get("required", properties.keys())
+        }
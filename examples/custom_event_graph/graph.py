@@ -6,7 +6,6 @@ from langchain_core.callbacks import dispatch_custom_event
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph
 from langgraph.types import Checkpointer, Command
-from langchain.chat_models import init_chat_model
 from typing import Literal
 from langchain_core.messages import SystemMessage
 
@@ -20,11 +19,7 @@ async def agent(state: State, config: RunnableConfig) -> Command[Literal['__end_
     agent_runtime: JarvisKitRuntime = get_runtime()
     thread_id = config.get("configurable", {}).get("thread_id", "")
     
-    llm = init_chat_model(
-        model="openai:gpt-4.1-nano",
-        temperature=0,
-        streaming=True
-    )
+    llm = agent_runtime.models.get("openai:gpt-4.1-nano", temperature=0, streaming=True)
     
     # Send a custom event to the runtime. Better use "replace" strategy to replace the event with the new one in the conversation.
     i = 0
@@ -65,7 +60,7 @@ async def agent(state: State, config: RunnableConfig) -> Command[Literal['__end_
     response = await llm.ainvoke(
         [
             SystemMessage("You are a helpful assistant that can help me with my tasks."),
-            *agent_runtime.get_messages(thread_id)
+            *(await agent_runtime.aget_messages(thread_id))
         ]
     )
     
@@ -4,7 +4,6 @@ from typing import TypedDict
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph
 from langgraph.types import Checkpointer, Command
-from langchain.chat_models import init_chat_model
 from typing import Literal
 from langchain_core.messages import SystemMessage
 
@@ -36,16 +35,12 @@ class State(TypedDict):
 async def agent(state: State, config: RunnableConfig) -> Command[Literal['no_stream_node', 'tool_execution_handler']]:
     agent_runtime: JarvisKitRuntime = get_runtime()
     thread_id = config.get("configurable", {}).get("thread_id", "")
-    llm = init_chat_model(
-        model="openai:openai:gpt-4.1-nano",
-        temperature=0,
-        streaming=True
-    ).bind_tools([scan_cv_tool])
+    llm = agent_runtime.models.get("openai:openai:gpt-4.1-nano", tools=[scan_cv_tool], temperature=0, streaming=True)
     
     response = await llm.ainvoke(
         [
             SystemMessage("You are a helpful assistant that can help me with my tasks. * **IMPORTANT**: Before using any tool, you **MUST FIRST** explain to the user what you're about to do. Only then should you call the appropriate tool."),
-            *agent_runtime.get_messages(thread_id)
+            *(await agent_runtime.aget_messages(thread_id))
         ]
     )
     
@@ -60,16 +55,12 @@ async def agent(state: State, config: RunnableConfig) -> Command[Literal['no_str
 async def no_stream_node(state: State, config: RunnableConfig) -> Command[Literal['no_stream_by_llm_config']]:
     agent_runtime: JarvisKitRuntime = get_runtime()
     thread_id = config.get("configurable", {}).get("thread_id", "")
-    llm = init_chat_model(
-        model="openai:openai:gpt-4.1-nano",
-        temperature=0,
-        streaming=True
-    ).bind_tools([scan_cv_tool])
+    llm = agent_runtime.models.get("openai:openai:gpt-4.1-nano", tools=[scan_cv_tool], temperature=0, streaming=True)
     
     response = await llm.ainvoke(
         [
             SystemMessage("You are a helpful assistant that can help me with my tasks. * **IMPORTANT**: Before using any tool, you **MUST FIRST** explain to the user what you're about to do. Only then should you call the appropriate tool."),
-            *agent_runtime.get_messages(thread_id)
+            *(await agent_runtime.aget_messages(thread_id))
         ]
     )
     
@@ -80,17 +71,13 @@ async def no_stream_node(state: State, config: RunnableConfig) -> Command[Litera
 async def no_stream_by_llm_config(state: State, config: RunnableConfig) -> Command[Literal['__end__']]:
     agent_runtime: JarvisKitRuntime = get_runtime()
     thread_id = config.get("configurable", {}).get("thread_id", "")
-    llm = init_chat_model(
-        model="openai:gpt-4o-mini",
-        temperature=0,
-        streaming=True
-    ).bind_tools([scan_cv_tool])
+    llm = agent_runtime.models.get("openai:gpt-4o-mini", tools=[scan_cv_tool], temperature=0, streaming=True)
     
     # Set .with_config(tags=["no_stream"]) to disable streaming in the llm
     response = await llm.with_config(tags=["no_stream"]).ainvoke(
         [
             SystemMessage("You are a helpful assistant that can help me with my tasks. * **IMPORTANT**: Before using any tool, you **MUST FIRST** explain to the user what you're about to do. Only then should you call the appropriate tool."),
-            *agent_runtime.get_messages(thread_id)
+            *(await agent_runtime.aget_messages(thread_id))
         ]
     )
     
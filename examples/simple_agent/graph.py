@@ -4,7 +4,6 @@ from typing import TypedDict
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph
 from langgraph.types import Checkpointer, Command
-from langchain.chat_models import init_chat_model
 from typing import Literal
 from langchain_core.messages import SystemMessage
 
@@ -29,16 +28,12 @@ async def agent(state: State, config: RunnableConfig) -> Command[Literal['__end_
     agent_runtime = get_runtime()
     thread_id = config.get("configurable", {}).get("thread_id", "")
     
-    llm = init_chat_model(
-        model="openai:gpt-4.1-nano",
-        temperature=0,
-        streaming=True
-    ).bind_tools([scan_cv_tool])
+    llm = agent_runtime.models.get("openai:gpt-4.1-nano", tools=[scan_cv_tool], temperature=0, streaming=True)
     
     response = await llm.ainvoke(
         [
             SystemMessage("You are a helpful assistant that can help me with my tasks. * **IMPORTANT**: Before using any tool, you **MUST FIRST** explain to the user what you're about to do. Only then should you call the appropriate tool."),
-            *agent_runtime.get_messages(thread_id)
+            *(await agent_runtime.aget_messages(thread_id))
         ]
     )
     
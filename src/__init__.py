@@ -1,18 +1,57 @@
 from .tool_node_wrapper import JarvisKitToolNode
 from .callback_handler import JarvisKitCallbackHandler
-from .classes import SocketConfig, MessageEvent, RabbitMQConfig
+from .classes import SocketConfig, MessageEvent, RabbitMQConfig, StreamConfig, OutboundQueueConfig, HttpConfig, ThreadCacheConfig, ThreadHistoryConfig, RetryConfig, ConcurrencyConfig, SupervisorConfig, MetricsConfig, TracingConfig, LoggingConfig, AgentSchedulingConfig, ModelSpec, ModelRegistryConfig, LLMCacheConfig, ClientResponseConfig, ToolCachePolicy, ToolCacheConfig
 from .jarvis_runtime import JarvisKitRuntime
 from .init import init_runtime, get_runtime, default_message_handler
 from .rabbit import AsyncRabbitMQSubscriber
+from .supervisor import WorkerSupervisor, serve_multiprocess
+from .metrics import RuntimeMetrics, MetricsServer
+from .tracing import Tracer, TracedCheckpointSaver
+from .logger import configure_logging, set_thread_debug
+from .model_registry import ModelRegistry
+from .llm_cache import LLMResponseCache
+from .tool_cache import ToolResultCache
+from .client_responses import ClientResponseRegistry, ClientResponseRouter
 __all__ = [
     "JarvisKitToolNode", 
     "JarvisKitCallbackHandler", 
     "SocketConfig",
     "MessageEvent",
     "RabbitMQConfig",
+    "StreamConfig",
+    "OutboundQueueConfig",
+    "HttpConfig",
+    "ThreadCacheConfig",
+    "ThreadHistoryConfig",
+    "RetryConfig",
+    "ConcurrencyConfig",
+    "SupervisorConfig",
+    "MetricsConfig",
+    "TracingConfig",
+    "LoggingConfig",
+    "AgentSchedulingConfig",
+    "ModelSpec",
+    "ModelRegistryConfig",
+    "LLMCacheConfig",
+    "ClientResponseConfig",
+    "ToolCachePolicy",
+    "ToolCacheConfig",
     "JarvisKitRuntime",
     "init_runtime",
     "get_runtime",
     "default_message_handler",
-    "AsyncRabbitMQSubscriber"
+    "AsyncRabbitMQSubscriber",
+    "WorkerSupervisor",
+    "serve_multiprocess",
+    "RuntimeMetrics",
+    "MetricsServer",
+    "Tracer",
+    "TracedCheckpointSaver",
+    "ModelRegistry",
+    "LLMResponseCache",
+    "ToolResultCache",
+    "ClientResponseRegistry",
+    "ClientResponseRouter",
+    "configure_logging",
+    "set_thread_debug"
 ]
\ No newline at end of file
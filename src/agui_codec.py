@@ -0,0 +1,66 @@
+import typing
+from functools import cache
+from typing import Any, Literal
+
+import ormsgpack
+from ag_ui.core.events import Event, EventType
+
+from .agui_util import _encode_field, _event_field_keys, encode_event
+
+AguiCodec = Literal["json", "msgpack"]
+# Bumped when the layout of the msgpack frames changes
+MSGPACK_FRAME_VERSION = 1
+
+
+def available_codecs(preferred: typing.Sequence[str]) -> list[str]:
+    """Codecs of `preferred` that this process can encode"""
+    return [codec for codec in preferred if codec in ("json", "msgpack")]
+
+
+@cache
+def _event_classes() -> dict[EventType, type[Any]]:
+    # Every member of the Event union, keyed by the literal of its `type` field
+    union = typing.get_args(Event)[0]
+    return {typing.get_args(event_class.model_fields["type"].annotation)[0]: event_class for event_class in typing.get_args(union)}
+
+
+@cache
+def msgpack_key_table() -> list[tuple[str, list[str]]]:
+    """
+    Static key table of the msgpack frames, sent to the runtime at join_agent_space.
+    The index of an event type in the table identifies it in a frame, the field values of the event are sent
+    in the order of its keys (`type` excluded) instead of a map repeating the keys on every frame.
+    """
+    return [
+        (event_type.value, [key for name, key in _event_field_keys(event_class) if name != "type"])
+        for event_type, event_class in _event_classes().items()
+    ]
+
+
+@cache
+def _type_indexes() -> dict[type[Any], int]:
+    return {_event_classes()[EventType(event_type)]: index for index, (event_type, _) in enumerate(msgpack_key_table())}
+
+
+def encode_msgpack_frame(thread_id: str, session_id: str, event: Event, order: int) -> bytes:
+    """
+    `[type index, order, threadId, sessionId, values]` where values are the event fields in the order of the key table.
+    Events of a class outside the table are sent with a type index of -1 and their camelCase map as values.
+    """
+    index = _type_indexes().get(type(event))
+    if index is None:
+        return ormsgpack.packb([-1, order, thread_id, session_id, encode_event(event)])
+
+    values = [_encode_field(event, name, getattr(event, name)) for name, _ in _event_field_keys(type(event)) if name != "type"]
+    return ormsgpack.packb([index, order, thread_id, session_id, values])
+
+
+def decode_msgpack_frame(frame: bytes) -> dict[str, Any]:
+    """The `agui_event` JSON frame of a msgpack frame, what the runtime does with the negotiated key table"""
+    index, order, thread_id, session_id, values = ormsgpack.unpackb(frame)
+    if index < 0:
+        event = values
+    else:
+        event_type, keys = msgpack_key_table()[index]
+        event = {"type": event_type, **dict(zip(keys, values))}
+    return {"threadId": thread_id, "sessionId": session_id, "event": event, "order": order}
@@ -1,7 +1,13 @@
+from functools import cache, lru_cache
 from typing import Any
 from ag_ui.core.events import Event
+from pydantic import BaseModel
 
+# Values that model_dump() returns untouched and that need no key conversion
+_PLAIN_TYPES = (str, int, float, bool, type(None))
 
+
+@lru_cache(maxsize=4096)
 def to_camel_case(snake_str: str) -> str:
     """Convert snake_case string to camelCase."""
     components = snake_str.split('_')
@@ -30,16 +36,40 @@ def convert_dict_to_camel_case(data: dict[str, Any]) -> dict[str, Any]:
     return result
 
 
+@cache
+def _event_field_keys(event_class: type[BaseModel]) -> tuple[tuple[str, str], ...]:
+    """Precomputed (field name, camelCase key) pairs of an event class"""
+    return tuple((name, to_camel_case(name)) for name in event_class.model_fields)
+
+
+def _encode_field(event: Event, name: str, value: Any) -> Any:
+    if isinstance(value, _PLAIN_TYPES):
+        return value
+
+    # Flat dicts (like most raw_event payloads) only need their keys converted
+    if isinstance(value, dict) and all(isinstance(item, _PLAIN_TYPES) for item in value.values()):
+        return {to_camel_case(key): item for key, item in value.items()}
+
+    # Nested models, lists and arbitrary objects go through pydantic so the output matches model_dump()
+    dumped = event.model_dump(include={name})[name]
+    if isinstance(dumped, dict):
+        return convert_dict_to_camel_case(dumped)
+    if isinstance(dumped, list):
+        return [convert_dict_to_camel_case(item) if isinstance(item, dict) else item for item in dumped]
+    return dumped
+
+
 def encode_event(event: Event) -> dict[str, Any]:
     """
-    Convert an Event object to a dictionary with camelCase properties 
+    Convert an Event object to a dictionary with camelCase properties
     suitable for sending to a JavaScript server.
+
+    The camelCase keys are computed once per event class, so events with plain fields
+    (like TextMessageContentEvent) are encoded with a single flat dict construction.
+    The output is the same as converting `event.model_dump()` with `convert_dict_to_camel_case`
+    for the ag-ui-protocol versions allowed by pyproject.toml (<0.2), newer versions serialize events differently.
     """
-    # Convert the event to a dictionary using Pydantic's model_dump
-    event_dict = event.model_dump()
-    
-    # Convert all keys to camelCase
-    camel_case_dict = convert_dict_to_camel_case(event_dict)
-    
-    return camel_case_dict
-    
\ No newline at end of file
+    return {
+        key: _encode_field(event, name, getattr(event, name))
+        for name, key in _event_field_keys(type(event))
+    }
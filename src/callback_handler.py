@@ -1,4 +1,7 @@
-import os
+import time
+import json
+import asyncio
+import logging
 from ag_ui.core import (
     BaseMessage,
     EventType,
@@ -14,13 +17,20 @@ from ag_ui.core import (
     CustomEvent,
     RunErrorEvent
 )
+from ag_ui.core.events import Event
 from uuid import UUID
 from typing import Any, override, final, cast
 
 from langchain_core.callbacks import AsyncCallbackHandler
-from langchain_core.outputs import ChatGenerationChunk, GenerationChunk, LLMResult
+from langchain_core.outputs import ChatGenerationChunk, Generation, GenerationChunk, LLMResult
 
 from .jarvis_runtime import JarvisKitRuntime
+from .classes import StreamConfig, LLMCacheConfig
+from .llm_cache import CACHE_HIT_INFO_KEY
+from .logger import THREAD_DEBUG_LOGGER_NAME, is_thread_debug
+from .tracing import Span
+
+debug_logger = logging.getLogger(THREAD_DEBUG_LOGGER_NAME)
 
 
 
@@ -32,12 +42,211 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
     current_tool_call_id: str | None = None
     current_message_id: str | None = None
     
-    def __init__(self, agent_runtime: JarvisKitRuntime, thread_id: str):
+    def __init__(self, agent_runtime: JarvisKitRuntime, thread_id: str, stream_config: StreamConfig | None = None):
         self.jarvis_runtime = agent_runtime
         self.thread_id = thread_id
         self.order = 0
         self.root_run_id = None
-        self.debug = os.getenv('DEBUG', 'false').lower() == 'true'
+        # Sampled per thread when the task starts, the callbacks of untraced threads only check this flag
+        self.debug = is_thread_debug(thread_id)
+        self.stream_config = stream_config or agent_runtime.stream_config
+        
+        # Buffered text tokens waiting to be coalesced into one TEXT_MESSAGE_CONTENT event
+        self._text_buffer: list[str] = []
+        self._text_buffer_bytes = 0
+        self._text_buffer_message_id: str | None = None
+        self._text_buffer_started_at = 0.0
+        self._text_flush_handle: asyncio.TimerHandle | None = None
+        self._flush_tasks: set[asyncio.Task[None]] = set()
+        
+        # Streaming timings per llm run: model name, start time and time of the last token
+        self._llm_timings: dict[UUID, tuple[str, float, float | None]] = {}
+        
+        # Spans of the traced runs (graph, nodes, llm and tool calls), under the task span of the message handler
+        self.tracer = agent_runtime.tracer
+        self._task_span = self.tracer.current_span() if self.tracer else None
+        self._spans: dict[UUID, Span] = {}
+        # Span that the children of each run are attached to, the run's own span or the closest traced ancestor's
+        self._span_parents: dict[UUID, Span | None] = {}
+    
+    def _debug(self, event_type: EventType, message: str, *args: Any, **fields: Any):
+        """Log a callback of a traced thread, only call it under `if self.debug` so untraced threads build no arguments"""
+        debug_logger.debug(message, *args, extra={"thread_id": self.thread_id, "event": event_type.value, "order": self.order, **fields})
+    
+    # Event sending
+    async def _send_event(self, event: Event):
+        """
+        Send an event to the runtime with the next order.
+        Buffered text is always flushed first so the order sequence stays correct.
+        """
+        await self._flush_text_buffer()
+        order = self.order
+        self.order += 1
+        await self.jarvis_runtime.asend_agui_event(self.thread_id, str(self.root_run_id), event, order)
+    
+    async def _send_text_token(self, message_id: str, token: str):
+        window = self.stream_config.token_coalesce_window_ms / 1000
+        if window <= 0:
+            await self._send_event(TextMessageContentEvent(
+                type=EventType.TEXT_MESSAGE_CONTENT,
+                message_id=message_id,
+                delta=token
+            ))
+            return
+        
+        if self._text_buffer_message_id != message_id:
+            await self._flush_text_buffer()
+        
+        if not self._text_buffer:
+            self._text_buffer_message_id = message_id
+            self._text_buffer_started_at = time.monotonic()
+        
+        self._text_buffer.append(token)
+        self._text_buffer_bytes += len(token.encode("utf-8"))
+        
+        elapsed = time.monotonic() - self._text_buffer_started_at
+        if self._text_buffer_bytes >= self.stream_config.token_coalesce_max_bytes or elapsed >= window:
+            await self._flush_text_buffer()
+        elif self._text_flush_handle is None:
+            # Flush the tail of the buffer even if the llm stops producing tokens for a while
+            loop = asyncio.get_running_loop()
+            self._text_flush_handle = loop.call_later(window - elapsed, lambda: self._track_task(loop.create_task(self._flush_text_buffer())))
+    
+    def _track_task(self, task: asyncio.Task[None]):
+        # Keep a strong reference to the background flush until it is done
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _flush_text_buffer(self):
+        if self._text_flush_handle is not None:
+            self._text_flush_handle.cancel()
+            self._text_flush_handle = None
+        
+        if not self._text_buffer:
+            return
+        
+        delta = "".join(self._text_buffer)
+        message_id = cast(str, self._text_buffer_message_id)
+        self._text_buffer = []
+        self._text_buffer_bytes = 0
+        self._text_buffer_message_id = None
+        
+        order = self.order
+        self.order += 1
+        await self.jarvis_runtime.asend_agui_event(self.thread_id, str(self.root_run_id), TextMessageContentEvent(
+            type=EventType.TEXT_MESSAGE_CONTENT,
+            message_id=message_id,
+            delta=delta
+        ), order)
+    
+    async def _replay_cached_generation(self, message_id: str, generation: Generation):
+        """Stream a response served by the llm cache, the ui receives the same events as for a live response"""
+        llm_cache = self.jarvis_runtime.llm_cache
+        chunk_size = max(1, (llm_cache.config if llm_cache else LLMCacheConfig()).replay_chunk_size)
+        if self.debug:
+            self._debug(EventType.TEXT_MESSAGE_CONTENT, "Replaying cached response: %s", generation, run_id=message_id)
+        
+        text = generation.text
+        for start in range(0, len(text), chunk_size):
+            await self._send_text_token(message_id, text[start:start + chunk_size])
+        
+        for tool_call in getattr(getattr(generation, "message", None), "tool_calls", None) or []:
+            self.current_tool_call_id = tool_call.get("id")
+            await self._send_event(ToolCallStartEvent(
+                type=EventType.TOOL_CALL_START,
+                tool_call_id=tool_call.get("id") or "",
+                tool_call_name=tool_call.get("name", ""),
+                parent_message_id=message_id,
+                raw_event={
+                    "id": tool_call.get("id"),
+                    "name": tool_call.get("name"),
+                    "args": {},
+                    "message_id": message_id,
+                }
+            ))
+            await self._send_event(ToolCallArgsEvent(
+                type=EventType.TOOL_CALL_ARGS,
+                tool_call_id=tool_call.get("id") or "",
+                delta=json.dumps(tool_call.get("args", {})),
+                raw_event={
+                    "message_id": message_id,
+                }
+            ))
+            await self._send_event(ToolCallEndEvent(
+                type=EventType.TOOL_CALL_END,
+                tool_call_id=tool_call.get("id") or "",
+            ))
+    
+    # Streaming metrics
+    def _start_llm_timing(self, run_id: UUID, metadata: dict[str, Any] | None):
+        model = str((metadata or {}).get("ls_model_name") or "unknown")
+        self._llm_timings[run_id] = (model, time.monotonic(), None)
+    
+    def _record_token_timing(self, run_id: UUID):
+        timing = self._llm_timings.get(run_id)
+        if timing is None:
+            return
+        
+        model, started_at, last_token_at = timing
+        now = time.monotonic()
+        if last_token_at is None:
+            self.jarvis_runtime.metrics.time_to_first_token_seconds.observe(now - started_at, model=model)
+        else:
+            self.jarvis_runtime.metrics.inter_token_latency_seconds.observe(now - last_token_at, model=model)
+        self._llm_timings[run_id] = (model, started_at, now)
+    
+    # Tracing
+    def _start_span(self, run_id: UUID, parent_run_id: UUID | None, name: str, attributes: dict[str, Any]):
+        assert self.tracer is not None
+        parent = self._span_parents.get(parent_run_id) if parent_run_id else None
+        span = self.tracer.start_span(name, parent=parent or self._task_span, attributes=attributes)
+        self._spans[run_id] = span
+        self._span_parents[run_id] = span
+    
+    def _inherit_span(self, run_id: UUID, parent_run_id: UUID | None):
+        self._span_parents[run_id] = self._span_parents.get(parent_run_id) if parent_run_id else None
+    
+    def _end_span(self, run_id: UUID, error: BaseException | None = None, attributes: dict[str, Any] | None = None):
+        self._span_parents.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is None or self.tracer is None:
+            return
+        
+        for key, value in (attributes or {}).items():
+            span.set_attribute(key, value)
+        self.tracer.end_span(span, error)
+    
+    def _trace_chain_start(self, run_id: UUID, parent_run_id: UUID | None, metadata: dict[str, Any] | None, name: str | None):
+        node = (metadata or {}).get("langgraph_node")
+        if parent_run_id is None:
+            self._start_span(run_id, parent_run_id, f"graph {name or 'run'}", {"thread.id": self.thread_id})
+        elif node and node == name:
+            # The other chains (sequences, branches...) of a node are not traced, their children go to the node span
+            self._start_span(run_id, parent_run_id, f"node {node}", {
+                "langgraph.node": node,
+                "langgraph.step": (metadata or {}).get("langgraph_step", -1)
+            })
+        else:
+            self._inherit_span(run_id, parent_run_id)
+    
+    def _trace_llm_start(self, run_id: UUID, parent_run_id: UUID | None, metadata: dict[str, Any] | None):
+        model = str((metadata or {}).get("ls_model_name") or "unknown")
+        self._start_span(run_id, parent_run_id, f"llm {model}", {
+            "llm.model": model,
+            "llm.provider": str((metadata or {}).get("ls_provider") or "unknown")
+        })
+    
+    def _trace_llm_end(self, run_id: UUID, response: LLMResult):
+        attributes: dict[str, Any] = {}
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+            attributes["llm.input_tokens"] = usage.get("input_tokens")
+            attributes["llm.output_tokens"] = usage.get("output_tokens")
+        timing = self._llm_timings.get(run_id)
+        if timing and timing[2] is not None:
+            attributes["llm.time_to_first_token_ms"] = (timing[2] - timing[1]) * 1000
+        self._end_span(run_id, attributes=attributes)
     
     # Lifecycle events
     @override
@@ -52,6 +261,9 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         metadata: dict[str, Any] | None = None,
         **kwargs: Any,
     ) -> Any:
+        if self.tracer:
+            self._trace_chain_start(run_id, parent_run_id, metadata, kwargs.get("name"))
+        
         if metadata and metadata.get("no_stream", False):
             self.run_id_to_disable_stream = run_id
             return
@@ -59,19 +271,13 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         # Send the RunStartedEvent only once for the first chain start
         if self.order == 0:
             if self.debug:
-                print(f'[{EventType.RUN_STARTED} - {self.thread_id}] Chain started')
-                print(f'Run ID: {run_id}')
-                print(f'Parent Run ID: {parent_run_id}')
-                print(f'Tags: {tags}')
-                print(f'Metadata: {metadata}')
-                print(f'Inputs: {inputs}')
-                print(f'Serialized: {serialized}')
-                print(f'Kwargs: {kwargs}')
-                print(f'[{self.order}] {'-'*30}')
-                
+                self._debug(
+                    EventType.RUN_STARTED, "Chain started with inputs: %s, tags: %s, metadata: %s, serialized: %s, kwargs: %s",
+                    inputs, tags, metadata, serialized, kwargs, run_id=str(run_id), parent_run_id=str(parent_run_id)
+                )
             
             self.root_run_id = run_id
-            self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), RunStartedEvent(
+            await self._send_event(RunStartedEvent(
                 type=EventType.RUN_STARTED,
                 thread_id=self.thread_id,
                 run_id=str(run_id),
@@ -81,10 +287,8 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
                     "parent_run_id": str(parent_run_id),
                     "run_id": str(run_id)
                 }
-            ), self.order)
+            ))
         
-            
-            self.order += 1
         
     @override
     async def on_chain_end(
@@ -97,6 +301,9 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         metadata: dict[str, Any] | None = None,
         **kwargs: Any,
     ) -> None:
+        if self.tracer:
+            self._end_span(run_id)
+        
         # Set run_id_to_disable_stream to None to enable stream again if the run_id is the same as the run_id_to_disable_stream
         if run_id == self.run_id_to_disable_stream:
             self.run_id_to_disable_stream = None
@@ -105,16 +312,13 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         # If this is the last event of the run, clear the store of the thread in runtime and unlock the thread
         if run_id == self.root_run_id:
             if self.debug:
-                print(f'[{EventType.RUN_FINISHED} - {self.thread_id}] Chain ended with outputs: {outputs}')
-                print(f"Run ID: {run_id}")
-                print(f"Parent Run ID: {parent_run_id}")
-                print(f"Tags: {tags}")
-                print(f"Metadata: {metadata}")
-                print(f"Kwargs: {kwargs}")
-                print(f'[{self.order}] {'-'*30}')
+                self._debug(
+                    EventType.RUN_FINISHED, "Chain ended with outputs: %s, tags: %s, metadata: %s, kwargs: %s",
+                    outputs, tags, metadata, kwargs, run_id=str(run_id), parent_run_id=str(parent_run_id)
+                )
             
             # Send the RunFinishedEvent only once for the last chain end
-            self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), RunFinishedEvent(
+            await self._send_event(RunFinishedEvent(
                 type=EventType.RUN_FINISHED,
                 thread_id=self.thread_id,
                 run_id=str(run_id),
@@ -124,9 +328,7 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
                     "parent_run_id": str(parent_run_id),
                     "run_id": str(run_id)
                 }
-            ), self.order)
-
-            self.order += 1
+            ))
             
             self.jarvis_runtime.clear_store_messages(self.thread_id)
 
@@ -144,22 +346,22 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         metadata: dict[str, Any] | None = None,
         **kwargs: Any,
     ) -> Any:
+        if self.tracer:
+            self._trace_llm_start(run_id, parent_run_id, metadata)
+        
         if self.run_id_to_disable_stream or (tags and 'no_stream' in tags):
             return
         
         if self.debug:
-            print(f'[{EventType.TEXT_MESSAGE_START} - on_chat_model_start - {self.thread_id}] LLM started with prompts: {messages}')
-            print(f'Metadata: {metadata}')
-            print(f'[{self.order}] {'-'*30}')
+            self._debug(EventType.TEXT_MESSAGE_START, "Chat model started with messages: %s, metadata: %s", messages, metadata, run_id=str(run_id))
         
+        self._start_llm_timing(run_id, metadata)
         self.current_message_id = str(run_id)
-        self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), TextMessageStartEvent(
+        await self._send_event(TextMessageStartEvent(
             type=EventType.TEXT_MESSAGE_START,
             message_id=str(run_id),
             role="assistant"
-        ), self.order)
-        
-        self.order += 1
+        ))
         
     @override
     async def on_llm_start(
@@ -173,21 +375,22 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         metadata: dict[str, Any] | None = None,
         **kwargs: Any,
     ) -> Any:
+        if self.tracer:
+            self._trace_llm_start(run_id, parent_run_id, metadata)
+        
         if self.run_id_to_disable_stream or (tags and 'no_stream' in tags):
             return
         
         if self.debug:
-            print(f'[{EventType.TEXT_MESSAGE_START} - on_llm_start - {self.thread_id}] LLM started with prompts: {prompts}')
-            print(f'[{self.order}] {'-'*30}')
+            self._debug(EventType.TEXT_MESSAGE_START, "LLM started with prompts: %s", prompts, run_id=str(run_id))
         
+        self._start_llm_timing(run_id, metadata)
         self.current_message_id = str(run_id)
-        self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), TextMessageStartEvent(
+        await self._send_event(TextMessageStartEvent(
             type=EventType.TEXT_MESSAGE_START,
             message_id=str(run_id),
             role="assistant"
-        ), self.order)
-        
-        self.order += 1
+        ))
         
     @override
     async def on_llm_end(
@@ -200,23 +403,26 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         metadata: dict[str, Any] | None = None,
         **kwargs: Any,
     ) -> None:
+        if self.tracer:
+            self._trace_llm_end(run_id, response)
+        
         if self.run_id_to_disable_stream or (tags and 'no_stream' in tags):
             return
         
         if self.debug:
-            print(f'[{EventType.TEXT_MESSAGE_END} - {self.thread_id}] LLM ended with response: {response}')
-            print(f'Metadata: {metadata}')
-            print(f'[{self.order}] {'-'*30}')
+            self._debug(EventType.TEXT_MESSAGE_END, "LLM ended with response: %s, metadata: %s", response, metadata, run_id=str(run_id))
         
         chat_generation = response.generations[0][0]
+        if chat_generation.generation_info and chat_generation.generation_info.get(CACHE_HIT_INFO_KEY):
+            await self._replay_cached_generation(str(run_id), chat_generation)
+        
+        self._llm_timings.pop(run_id, None)
         self.current_message_id = None
-        self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), TextMessageEndEvent(
+        await self._send_event(TextMessageEndEvent(
             type=EventType.TEXT_MESSAGE_END,
             message_id=str(run_id),
             raw_event=chat_generation.message
-        ), self.order)
-        
-        self.order += 1
+        ))
         
     @override
     async def on_llm_error(
@@ -228,20 +434,21 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         tags: list[str] | None = None,
         **kwargs: Any,
     ) -> None:
+        if self.tracer:
+            self._end_span(run_id, error)
+        
         if self.run_id_to_disable_stream or (tags and 'no_stream' in tags):
             return
         
         if self.debug:
-            print(f'[{EventType.TEXT_MESSAGE_END} - {self.thread_id}] LLM error: {error}')
-            print(f'[{self.order}] {'-'*30}')
+            self._debug(EventType.TEXT_MESSAGE_END, "LLM error: %s", error, run_id=str(run_id))
         
+        self._llm_timings.pop(run_id, None)
         self.current_message_id = None
-        self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), TextMessageEndEvent(
+        await self._send_event(TextMessageEndEvent(
             type=EventType.TEXT_MESSAGE_END,
             message_id=str(run_id)
-        ), self.order)
-                
-        self.order += 1
+        ))
         
     @override
     async def on_llm_new_token(
@@ -260,17 +467,16 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         
         chunk = cast(ChatGenerationChunk, chunk)
         if chunk.message.additional_kwargs.get("tool_calls", None):
+            self._record_token_timing(run_id)
             tool_call = chunk.message.additional_kwargs.get("tool_calls", [])[0]
             
             if tool_call.get("id", None) is not None:
                 # On llm decided to call a tool
                 if self.debug:
-                    print(f'[{EventType.TOOL_CALL_START} - {self.thread_id} - {tool_call.get("id")}] {tool_call.get("function", {}).get("name", "")}')
-                    print(tool_call)
-                    print(f'[{self.order}] {'-'*30}')
+                    self._debug(EventType.TOOL_CALL_START, "Tool call: %s", tool_call, tool_call_id=tool_call.get("id"))
                 
                 self.current_tool_call_id = tool_call.get("id")
-                self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), ToolCallStartEvent(
+                await self._send_event(ToolCallStartEvent(
                     type=EventType.TOOL_CALL_START,
                     tool_call_id=tool_call.get("id"),
                     tool_call_name=tool_call.get("function", {}).get("name", ""),
@@ -281,54 +487,56 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
                         "args": {},
                         "message_id": self.current_message_id,
                     }
-                ), self.order)
+                ))
             else:
                 # On streaming tool args
                 if self.debug:
-                    print(f'[{EventType.TOOL_CALL_ARGS} - {self.thread_id} - {self.current_tool_call_id}] {tool_call.get("function", {}).get("arguments", "")}')
-                    print(f'[{self.order}] {'-'*30}')
+                    self._debug(EventType.TOOL_CALL_ARGS, "Tool call args: %s", tool_call.get("function", {}).get("arguments", ""), tool_call_id=self.current_tool_call_id)
                 
-                self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), ToolCallArgsEvent(
+                await self._send_event(ToolCallArgsEvent(
                     type=EventType.TOOL_CALL_ARGS,
                     tool_call_id=self.current_tool_call_id or "",
                     delta=tool_call.get("function", {}).get("arguments", ""),
                     raw_event={
                         "message_id": self.current_message_id,
                     }
-                ), self.order)
-                
-            self.order += 1
+                ))
         else:
             # On llm decided to end the message streaming because of the tool calls(finish_reason is tool_calls)
             if chunk.generation_info and chunk.generation_info.get("finish_reason", None) == "tool_calls":
-                if (self.debug):
-                    print(f'[{EventType.TOOL_CALL_END} - {self.thread_id} - {self.current_tool_call_id}]')
-                    print(f'[{self.order}] {'-'*30}')
+                if self.debug:
+                    self._debug(EventType.TOOL_CALL_END, "Tool call ended", tool_call_id=self.current_tool_call_id)
                 
-                self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), ToolCallEndEvent(
+                await self._send_event(ToolCallEndEvent(
                     type=EventType.TOOL_CALL_END,
                     tool_call_id=self.current_tool_call_id or "",
-                ), self.order)
-                
-                self.order += 1
+                ))
             
             # On llm streaming text, we need to filter out empty token to avoid sending empty delta
             # Normally, langchain will send empty token once in the beginning of the stream and once in the end of the stream
             if len(token) > 0:
-                if (self.debug):
-                    print(f'[{EventType.TEXT_MESSAGE_CONTENT} - {self.thread_id} - {run_id}] -> {token}')
-                    print(chunk)
-                    print(f'Metadata: {metadata}')
-                    print(f'[{self.order}] {'-'*30}')
+                self._record_token_timing(run_id)
+                if self.debug:
+                    self._debug(EventType.TEXT_MESSAGE_CONTENT, "Token: %r, chunk: %s", token, chunk, run_id=str(run_id))
                 
-                self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), TextMessageContentEvent(
-                    type=EventType.TEXT_MESSAGE_CONTENT,
-                    message_id=str(run_id),
-                    delta=token
-                ), self.order)
-    
-                self.order += 1
+                await self._send_text_token(str(run_id), token)
         
+    @override
+    async def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        if self.tracer:
+            tool_name = str((serialized or {}).get("name") or kwargs.get("name") or "unknown")
+            self._start_span(run_id, parent_run_id, f"tool {tool_name}", {"tool.name": tool_name})
+    
     @override
     async def on_tool_end(
         self,
@@ -339,26 +547,29 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         tags: list[str] | None = None,
         **kwargs: Any,
     ) -> None:
+        if self.tracer:
+            self._end_span(run_id)
+        
         if self.run_id_to_disable_stream or (tags and 'no_stream' in tags):
             return
          
+        # Tool calls of the same message run in parallel, the output tells which one finished
+        tool_call_id = getattr(output, "tool_call_id", None) or self.current_tool_call_id
         if self.debug:
-            print(f'[{EventType.TOOL_CALL_RESULT} - {self.thread_id} - {self.current_tool_call_id}]')
-            print(f'output: {output}')
-            print(f'[{self.order}] {'-'*30}')
+            self._debug(EventType.TOOL_CALL_RESULT, "Tool output: %s", output, tool_call_id=tool_call_id)
         
-        self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), ToolCallResultEvent(
+        await self._send_event(ToolCallResultEvent(
             type=EventType.TOOL_CALL_RESULT,
-            tool_call_id=self.current_tool_call_id or "",
+            tool_call_id=tool_call_id or "",
             message_id=self.current_message_id or "",
-            content=output.content,
+            content=output.content if hasattr(output, "content") else str(output),
             raw_event={
                 "message_id": self.current_message_id,
             }
-        ), self.order)
+        ))
         
-        self.current_tool_call_id = None
-        self.order += 1
+        if tool_call_id == self.current_tool_call_id:
+            self.current_tool_call_id = None
         
     @override
     async def on_tool_error(
@@ -370,21 +581,23 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         tags: list[str] | None = None,
         **kwargs: Any,
     ) -> None:
+        if self.tracer:
+            self._end_span(run_id, error)
+        
         if self.run_id_to_disable_stream or (tags and 'no_stream' in tags):
             return
         
+        tool_call_id = kwargs.get("tool_call_id") or self.current_tool_call_id
         if self.debug:
-            print(f'[{EventType.TOOL_CALL_END} - {self.thread_id} - {self.current_tool_call_id}] Tool Error: {error}')
-            print(f'[{self.order}] {'-'*30}')
+            self._debug(EventType.TOOL_CALL_END, "Tool error: %s", error, tool_call_id=tool_call_id)
         
-        self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), ToolCallEndEvent(
+        await self._send_event(ToolCallEndEvent(
             type=EventType.TOOL_CALL_END,
-            tool_call_id=self.current_tool_call_id or "",
-        ), self.order)
+            tool_call_id=tool_call_id or "",
+        ))
 
-        self.current_tool_call_id = None
-        
-        self.order += 1
+        if tool_call_id == self.current_tool_call_id:
+            self.current_tool_call_id = None
 
     # Custom events
     @override
@@ -402,18 +615,13 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
             return
         
         if self.debug:
-            print(
-                f"Received event {name} with data: {data}, with tags: {tags}, with metadata: {metadata} and run_id: {run_id}"
-            )
-            print(f'[{self.order}] {'-'*30}')
+            self._debug(EventType.CUSTOM, "Custom event %s with data: %s, tags: %s, metadata: %s", name, data, tags, metadata, run_id=str(run_id))
         
-        self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), CustomEvent(
+        await self._send_event(CustomEvent(
             type=EventType.CUSTOM,
             name=name,
             value=data
-        ), self.order)
-        
-        self.order += 1
+        ))
     @override
     async def on_chain_error(
         self,
@@ -424,20 +632,19 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
         tags: list[str] | None = None,
         **kwargs: Any,
     ) -> None:
+        if self.tracer:
+            self._end_span(run_id, error)
+        
         if self.run_id_to_disable_stream or (tags and 'no_stream' in tags):
             return
             
         # If this is the last event of the run, clear the store of the thread in runtime and unlock the thread
         if run_id == self.root_run_id:
             if self.debug:
-                print(f'[{EventType.RUN_ERROR} - {self.thread_id}] Chain error: {error}')
-                print(f"Run ID: {run_id}")
-                print(f"Parent Run ID: {parent_run_id}")
-                print(f"Tags: {tags}")
-                print(f'[{self.order}] {'-'*30}')
+                self._debug(EventType.RUN_ERROR, "Chain error: %s, tags: %s", error, tags, run_id=str(run_id), parent_run_id=str(parent_run_id))
             
             # Send the RunFinishedEvent only once for the last chain end
-            self.jarvis_runtime.send_agui_event(self.thread_id, str(self.root_run_id), RunErrorEvent(
+            await self._send_event(RunErrorEvent(
                 type=EventType.RUN_ERROR,
                 message=str(error),
                 code="TASK_FAILED",
@@ -449,8 +656,6 @@ class JarvisKitCallbackHandler(AsyncCallbackHandler):
                     "tags": tags,
                     "kwargs": kwargs
                 }
-            ), self.order)
-
-            self.order += 1
+            ))
             
             self.jarvis_runtime.clear_store_messages(self.thread_id)
@@ -1,5 +1,6 @@
+import os
 import ssl
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any, Literal, TypedDict
 
 @dataclass
@@ -34,11 +35,215 @@ class SocketConfig:
     reconnection_attempts: int = 10
     reconnection_delay: int = 1
     reconnection_delay_max: int = 5
-    
+    # "sync" runs a threaded socketio.Client, "async" runs a socketio.AsyncClient on the worker's event loop
+    transport_mode: Literal["sync", "async"] = "sync"
+    # Defaults to polling for the sync client and to websocket (falling back to polling) for the async client
+    transports: list[str] | None = None
+    # Codecs of the agui_event frames offered at join_agent_space in order of preference, the runtime picks one.
+    # JSON is used until the runtime accepts another codec and with runtimes that do not negotiate
+    agui_codecs: list[str] = field(default_factory=lambda: ["msgpack", "json"])
+
+@dataclass
+class RetryConfig:
+    # Number of retries of a failed task before it is moved to the parking queue
+    max_retries: int = 2
+    # Exponential backoff in seconds: base_delay * 2 ** (attempt - 1), capped at max_delay
+    base_delay: float = 3
+    max_delay: float = 300
+    # Random +/- fraction applied to each delay
+    jitter: float = 0.2
+
+@dataclass
+class ConcurrencyConfig:
+    # Bounds of the adaptive worker limit
+    min_workers: int = 1
+    max_workers: int = 32
+    # Seconds between two adjustments
+    interval: float = 5
+    # The limit is decreased when one of these is exceeded during an interval
+    max_error_rate: float = 0.2
+    max_loop_lag: float = 0.1
+    target_latency: float | None = None
+    # AIMD steps
+    increase_step: int = 1
+    decrease_factor: float = 0.7
+    loop_lag_probe_interval: float = 0.1
+
 @dataclass
 class RabbitMQConfig:
     url: str
     ssl_context: ssl.SSLContext | None = None
+    retry_config: RetryConfig | None = None
+    # Resize max_concurrent_workers at runtime from observed latency, loop lag and error rate
+    concurrency_config: ConcurrencyConfig | None = None
+    # Defaults to 4 * max_concurrent_workers. Tasks waiting for another task of their thread hold a prefetch slot,
+    # so the window must be larger than the worker count to keep other threads flowing when many tasks target the same thread
+    prefetch_count: int | None = None
+    # Also consume `tasks_queue:{namespace}:{agent name}` for every agent. Each queue has its own prefetch_count,
+    # so a backlog of one agent cannot hold all the prefetched messages while the others wait in the broker
+    per_agent_queues: bool = False
+
+@dataclass
+class AgentSchedulingConfig:
+    # Share of the worker slots given to the agent while several agents have waiting tasks
+    weight: float = 1
+    # Maximum number of tasks of the agent running at the same time, None to only be limited by max_concurrent_workers
+    max_concurrency: int | None = None
+    # Free slots go to the waiting tasks of the highest priority agents first, the weights apply between agents of the same priority
+    priority: int = 0
+
+@dataclass
+class StreamConfig:
+    # Coalesce streamed text tokens of the same message into a single TEXT_MESSAGE_CONTENT event.
+    # The buffer is flushed when the window elapses or the buffered delta reaches the byte threshold.
+    # A window of 0 disables coalescing and sends one event per token.
+    token_coalesce_window_ms: int = 0
+    token_coalesce_max_bytes: int = 1024
+
+@dataclass
+class HttpConfig:
+    # Timeout in seconds of a single request to the runtime
+    timeout: float = 10
+    # Connection pool shared by every request to the runtime
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30
+    # Retries on connection errors, timeouts and 5xx responses, with exponential backoff
+    retries: int = 2
+    retry_backoff: float = 0.2
+
+@dataclass
+class ClientResponseConfig:
+    # Responses that no tool waits for yet (the client answered before the tool started waiting) or anymore
+    # (the tool timed out) are kept for a while, the oldest are dropped past max_orphans
+    max_orphans: int = 1000
+    orphan_ttl_seconds: float = 60
+    # Forward the responses that no tool of this process waits for through a RabbitMQ fanout exchange, so the worker
+    # running the tool gets them whatever socket they arrived on. None enables it in multi-process mode only
+    route_through_rabbitmq: bool | None = None
+
+@dataclass
+class ThreadCacheConfig:
+    # Maximum number of threads kept in the history cache
+    max_entries: int = 10000
+    # Approximate memory budget of all cached histories
+    max_bytes: int = 256 * 1024 * 1024
+    # Entries not used for this long are dropped, even if the run never cleared them
+    ttl_seconds: float = 3600
+
+@dataclass
+class ThreadHistoryConfig:
+    # Maximum number of messages of a thread history given to the agents
+    depth: int = 30
+    # Number of messages asked to the runtime per request, the history is paged with a cursor when depth is bigger
+    page_size: int = 30
+    # Remember the last seen message of each thread and only fetch the newer messages on later fetches
+    incremental: bool = True
+    # Maximum number of threads whose synced history is remembered, they count against ThreadCacheConfig.max_bytes
+    max_threads: int = 10000
+
+@dataclass
+class SupervisorConfig:
+    # Number of worker processes, one per CPU core by default
+    workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    # "spawn" gives every worker a clean interpreter, nothing (sockets, connections) is shared with the supervisor
+    start_method: str = "spawn"
+    # Seconds between two health checks of the workers
+    check_interval: float = 1
+    # Workers send a heartbeat from their event loop, a worker silent for heartbeat_timeout seconds is restarted
+    heartbeat_interval: float = 5
+    heartbeat_timeout: float = 60
+    # A worker restarted more than max_restarts times within restart_window seconds stops the supervisor
+    restart_delay: float = 1
+    max_restarts: int = 5
+    restart_window: float = 60
+    # Seconds given to the workers to finish their active tasks on shutdown before they are killed
+    shutdown_timeout: float = 30
+
+@dataclass
+class MetricsConfig:
+    # The Prometheus text exposition is served on http://{host}:{port}{path}
+    host: str = "127.0.0.1"
+    # In multi-process mode every worker listens on port + its worker id
+    port: int = 9464
+    path: str = "/metrics"
+
+@dataclass
+class TracingConfig:
+    # OTLP JSON lines file, in multi-process mode every worker writes to `{name}.{worker id}{extension}`
+    path: str = "traces.jsonl"
+    service_name: str = "jarvis-kit"
+    # Ended spans are written when their trace ends, or when this many spans are buffered
+    batch_size: int = 512
+
+@dataclass
+class ModelSpec:
+    # Model and init_chat_model params of a client created and warmed up when serve() starts
+    model: str
+    params: dict[str, Any] = field(default_factory=dict)
+    tools: list[Any] = field(default_factory=list)
+
+@dataclass
+class ModelRegistryConfig:
+    # Clients created when serve() starts, so the first tasks do not pay for the client construction
+    preload: list[ModelSpec] = field(default_factory=list)
+    # Open the http connection of the preloaded clients before the first task (with a cheap request, like listing the models)
+    warm_connections: bool = True
+    # Maximum number of clients, and of clients with bound tools, kept in the registry
+    max_clients: int = 64
+
+@dataclass
+class LLMCacheConfig:
+    # Maximum number of responses kept in memory, the least recently used are evicted first
+    max_entries: int = 1024
+    # Responses older than this are not reused
+    ttl_seconds: float = 3600
+    # SQLite file of a second tier shared by the worker processes and kept across restarts, memory only when not set
+    sqlite_path: str | None = None
+    # Characters per TEXT_MESSAGE_CONTENT event when a cached response is streamed to the ui
+    replay_chunk_size: int = 32
+
+@dataclass
+class ToolCachePolicy:
+    # Results of the tool are reused for this long
+    ttl_seconds: float = 3600
+    # Maximum number of results of the tool kept in memory, the least recently used are evicted first
+    max_entries: int = 1000
+
+@dataclass
+class ToolCacheConfig:
+    # Tools whose results are cached, by tool name. Only cache tools that return the same result for the same args
+    policies: dict[str, ToolCachePolicy] = field(default_factory=dict)
+    # SQLite file of a second tier shared by the worker processes and kept across restarts, memory only when not set
+    sqlite_path: str | None = None
+
+@dataclass
+class LoggingConfig:
+    # Level of the sdk loggers (the "jarvis_kit" logger and its children)
+    level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
+    # "text" for human readable lines, "json" for one JSON object per line with the structured fields
+    format: Literal["text", "json"] = "text"
+    # Install a stdout handler on the "jarvis_kit" logger, disable it to route the records through your own handlers
+    install_handler: bool = True
+    # Threads whose callbacks log every event (prompts, tokens, tool calls), whatever the level
+    debug_threads: list[str] = field(default_factory=list)
+    # Fraction of the other threads traced the same way, picked by a stable hash of the thread id.
+    # The DEBUG=true environment variable traces every thread.
+    debug_sample_rate: float = 0.0
+
+@dataclass
+class OutboundQueueConfig:
+    # Maximum number of events waiting in memory to be emitted to the runtime
+    max_size: int = 1000
+    # Maximum number of events emitted by the drainer in one batch
+    batch_size: int = 50
+    # What to do when the queue is full:
+    # - "block": wait until the drainer frees some space
+    # - "drop_superseded": drop a queued "replace" custom event with the same name, otherwise wait
+    # - "spill": write the overflow to a file on disk and emit it once the memory queue is drained
+    overflow_policy: Literal["block", "drop_superseded", "spill"] = "block"
+    # File used by the "spill" policy, a temporary file is created when it is not set
+    spill_path: str | None = None
 
 @dataclass
 class RuntimeMessage(TypedDict):
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any, final
+
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractExchange, AbstractIncomingMessage, AbstractQueue
+
+from .classes import ClientResponseConfig
+from .logger import get_logger
+
+logger = get_logger("client_responses")
+
+
+def timeout_response() -> dict[str, Any]:
+    """Response given to a tool whose client did not answer in time"""
+    return {"success": False, "reason": "Execution timeout"}
+
+
+def _set_result(future: asyncio.Future[Any], response: Any):
+    # The waiter may have timed out between the lookup and this call
+    if not future.done():
+        future.set_result(response)
+
+
+@final
+class ClientResponseRegistry:
+    """
+    Correlates the `client_response` events with the tools waiting for them, by tool call id.
+
+    Each wait registers a future resolved on the waiter's event loop, from the socket thread or the loop itself.
+    Responses that arrive before their tool waits for them, or after it gave up, are kept as orphans with a TTL
+    and a maximum count, so a client answering faster than the tool starts waiting is not lost.
+    """
+
+    def __init__(self, config: ClientResponseConfig):
+        self.config = config
+        self._waiters: dict[str, asyncio.Future[Any]] = {}
+        self._orphans: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Stats
+        self.delivered = 0
+        self.orphans_used = 0
+        self.orphans_dropped = 0
+
+    async def wait(self, tool_call_id: str, timeout: float) -> Any:
+        """Response of a tool call, or the timeout response after `timeout` seconds"""
+        return (await self.wait_many([tool_call_id], timeout))[tool_call_id]
+
+    async def wait_many(self, tool_call_ids: Iterable[str], timeout: float) -> dict[str, Any]:
+        """
+        Responses of several tool calls, waited for together until a shared deadline.
+        The tool calls not answered after `timeout` seconds get the timeout response.
+        """
+        loop = asyncio.get_running_loop()
+        futures: dict[str, asyncio.Future[Any]] = {}
+        with self._lock:
+            self._expire_orphans()
+            for tool_call_id in tool_call_ids:
+                future = futures[tool_call_id] = loop.create_future()
+                orphan = self._orphans.pop(tool_call_id, None)
+                if orphan is not None:
+                    self.orphans_used += 1
+                    future.set_result(orphan[1])
+                else:
+                    self._waiters[tool_call_id] = future
+
+        try:
+            pending = [future for future in futures.values() if not future.done()]
+            if pending:
+                await asyncio.wait(pending, timeout=timeout)
+            return {
+                tool_call_id: future.result() if future.done() else timeout_response()
+                for tool_call_id, future in futures.items()
+            }
+        finally:
+            with self._lock:
+                for tool_call_id, future in futures.items():
+                    if self._waiters.get(tool_call_id) is future:
+                        del self._waiters[tool_call_id]
+
+    def resolve(self, tool_call_id: str, response: Any) -> bool:
+        """Deliver a response to the tool waiting for it in this process, returns False when no tool waits for it"""
+        with self._lock:
+            future = self._waiters.pop(tool_call_id, None)
+            if future is None:
+                return False
+            self.delivered += 1
+
+        loop = future.get_loop()
+        try:
+            running_loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is loop:
+            _set_result(future, response)
+            return True
+        try:
+            # Received on the threaded socket client, the future belongs to the serve loop
+            loop.call_soon_threadsafe(_set_result, future, response)
+        except RuntimeError:
+            # The loop of the waiter is closed, nobody is waiting anymore
+            return False
+        return True
+
+    def keep_orphan(self, tool_call_id: str, response: Any):
+        """Keep a response that no tool waits for, a tool starting to wait for it later gets it immediately"""
+        with self._lock:
+            self._orphans[tool_call_id] = (time.monotonic() + self.config.orphan_ttl_seconds, response)
+            self._orphans.move_to_end(tool_call_id)
+            self._expire_orphans()
+            while len(self._orphans) > self.config.max_orphans:
+                self._orphans.popitem(last=False)
+                self.orphans_dropped += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "waiting": len(self._waiters),
+                "orphans": len(self._orphans),
+                "delivered": self.delivered,
+                "orphans_used": self.orphans_used,
+                "orphans_dropped": self.orphans_dropped,
+            }
+
+    # The lock must be held
+    def _expire_orphans(self):
+        # Every orphan has the same TTL, the oldest insertions expire first
+        now = time.monotonic()
+        while self._orphans:
+            tool_call_id, (expires_at, _) = next(iter(self._orphans.items()))
+            if expires_at > now:
+                break
+            del self._orphans[tool_call_id]
+            self.orphans_dropped += 1
+
+
+@final
+class ClientResponseRouter:
+    """
+    Routes the client responses between the worker processes of a namespace.
+
+    The runtime delivers a `client_response` on the socket of any worker. A worker with no tool waiting for it publishes
+    it to the `client_responses:{namespace}` fanout exchange, every worker receives it on its own exclusive queue and
+    the one running the tool resolves it, the others keep it as an orphan until it expires.
+    """
+
+    def __init__(self, registry: ClientResponseRegistry, namespace: str):
+        self.registry = registry
+        self.exchange_name = f"client_responses:{namespace}"
+        self._exchange: AbstractExchange | None = None
+        self._queue: AbstractQueue | None = None
+        self._consumer_tag: str | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._publish_tasks: set[asyncio.Task[None]] = set()
+        self.forwarded = 0
+
+    async def start(self, channel: AbstractChannel):
+        self._loop = asyncio.get_running_loop()
+        self._exchange = await channel.declare_exchange(self.exchange_name, aio_pika.ExchangeType.FANOUT)
+        # Server named, deleted with the connection of the worker
+        self._queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await self._queue.bind(self._exchange)
+        # A response lost with a crashed worker was only useful to the tool that crashed with it, no acks needed
+        self._consumer_tag = await self._queue.consume(self._on_message, no_ack=True)
+        logger.info("Routing client responses through '%s'", self.exchange_name)
+
+    async def stop(self):
+        if self._queue and self._consumer_tag:
+            try:
+                await self._queue.cancel(self._consumer_tag)
+            except Exception as e:
+                logger.warning("Failed to cancel the client response consumer: %s", e)
+        self._queue = None
+        self._consumer_tag = None
+        if self._publish_tasks:
+            await asyncio.gather(*self._publish_tasks, return_exceptions=True)
+
+    def forward(self, tool_call_id: str, response: Any) -> bool:
+        """Publish a response to the other workers, from the serve loop or the socket thread. False when not started"""
+        loop = self._loop
+        if loop is None or self._exchange is None or loop.is_closed():
+            return False
+        try:
+            running_loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is loop:
+            self._start_publish(tool_call_id, response)
+        else:
+            loop.call_soon_threadsafe(self._start_publish, tool_call_id, response)
+        return True
+
+    def _start_publish(self, tool_call_id: str, response: Any):
+        task = asyncio.get_running_loop().create_task(self._publish(tool_call_id, response))
+        self._publish_tasks.add(task)
+        task.add_done_callback(self._publish_tasks.discard)
+
+    async def _publish(self, tool_call_id: str, response: Any):
+        assert self._exchange is not None
+        try:
+            await self._exchange.publish(
+                aio_pika.Message(
+                    body=json.dumps({"toolCallId": tool_call_id, "response": response}).encode("utf-8"),
+                    content_type="application/json"
+                ),
+                routing_key=""
+            )
+            self.forwarded += 1
+        except Exception as e:
+            # The response stays with this worker, it is only lost for a tool running in another one
+            logger.warning("Failed to forward the client response of %s: %s", tool_call_id, e)
+            self.registry.keep_orphan(tool_call_id, response)
+
+    async def _on_message(self, message: AbstractIncomingMessage):
+        try:
+            data = json.loads(message.body)
+            tool_call_id = data["toolCallId"]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error("Invalid forwarded client response: %s", e)
+            return
+        # Forwarded responses are never forwarded again, including the ones this worker published itself
+        if not self.registry.resolve(tool_call_id, data.get("response")):
+            self.registry.keep_orphan(tool_call_id, data.get("response"))
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, final
+
+from .classes import ConcurrencyConfig
+from .logger import get_logger
+
+logger = get_logger("concurrency")
+
+
+@final
+class AdaptiveConcurrencyController:
+    """
+    AIMD controller of the number of concurrent workers.
+
+    Every interval it looks at the runs finished in the window and at the event loop lag:
+    - the limit is cut by decrease_factor when the error rate, the loop lag or the average run latency is too high
+    - otherwise the limit grows by increase_step when the workers were saturated (tasks waiting for a slot)
+    The limit always stays within [min_workers, max_workers].
+    """
+
+    def __init__(
+        self,
+        config: ConcurrencyConfig,
+        initial_limit: int,
+        resize: Callable[[int], Awaitable[None]],
+        is_saturated: Callable[[], bool]
+    ):
+        self.config = config
+        self.limit = max(config.min_workers, min(config.max_workers, initial_limit))
+        self.resize = resize
+        self.is_saturated = is_saturated
+
+        self._tasks: list[asyncio.Task[None]] = []
+        self._saturated = False
+
+        # Window stats, reset on every adjustment
+        self._runs = 0
+        self._errors = 0
+        self._total_latency = 0.0
+        self._max_loop_lag = 0.0
+
+        # Last decision, for logging and debugging
+        self.last_error_rate = 0.0
+        self.last_avg_latency = 0.0
+        self.last_loop_lag = 0.0
+
+    def record_run(self, duration: float, success: bool):
+        self._runs += 1
+        self._total_latency += duration
+        if not success:
+            self._errors += 1
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._control()), loop.create_task(self._monitor_loop_lag())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _monitor_loop_lag(self):
+        interval = self.config.loop_lag_probe_interval
+        while True:
+            started_at = time.monotonic()
+            await asyncio.sleep(interval)
+            lag = time.monotonic() - started_at - interval
+            self._max_loop_lag = max(self._max_loop_lag, lag)
+            # Saturation is sampled too, a single check per interval could miss short bursts
+            self._saturated = self._saturated or self.is_saturated()
+
+    async def _control(self):
+        while True:
+            await asyncio.sleep(self.config.interval)
+            new_limit = self._next_limit()
+            if new_limit != self.limit:
+                logger.info(
+                    "Concurrency %d -> %d (error rate: %.2f, avg latency: %.2fs, loop lag: %.0fms)",
+                    self.limit, new_limit, self.last_error_rate, self.last_avg_latency, self.last_loop_lag * 1000
+                )
+                self.limit = new_limit
+                await self.resize(new_limit)
+
+    def _next_limit(self) -> int:
+        self.last_error_rate = self._errors / self._runs if self._runs else 0.0
+        self.last_avg_latency = self._total_latency / self._runs if self._runs else 0.0
+        self.last_loop_lag = self._max_loop_lag
+        saturated = self._saturated or self.is_saturated()
+
+        self._runs = 0
+        self._errors = 0
+        self._total_latency = 0.0
+        self._max_loop_lag = 0.0
+        self._saturated = False
+
+        overloaded = (
+            self.last_error_rate > self.config.max_error_rate
+            or self.last_loop_lag > self.config.max_loop_lag
+            or (self.config.target_latency is not None and self.last_avg_latency > self.config.target_latency)
+        )
+
+        if overloaded:
+            limit = int(self.limit * self.config.decrease_factor)
+        elif saturated:
+            limit = self.limit + self.config.increase_step
+        else:
+            limit = self.limit
+
+        return max(self.config.min_workers, min(self.config.max_workers, limit))
@@ -0,0 +1,90 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, final
+
+from .classes import RuntimeMessage, ThreadHistoryConfig
+from .thread_cache import ThreadMessageCache, estimate_message_size
+
+
+@dataclass
+class _SyncedThread:
+    # Runtime message id -> (creation time, converted langgraph messages), the runtime messages themselves are not kept
+    messages: dict[str, tuple[str, list[Any]]] = field(default_factory=dict)
+    last_updated_at: str | None = None
+    last_message_id: str | None = None
+
+
+@final
+class ThreadHistorySync:
+    """
+    Incremental sync of thread histories with the runtime.
+    The first fetch of a thread pages through the history up to the configured depth,
+    later fetches only ask for the messages updated after the last seen one and merge them by id.
+    The synced histories are kept in the thread cache, within its byte budget.
+    """
+
+    def __init__(
+        self,
+        config: ThreadHistoryConfig,
+        convert: Callable[[RuntimeMessage], list[Any]],
+        cache: ThreadMessageCache
+    ):
+        self.config = config
+        self.convert = convert
+        self.cache = cache
+        self._lock = threading.Lock()
+
+    def request_params(self, thread_id: str) -> dict[str, Any]:
+        """Query params of the first page, a delta request when the thread was synced before"""
+        params: dict[str, Any] = { "threadId": thread_id, "limit": min(self.config.page_size, self.config.depth) }
+
+        with self._lock:
+            synced: _SyncedThread | None = self.cache.get_synced(thread_id) if self.config.incremental else None
+            if synced and synced.last_updated_at:
+                params["updatedAfter"] = synced.last_updated_at
+                if synced.last_message_id:
+                    params["afterMessageId"] = synced.last_message_id
+
+        return params
+
+    def next_page_params(self, params: dict[str, Any], response_data: dict[str, Any], fetched: int) -> dict[str, Any] | None:
+        """Query params of the next page, None when the history depth is reached or there are no more pages"""
+        cursor = response_data.get("nextCursor")
+        if not cursor or not response_data.get("data") or fetched >= self.config.depth:
+            return None
+        return { **params, "cursor": cursor, "limit": min(self.config.page_size, self.config.depth - fetched) }
+
+    def apply(self, thread_id: str, runtime_messages: list[RuntimeMessage]) -> list[Any]:
+        """Merge the fetched messages into the synced history and return the converted history"""
+        with self._lock:
+            previous: _SyncedThread | None = self.cache.get_synced(thread_id) if self.config.incremental else None
+            # A new state, readers of the previous one are not affected
+            synced = _SyncedThread(
+                dict(previous.messages),
+                previous.last_updated_at,
+                previous.last_message_id
+            ) if previous else _SyncedThread()
+
+            for message in runtime_messages:
+                # Updated messages (e.g. a tool call that got its results) replace the old version
+                synced.messages[message["id"]] = (message.get("createdAt") or "", self.convert(message))
+
+                updated_at = message.get("updatedAt") or message.get("createdAt")
+                if updated_at and (synced.last_updated_at is None or updated_at >= synced.last_updated_at):
+                    synced.last_updated_at = updated_at
+                    synced.last_message_id = message["id"]
+
+            ordered = sorted(synced.messages.items(), key=lambda item: item[1][0])
+            if len(ordered) > self.config.depth:
+                ordered = ordered[-self.config.depth:]
+            synced.messages = dict(ordered)
+            history = [converted_message for _, (_, converted) in ordered for converted_message in converted]
+
+            if self.config.incremental:
+                size = sum(estimate_message_size(message) for message in history)
+                self.cache.set_synced(thread_id, synced, size, self.config.max_threads)
+
+            return history
+
+    def forget(self, thread_id: str):
+        self.cache.delete_synced(thread_id)
@@ -1,11 +1,15 @@
+from contextlib import nullcontext
 from typing import Any, cast
 from langgraph.graph.state import CompiledStateGraph
 from langchain_core.runnables import RunnableConfig
 
 from .callback_handler import JarvisKitCallbackHandler
-from .classes import SocketConfig, RabbitMQConfig
+from .classes import SocketConfig, RabbitMQConfig, StreamConfig, OutboundQueueConfig, HttpConfig, ThreadCacheConfig, ThreadHistoryConfig, MetricsConfig, TracingConfig, LoggingConfig, AgentSchedulingConfig, ModelRegistryConfig, LLMCacheConfig, ClientResponseConfig
 from .jarvis_runtime import JarvisKitRuntime
 from .classes import MessageEvent
+from .logger import get_logger
+
+logger = get_logger("runtime")
 
 # Global runtime instance
 _runtime: JarvisKitRuntime | None = None
@@ -18,7 +22,19 @@ def init_runtime(
     agents: dict[str, CompiledStateGraph[Any, Any, Any]] = {},
     timeout: int = 10,
     max_concurrent_workers: int = 2,
-    rabbitmq_config: RabbitMQConfig | None = None
+    rabbitmq_config: RabbitMQConfig | None = None,
+    stream_config: StreamConfig | None = None,
+    outbound_queue_config: OutboundQueueConfig | None = None,
+    http_config: HttpConfig | None = None,
+    thread_cache_config: ThreadCacheConfig | None = None,
+    thread_history_config: ThreadHistoryConfig | None = None,
+    metrics_config: MetricsConfig | None = None,
+    tracing_config: TracingConfig | None = None,
+    logging_config: LoggingConfig | None = None,
+    agent_scheduling: dict[str, AgentSchedulingConfig] | None = None,
+    model_registry_config: ModelRegistryConfig | None = None,
+    llm_cache_config: LLMCacheConfig | None = None,
+    client_response_config: ClientResponseConfig | None = None
 
 ) -> JarvisKitRuntime:
     """Initialize the agent runtime and wait for connection"""
@@ -31,18 +47,35 @@ def init_runtime(
         socket_config=socket_config,
         agents=agents,
         max_concurrent_workers=max_concurrent_workers,
-        rabbitmq_config=rabbitmq_config
+        rabbitmq_config=rabbitmq_config,
+        stream_config=stream_config,
+        outbound_queue_config=outbound_queue_config,
+        http_config=http_config,
+        thread_cache_config=thread_cache_config,
+        thread_history_config=thread_history_config,
+        metrics_config=metrics_config,
+        tracing_config=tracing_config,
+        logging_config=logging_config,
+        agent_scheduling=agent_scheduling,
+        model_registry_config=model_registry_config,
+        llm_cache_config=llm_cache_config,
+        client_response_config=client_response_config
     )
     
+    # The async transport connects on the worker's event loop when serve() starts
+    if _runtime.async_transport:
+        logger.info(
+            "Agent runtime initialized, connection will be established on serve. Space name: %s, agents: %s",
+            _runtime.namespace, ", ".join(_runtime.agents.keys())
+        )
+        return _runtime
+    
     # Wait for connection to be established
     if _runtime.wait_for_connection(timeout):
-        print("Agent runtime initialized successfully")
-        print(f"Space name: {_runtime.namespace}")
-        print(f"Agents: {', '.join(_runtime.agents.keys())}")
-        print("-"*100)
+        logger.info("Agent runtime initialized successfully. Space name: %s, agents: %s", _runtime.namespace, ", ".join(_runtime.agents.keys()))
         return _runtime
     else:
-        print(f"Failed to initialize agent runtime '{namespace}' within {timeout} seconds")
+        logger.error("Failed to initialize agent runtime '%s' within %d seconds", namespace, timeout)
         exit(1)
 
 def get_runtime() -> JarvisKitRuntime:
@@ -51,19 +84,30 @@ def get_runtime() -> JarvisKitRuntime:
     return _runtime
 
 async def default_message_handler(agent: CompiledStateGraph[Any, Any, Any], event: MessageEvent) -> bool:
-    try:
-        config: RunnableConfig = RunnableConfig(
-            configurable={
-                "thread_id": event.message["thread"],
-                "checkpoint_ns": agent.name,
-                **event.config
-            },
-            callbacks=[JarvisKitCallbackHandler(get_runtime(), event.message["thread"])]
-        )
-        
-        await agent.ainvoke(cast(Any, {}), config=config)
-        
-        return True
-    except Exception as e:
-        print(f"Task execution failed: {e}")
-        return False
+    tracer = get_runtime().tracer
+    # Root span of the task, the spans of the nodes, llm and tool calls are recorded under it by the callback handler
+    task_span = tracer.span(f"task {event.agent_name}", attributes={
+        "agent.name": event.agent_name,
+        "thread.id": event.message["thread"],
+        "message.id": event.message["id"]
+    }) if tracer else nullcontext()
+    
+    with task_span as span:
+        try:
+            config: RunnableConfig = RunnableConfig(
+                configurable={
+                    "thread_id": event.message["thread"],
+                    "checkpoint_ns": agent.name,
+                    **event.config
+                },
+                callbacks=[JarvisKitCallbackHandler(get_runtime(), event.message["thread"])]
+            )
+            
+            await agent.ainvoke(cast(Any, {}), config=config)
+            
+            return True
+        except Exception as e:
+            if span:
+                span.set_error(e)
+            logger.error("Task execution failed: %s", e, extra={"agent": event.agent_name, "thread_id": event.message["thread"]})
+            return False
@@ -1,19 +1,35 @@
 import json
 import os
+import time
 import asyncio
 from langgraph.graph.state import CompiledStateGraph
 
-from typing import Any, Callable, Awaitable, final, cast
+from collections.abc import Iterable, Sequence
+from typing import Any, Callable, Awaitable, Coroutine, final, cast
 from ag_ui.core.events import Event
-from langgraph.store.memory import InMemoryStore
-import requests
+import httpx
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
 
 import socketio
 import threading
-from .classes import SocketConfig, RuntimeMessage, ClientResponseData, MessageEvent, RabbitMQConfig
-from .agui_util import encode_event
+from .classes import SocketConfig, RuntimeMessage, ClientResponseData, MessageEvent, RabbitMQConfig, StreamConfig, OutboundQueueConfig, HttpConfig, ThreadCacheConfig, ThreadHistoryConfig, MetricsConfig, TracingConfig, LoggingConfig, AgentSchedulingConfig, ModelRegistryConfig, LLMCacheConfig, ClientResponseConfig
+from .outbound import AguiPayload, OutboundEventQueue, build_agui_payload
+from .agui_codec import AguiCodec, MSGPACK_FRAME_VERSION, available_codecs, encode_msgpack_frame, msgpack_key_table
+from .thread_cache import ThreadMessageCache
+from .history_sync import ThreadHistorySync
+from .single_flight import SingleFlight
 from .rabbit import AsyncRabbitMQSubscriber
+from .metrics import RuntimeMetrics, MetricsServer
+from .supervisor import WORKER_ID_ENV
+from .tracing import Tracer, TracedCheckpointSaver
+from .logger import configure_logging, get_logger
+from .model_registry import ModelRegistry
+from .llm_cache import LLMResponseCache
+from .client_responses import ClientResponseRegistry, ClientResponseRouter
+from langchain_core.globals import set_llm_cache
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+logger = get_logger("runtime")
 
 
 @final
@@ -21,14 +37,13 @@ class JarvisKitRuntime:
     namespace: str | None = None # The name of agent space
     namespace_api_key: str | None = None # The api key of agent space
     
-    store: InMemoryStore = InMemoryStore()
-    pending_responses: dict[str, asyncio.Event] = {}
-    response_data: dict[str, Any] = {}
+    thread_cache: ThreadMessageCache
     agents: dict[str, CompiledStateGraph[Any, Any, Any]] = {}
     
     _connection_event: threading.Event = threading.Event()
     _loop: asyncio.AbstractEventLoop | None = None
     rabbitmq_config: RabbitMQConfig
+    stream_config: StreamConfig
     
     def __init__(
         self,
@@ -40,14 +55,90 @@ class JarvisKitRuntime:
         timeout: int = 30,
         max_concurrent_workers: int = 2,
         rabbitmq_config: RabbitMQConfig | None = None,
+        stream_config: StreamConfig | None = None,
+        outbound_queue_config: OutboundQueueConfig | None = None,
+        http_config: HttpConfig | None = None,
+        thread_cache_config: ThreadCacheConfig | None = None,
+        thread_history_config: ThreadHistoryConfig | None = None,
+        metrics_config: MetricsConfig | None = None,
+        tracing_config: TracingConfig | None = None,
+        logging_config: LoggingConfig | None = None,
+        agent_scheduling: dict[str, AgentSchedulingConfig] | None = None,
+        model_registry_config: ModelRegistryConfig | None = None,
+        llm_cache_config: LLMCacheConfig | None = None,
+        client_response_config: ClientResponseConfig | None = None,
     ):
+        configure_logging(logging_config or LoggingConfig())
         self.namespace = namespace
         self.namespace_api_key = namespace_api_key
         self.runtime_endpoint = runtime_endpoint
+        # Spans are only recorded when tracing_config is set
+        self.tracer = Tracer(tracing_config) if tracing_config else None
         self.agents = agents
+        for agent in agents.values():
+            self._trace_checkpointer(agent)
         self.max_concurrent_workers = max_concurrent_workers
+        # Weight, priority and concurrency cap of the agents, the others get the default AgentSchedulingConfig
+        self.agent_scheduling = dict(agent_scheduling or {})
         self.rabbitmq_config = rabbitmq_config
+        self.stream_config = stream_config or StreamConfig()
+        self.socket_config = socket_config
+        self.http_config = http_config or HttpConfig()
+        self.thread_cache = ThreadMessageCache(thread_cache_config or ThreadCacheConfig())
+        self.history_sync = ThreadHistorySync(thread_history_config or ThreadHistoryConfig(), self.convert_runtime_message, self.thread_cache)
+        # Concurrent cache misses of the same thread share one fetch
+        self._history_fetches = SingleFlight()
+        # Pooled http clients to the runtime, created on first use
+        self._http_client: httpx.Client | None = None
+        self._async_http_client: httpx.AsyncClient | None = None
+        self.async_transport = socket_config.transport_mode == "async"
+        # Codec of the agui_event frames, negotiated with the runtime on every connection
+        self.agui_codecs = available_codecs(socket_config.agui_codecs)
+        self.agui_codec: AguiCodec = "json"
         self._connection_event = threading.Event()
+        self._async_connection_event: asyncio.Event | None = None
+        self._background_tasks: set[asyncio.Task[None]] = set()
+        self.rabbitmq_subscriber: AsyncRabbitMQSubscriber | None = None
+        # Loop running serve(), the running subscriber is only resized on it
+        self._serve_loop: asyncio.AbstractEventLoop | None = None
+        # Shared chat model clients for the graph nodes, see ModelRegistry.get
+        self.models = ModelRegistry(model_registry_config or ModelRegistryConfig())
+        # Llm responses cached for the retried and redelivered tasks, through the global cache of langchain
+        # so every chat model without an explicit `cache` uses it
+        self.llm_cache = LLMResponseCache(llm_cache_config) if llm_cache_config else None
+        if self.llm_cache:
+            set_llm_cache(self.llm_cache)
+        # Client tool responses by tool call id, routed between the worker processes while serve() runs
+        self.client_response_config = client_response_config or ClientResponseConfig()
+        self.client_responses = ClientResponseRegistry(self.client_response_config)
+        self.client_response_router: ClientResponseRouter | None = None
+        
+        # Metrics are always recorded, the http endpoint is only served when metrics_config is set
+        self.metrics = RuntimeMetrics()
+        self.metrics.registry.add_collector(self._collect_metrics)
+        self.metrics_config = metrics_config
+        self.metrics_server: MetricsServer | None = None
+        
+        # Optional outbound pipeline, events are emitted by a background drainer instead of inline in the callbacks
+        self.outbound_queue: OutboundEventQueue | None = None
+        if outbound_queue_config:
+            self.outbound_queue = OutboundEventQueue(outbound_queue_config, self._emit_agui_batch, self._build_agui_payload)
+        
+        if self.async_transport:
+            # The async client is connected on the worker's own event loop by aconnect() (called from serve())
+            self._loop = None
+            self.sio = socketio.AsyncClient(
+                reconnection=socket_config.reconnection,
+                reconnection_attempts=socket_config.reconnection_attempts,
+                reconnection_delay=socket_config.reconnection_delay,
+                reconnection_delay_max=socket_config.reconnection_delay_max,
+            )
+            
+            self.sio.on("connect", self.aon_connect)
+            self.sio.on("disconnect", self.on_disconnect)
+            self.sio.on("client_response", self.handle_client_response)
+            return
+        
         try:
             self._loop = asyncio.get_running_loop()
         except RuntimeError:
@@ -71,16 +162,50 @@ class JarvisKitRuntime:
             auth={"namespace_api_key": self.namespace_api_key},
             wait_timeout=10,
             retry=True,
-            transports=['polling']
+            transports=socket_config.transports or ['polling']
         )
 
     def set_max_concurrent_workers(self, max_concurrent_workers: int):
+        """Change the worker limit, from the serve loop or from another thread (an admin or metrics handler)"""
         self.max_concurrent_workers = max_concurrent_workers
+        
+        # Resize the running subscriber too, not only the value used by the next serve()
+        subscriber = self.rabbitmq_subscriber
+        if subscriber:
+            self._call_on_serve_loop(lambda: self._start_background_task(subscriber.set_max_concurrent_workers(max_concurrent_workers)))
+    
+    def set_agent_scheduling(self, agent_name: str, config: AgentSchedulingConfig):
+        """Change the weight, priority or concurrency cap of an agent, applied to the running subscriber too"""
+        self.agent_scheduling[agent_name] = config
+        subscriber = self.rabbitmq_subscriber
+        if subscriber:
+            self._call_on_serve_loop(lambda: subscriber.scheduler.semaphore.set_flow_config(agent_name, config))
+    
+    def _call_on_serve_loop(self, callback: Callable[[], Any]):
+        # The scheduler wakes up waiters of the serve loop, it is not thread-safe
+        loop = self._serve_loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running_loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        
+        if running_loop is loop:
+            callback()
+        else:
+            loop.call_soon_threadsafe(callback)
+    
+    def _start_background_task(self, coroutine: Coroutine[Any, Any, None]):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
 
     # Agent management
     def add_agent(self, agent_name: str, agent: CompiledStateGraph[Any, Any, Any]):
+        self._trace_checkpointer(agent)
         self.agents[agent_name] = agent
-        print(f"[{agent_name}] has been registered")
+        logger.info("[%s] has been registered", agent_name)
     
     def get_agent(self, agent_name: str) -> CompiledStateGraph[Any, Any, Any]:
         agent = self.agents.get(agent_name)
@@ -92,133 +217,377 @@ class JarvisKitRuntime:
     
     def get_agents(self) -> dict[str, CompiledStateGraph[Any, Any, Any]]:
         return self.agents
+    
+    def _trace_checkpointer(self, agent: CompiledStateGraph[Any, Any, Any]):
+        if self.tracer and isinstance(agent.checkpointer, BaseCheckpointSaver) and not isinstance(agent.checkpointer, TracedCheckpointSaver):
+            agent.checkpointer = TracedCheckpointSaver(agent.checkpointer, self.tracer)
         
     async def serve(self, handler: Callable[[CompiledStateGraph[Any, Any, Any], MessageEvent], Awaitable[bool]]):
+        if self.async_transport and not self.is_connected():
+            if not await self.aconnect():
+                raise RuntimeError(f"Failed to connect to agent runtime '{self.runtime_endpoint}'")
+        
         ssl_context = self.rabbitmq_config.ssl_context
-        rabbitmq_subscriber = AsyncRabbitMQSubscriber(
+        self.rabbitmq_subscriber = rabbitmq_subscriber = AsyncRabbitMQSubscriber(
             url=self.rabbitmq_config.url,
             ssl_context=ssl_context,
-            max_concurrent_workers=self.max_concurrent_workers
+            max_concurrent_workers=self.max_concurrent_workers,
+            prefetch_count=self.rabbitmq_config.prefetch_count,
+            retry_config=self.rabbitmq_config.retry_config,
+            concurrency_config=self.rabbitmq_config.concurrency_config,
+            metrics=self.metrics,
+            agent_scheduling=self.agent_scheduling
         )
+        self._serve_loop = asyncio.get_running_loop()
         await rabbitmq_subscriber.connect()
         await rabbitmq_subscriber.declare_queue(f'tasks_queue:{self.namespace}', durable=True)
+        
+        route_client_responses = self.client_response_config.route_through_rabbitmq
+        if route_client_responses is None:
+            route_client_responses = os.getenv(WORKER_ID_ENV) is not None
+        if route_client_responses:
+            assert rabbitmq_subscriber.channel is not None
+            self.client_response_router = ClientResponseRouter(self.client_responses, cast(str, self.namespace))
+            await self.client_response_router.start(rabbitmq_subscriber.channel)
             
-        await rabbitmq_subscriber.subscribe(
-            queue_name=f'tasks_queue:{self.namespace}',
-            callback=lambda event: handler(self.get_agent(event.agent_name), event)
-        )
+        if self.outbound_queue:
+            self.outbound_queue.start()
+        
+        # On the serve loop, the async http clients of the models are bound to it
+        await self.models.warmup()
+        
+        if self.metrics_config:
+            # Workers of the multi-process mode each serve their own metrics
+            port = self.metrics_config.port + int(os.getenv(WORKER_ID_ENV, "0"))
+            self.metrics_server = MetricsServer(self.metrics, self.metrics_config, port)
+            self.metrics_server.start()
+        
+        try:
+            # Agents added after serve() started are only consumed from the shared queue
+            agent_queues = [f'tasks_queue:{self.namespace}:{agent_name}' for agent_name in self.agents] if self.rabbitmq_config.per_agent_queues else []
+            await rabbitmq_subscriber.subscribe(
+                queue_name=f'tasks_queue:{self.namespace}',
+                callback=lambda event: handler(self.get_agent(event.agent_name), event),
+                additional_queue_names=agent_queues
+            )
+        finally:
+            if self.client_response_router:
+                await self.client_response_router.stop()
+                self.client_response_router = None
+            if self.outbound_queue:
+                await self.outbound_queue.close()
+            await self.aclose_http_clients()
+            if self.metrics_server:
+                self.metrics_server.stop()
+                self.metrics_server = None
         
      # Socket.io events
     def on_connect(self):
-        self.sio.emit("join_agent_space", { "name": self.namespace, "api_key": self.namespace_api_key })
+        self.agui_codec = "json"
+        self.sio.emit("join_agent_space", self._join_agent_space_data(), callback=self._on_join_agent_space)
         self._connection_event.set()  # Signal that connection is established
-        print("Connected to agent runtime")
+        logger.info("Connected to agent runtime")
         
-    def on_disconnect(self):
-        print("Disconnected from agent runtime")
+    async def aon_connect(self):
+        self.agui_codec = "json"
+        await self.sio.emit("join_agent_space", self._join_agent_space_data(), callback=self._on_join_agent_space)
+        self._connection_event.set()
+        if self._async_connection_event:
+            self._async_connection_event.set()
+        logger.info("Connected to agent runtime")
+        
+    def on_disconnect(self, *args: Any):
+        logger.warning("Disconnected from agent runtime")
+        self.agui_codec = "json"
         self._connection_event.clear()  # Clear the connection event
+        if self._async_connection_event:
+            self._async_connection_event.clear()
+        
+    def _join_agent_space_data(self) -> dict[str, Any]:
+        data: dict[str, Any] = { "name": self.namespace, "api_key": self.namespace_api_key }
+        if self.agui_codecs != ["json"]:
+            data["agui_codecs"] = self.agui_codecs
+        if "msgpack" in self.agui_codecs:
+            # Frames only carry the index of their event type and the field values, the keys are sent once here
+            data["agui_key_table"] = { "version": MSGPACK_FRAME_VERSION, "events": msgpack_key_table() }
+        return data
+    
+    def _on_join_agent_space(self, *args: Any):
+        """Acknowledgement of join_agent_space, runtimes that negotiate the codec answer with the one they picked"""
+        ack = args[0] if args else None
+        codec = ack.get("agui_codec") if isinstance(ack, dict) else None
+        if codec not in self.agui_codecs:
+            # Older runtimes do not acknowledge the join or ignore the offer, frames stay JSON
+            return
+        self.agui_codec = cast(AguiCodec, codec)
+        logger.info("Sending agui events as %s", codec)
         
     def wait_for_connection(self, timeout: int = 30) -> bool:
         """Wait for the runtime to be connected"""
         return self._connection_event.wait(timeout)
     
+    async def aconnect(self, timeout: int = 30) -> bool:
+        """
+        Connect the async socket.io client on the running event loop.
+        Websocket is used first and polling is only used as a fallback when no transports are configured.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._async_connection_event = asyncio.Event()
+        
+        sio = cast(socketio.AsyncClient, self.sio)
+        auth = {"namespace_api_key": self.namespace_api_key}
+        if self.socket_config.transports:
+            await sio.connect(url=self.runtime_endpoint, auth=auth, wait_timeout=timeout, retry=True, transports=self.socket_config.transports)
+        else:
+            try:
+                await sio.connect(url=self.runtime_endpoint, auth=auth, wait_timeout=timeout, transports=['websocket'])
+            except socketio.exceptions.ConnectionError as e:
+                logger.warning("Websocket connection failed: %s. Falling back to polling", e)
+                await sio.connect(url=self.runtime_endpoint, auth=auth, wait_timeout=timeout, retry=True, transports=['polling'])
+        
+        try:
+            await asyncio.wait_for(self._async_connection_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+    
     def is_connected(self) -> bool:
         """Check if the runtime is connected"""
         return self._connection_event.is_set()
     
     # Message management
+    def convert_runtime_message(self, message: RuntimeMessage) -> list[Any]:
+        """Convert one runtime message to the langgraph messages it stands for"""
+        if message["role"] == "user":
+            # User message
+            return [HumanMessage(id=message["id"], content=message["content"])]
+        elif message["role"] == "agent":
+            if message.get("toolCallId"):
+                # Tool call message
+                langgraph_messages: list[Any] = [
+                    AIMessage(
+                        id=message["id"],
+                        content=message["content"],
+                        tool_calls=[
+                            {
+                                "id": message["toolCallId"],
+                                "name": message["toolName"],
+                                "args": message["toolInput"],
+                                "type": "tool_call"
+                            }
+                        ]
+                    )
+                ]
+                
+                if message.get("toolResults"):
+                    # Tool result message
+                    langgraph_messages.append(
+                        ToolMessage(
+                            tool_call_id=message["toolCallId"],
+                            content=json.dumps(message["toolResults"]),
+                            status="success" if message.get("toolStatus") else "error"
+                        )
+                    )
+                return langgraph_messages
+            else:
+                # Normal text message
+                return [AIMessage(id=message["id"], content=message["content"])]
+        else:
+            logger.warning("Unknown role: %s", message["role"], extra={"message_id": message.get("id")})
+            return []
+    
     def convert_message_to_langgraph_message(self, messages: list[RuntimeMessage]) -> list[Any]:
         """Convert the messages to the format expected by langgraph"""
         langgraph_messages = []
         
         for message in messages:
-            if message["role"] == "user":
-                # User message
-                langgraph_messages.append(HumanMessage(id=message["id"], content=message["content"]))
-            elif message["role"] == "agent":
-                if message.get("toolCallId"):
-                    # Tool call message
-                    langgraph_messages.append(
-                        AIMessage(
-                            id=message["id"],
-                            content=message["content"],
-                            tool_calls=[
-                                {
-                                    "id": message["toolCallId"],
-                                    "name": message["toolName"],
-                                    "args": message["toolInput"],
-                                    "type": "tool_call"
-                                }
-                            ]
-                        )
-                    )
-                    
-                    if message.get("toolResults"):
-                        # Tool result message
-                        langgraph_messages.append(
-                            ToolMessage(
-                                tool_call_id=message["toolCallId"],
-                                content=json.dumps(message["toolResults"]),
-                                status="success" if message.get("toolStatus") else "error"
-                            )
-                        )
-                else:
-                    # Normal text message
-                    langgraph_messages.append(AIMessage(id=message["id"], content=message["content"]))
-            else:
-                print(f"Unknown role: {message['role']}")
+            langgraph_messages.extend(self.convert_runtime_message(message))
         
-        print(langgraph_messages)
+        logger.debug("Converted %d runtime messages to %d langgraph messages", len(messages), len(langgraph_messages))
         return langgraph_messages
         
-    def get_messages(self, thread_id: str) -> list[Any]:
+    def get_messages(self, thread_id: str) -> Sequence[Any]:
+        if self.tracer:
+            with self.tracer.span("get_messages", attributes={"thread.id": thread_id}) as span:
+                messages = self._get_messages(thread_id)
+                span.set_attribute("messages.count", len(messages))
+                return messages
+        return self._get_messages(thread_id)
+    
+    async def aget_messages(self, thread_id: str) -> Sequence[Any]:
+        """Same as get_messages, but the thread history is fetched without blocking the event loop"""
+        if self.tracer:
+            with self.tracer.span("get_messages", attributes={"thread.id": thread_id}) as span:
+                messages = await self._aget_messages(thread_id)
+                span.set_attribute("messages.count", len(messages))
+                return messages
+        return await self._aget_messages(thread_id)
+    
+    def _get_messages(self, thread_id: str) -> Sequence[Any]:
         store_messages = self.get_store_messages(thread_id)
         if store_messages:
             return store_messages
         else:
-            params = { "threadId": thread_id, "limit": 30 }
-            headers = { 
-                "x-agent-namespace": self.namespace,
-                "x-agent-namespace-secret": self.namespace_api_key
-            }
-            print(f"{self.runtime_endpoint}/agents/get-thread-messages", headers, params)
-            response = requests.get(f"{self.runtime_endpoint}/agents/get-thread-messages", params=params, headers=headers)
-            
-            response_data = response.json()
-            
-            if not response_data.get("success"):
-                raise Exception(response_data.get("message", "Unknown error"))
-            
-            langgraph_messages = self.convert_message_to_langgraph_message(response.json().get("data", []))
-            self.set_store_messages(thread_id, langgraph_messages)
-            return langgraph_messages
-    
-    def get_store_messages(self, thread_id: str) -> list[Any]:
-        store_data = self.store.get(
-            namespace=("thread", thread_id),
-            key="memory"
-        )
-        return store_data.value.get("messages", []) if store_data else []
+            return self._history_fetches.do(thread_id, lambda: self._load_thread_history(thread_id))
+    
+    async def _aget_messages(self, thread_id: str) -> Sequence[Any]:
+        store_messages = self.get_store_messages(thread_id)
+        if store_messages:
+            return store_messages
+        else:
+            return await self._history_fetches.ado(thread_id, lambda: self._aload_thread_history(thread_id))
+    
+    def history_fetch_stats(self) -> dict[str, Any]:
+        """In-flight history fetches per thread and the number of requests saved by sharing them"""
+        return {
+            "in_flight": self._history_fetches.in_flight(),
+            "saved_requests": self._history_fetches.shared_calls
+        }
     
-    def set_store_messages(self, thread_id: str, messages: list[Any]):
-        self.store.put(
-            namespace=("thread", thread_id),
-            key="memory",
-            value={"messages": messages}
+    def _load_thread_history(self, thread_id: str) -> list[Any]:
+        langgraph_messages = self._fetch_thread_history(thread_id)
+        self.set_store_messages(thread_id, langgraph_messages)
+        return langgraph_messages
+    
+    async def _aload_thread_history(self, thread_id: str) -> list[Any]:
+        langgraph_messages = await self._afetch_thread_history(thread_id)
+        self.set_store_messages(thread_id, langgraph_messages)
+        return langgraph_messages
+    
+    def _fetch_thread_history(self, thread_id: str) -> list[Any]:
+        runtime_messages: list[RuntimeMessage] = []
+        params: dict[str, Any] | None = self.history_sync.request_params(thread_id)
+        while params is not None:
+            response_data = self._fetch_thread_messages(params)
+            runtime_messages.extend(response_data.get("data", []))
+            params = self.history_sync.next_page_params(params, response_data, len(runtime_messages))
+        
+        return self.history_sync.apply(thread_id, runtime_messages)
+    
+    async def _afetch_thread_history(self, thread_id: str) -> list[Any]:
+        runtime_messages: list[RuntimeMessage] = []
+        params: dict[str, Any] | None = self.history_sync.request_params(thread_id)
+        while params is not None:
+            response_data = await self._afetch_thread_messages(params)
+            runtime_messages.extend(response_data.get("data", []))
+            params = self.history_sync.next_page_params(params, response_data, len(runtime_messages))
+        
+        return self.history_sync.apply(thread_id, runtime_messages)
+    
+    # Runtime http api
+    def _thread_messages_request(self, params: dict[str, Any]) -> tuple[str, dict[str, Any], dict[str, str]]:
+        headers = { 
+            "x-agent-namespace": cast(str, self.namespace),
+            "x-agent-namespace-secret": cast(str, self.namespace_api_key)
+        }
+        # The headers carry the namespace secret and are never logged
+        logger.debug("Fetching thread messages with params %s", params)
+        return f"{self.runtime_endpoint}/agents/get-thread-messages", params, headers
+    
+    def _http_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.http_config.max_connections,
+            max_keepalive_connections=self.http_config.max_keepalive_connections,
+            keepalive_expiry=self.http_config.keepalive_expiry
         )
     
+    def _get_http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(timeout=self.http_config.timeout, limits=self._http_limits())
+        return self._http_client
+    
+    def _get_async_http_client(self) -> httpx.AsyncClient:
+        if self._async_http_client is None:
+            self._async_http_client = httpx.AsyncClient(timeout=self.http_config.timeout, limits=self._http_limits())
+        return self._async_http_client
+    
+    async def aclose_http_clients(self):
+        if self._http_client:
+            self._http_client.close()
+            self._http_client = None
+        if self._async_http_client:
+            await self._async_http_client.aclose()
+            self._async_http_client = None
+    
+    @staticmethod
+    def _parse_runtime_response(response: httpx.Response) -> dict[str, Any]:
+        response_data = response.json()
+        
+        if not response_data.get("success"):
+            raise Exception(response_data.get("message", "Unknown error"))
+        
+        return response_data
+    
+    def _should_retry(self, attempt: int, response: httpx.Response | None) -> bool:
+        if attempt >= self.http_config.retries:
+            return False
+        return response is None or response.status_code >= 500
+    
+    def _fetch_thread_messages(self, params: dict[str, Any]) -> dict[str, Any]:
+        url, params, headers = self._thread_messages_request(params)
+        started_at = time.monotonic()
+        status = "error"
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = self._get_http_client().get(url, params=params, headers=headers)
+                except httpx.TransportError:
+                    if not self._should_retry(attempt, None):
+                        raise
+                else:
+                    if not self._should_retry(attempt, response):
+                        response_data = self._parse_runtime_response(response)
+                        status = "ok"
+                        return response_data
+                
+                time.sleep(self.http_config.retry_backoff * 2 ** attempt)
+                attempt += 1
+        finally:
+            self.metrics.history_fetch_seconds.observe(time.monotonic() - started_at, status=status)
+    
+    async def _afetch_thread_messages(self, params: dict[str, Any]) -> dict[str, Any]:
+        url, params, headers = self._thread_messages_request(params)
+        started_at = time.monotonic()
+        status = "error"
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = await self._get_async_http_client().get(url, params=params, headers=headers)
+                except httpx.TransportError:
+                    if not self._should_retry(attempt, None):
+                        raise
+                else:
+                    if not self._should_retry(attempt, response):
+                        response_data = self._parse_runtime_response(response)
+                        status = "ok"
+                        return response_data
+                
+                await asyncio.sleep(self.http_config.retry_backoff * 2 ** attempt)
+                attempt += 1
+        finally:
+            self.metrics.history_fetch_seconds.observe(time.monotonic() - started_at, status=status)
+    
+    def get_store_messages(self, thread_id: str) -> Sequence[Any]:
+        """Read-only snapshot of the thread history, messages appended later are not visible in it"""
+        return self.thread_cache.get(thread_id) or []
+    
+    def set_store_messages(self, thread_id: str, messages: Iterable[Any]):
+        self.thread_cache.set(thread_id, messages)
+    
     def put_store_message(self, thread_id: str, message: BaseMessage):
-        old_messages = self.get_store_messages(thread_id)
-        self.set_store_messages(
-            thread_id,
-            messages=[*old_messages, message]
-        )
+        self.thread_cache.append(thread_id, message)
+    
+    def put_store_messages(self, thread_id: str, messages: Iterable[BaseMessage]):
+        self.thread_cache.extend(thread_id, messages)
         
     def clear_store_messages(self, thread_id: str):
-        self.store.delete(
-            namespace=("thread", thread_id),
-            key="memory"
-        )
+        self.thread_cache.delete(thread_id)
+    
+    def thread_cache_stats(self) -> dict[str, Any]:
+        """Hit, miss and eviction counters of the thread history cache"""
+        return self.thread_cache.stats()
     
     def prepare_tool_input(self, thread_id: str, state: Any) -> dict[str, Any]:
         """
@@ -227,40 +596,126 @@ class JarvisKitRuntime:
         """
         return { "messages": self.get_messages(thread_id), **state }
     
+    async def aprepare_tool_input(self, thread_id: str, state: Any) -> dict[str, Any]:
+        """Same as prepare_tool_input, but the thread history is fetched without blocking the event loop"""
+        return { "messages": await self.aget_messages(thread_id), **state }
+    
     # AGUI utils
     def send_agui_event(self, thread_id: str, session_id: str, event: Event, order: int):
-        self.sio.emit(
-            event="agui_event",
-            data = {
-                "threadId": thread_id,
-                "sessionId": session_id,
-                "event": encode_event(event),
-                "order": order
-            }
-        )
+        if self.outbound_queue:
+            self.outbound_queue.put_nowait(thread_id, session_id, event, order)
+            return
+        
+        data = self._build_agui_payload(thread_id, session_id, event, order)
+        
+        if self.async_transport:
+            # Called from sync code, schedule the emit on the running loop. Tasks start in creation order so the order is kept.
+            task = asyncio.get_running_loop().create_task(self._aemit_agui_payload(data))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            return
+        
+        self._emit_agui_payload(data)
+    
+    async def asend_agui_event(self, thread_id: str, session_id: str, event: Event, order: int):
+        if self.outbound_queue:
+            await self.outbound_queue.put(thread_id, session_id, event, order)
+            return
+        
+        if not self.async_transport:
+            self.send_agui_event(thread_id, session_id, event, order)
+            return
+        
+        await self._aemit_agui_payload(self._build_agui_payload(thread_id, session_id, event, order))
+    
+    def _build_agui_payload(self, thread_id: str, session_id: str, event: Event, order: int) -> AguiPayload:
+        started_at = time.perf_counter()
+        codec = self.agui_codec
+        payload = encode_msgpack_frame(thread_id, session_id, event, order) if codec == "msgpack" \
+            else build_agui_payload(thread_id, session_id, event, order)
+        self.metrics.agui_encode_seconds.observe(time.perf_counter() - started_at)
+        self.metrics.agui_events_total.inc(type=event.type.value, codec=codec)
+        return payload
+    
+    def _emit_agui_payload(self, payload: AguiPayload):
+        started_at = time.perf_counter()
+        cast(socketio.Client, self.sio).emit(event="agui_event", data=payload)
+        self.metrics.agui_emit_seconds.observe(time.perf_counter() - started_at)
+    
+    async def _aemit_agui_payload(self, payload: AguiPayload):
+        started_at = time.perf_counter()
+        await cast(socketio.AsyncClient, self.sio).emit(event="agui_event", data=payload)
+        self.metrics.agui_emit_seconds.observe(time.perf_counter() - started_at)
+    
+    async def _emit_agui_batch(self, payloads: list[AguiPayload]):
+        if self.async_transport:
+            for payload in payloads:
+                await self._aemit_agui_payload(payload)
+            return
+        
+        # The sync client blocks on network I/O, so the whole batch is emitted off the event loop in one hop
+        def emit_all():
+            for payload in payloads:
+                self._emit_agui_payload(payload)
+        await asyncio.to_thread(emit_all)
+    
+    def outbound_stats(self) -> dict[str, Any] | None:
+        """Queue depth and drain latency of the outbound pipeline, None when it is disabled"""
+        return self.outbound_queue.stats() if self.outbound_queue else None
+    
+    # Metrics
+    def _collect_metrics(self):
+        """Refresh the gauges that mirror the stats of the other components, called on every scrape"""
+        cache_stats = self.thread_cache.stats()
+        self.metrics.thread_cache_hits_total.set_total(cache_stats["hits"])
+        self.metrics.thread_cache_misses_total.set_total(cache_stats["misses"])
+        self.metrics.thread_cache_hit_ratio.set(cache_stats["hit_ratio"])
+        self.metrics.thread_cache_entries.set(cache_stats["entries"])
+        self.metrics.thread_cache_bytes.set(cache_stats["bytes"])
+        self.metrics.history_fetch_saved_requests_total.set_total(self._history_fetches.shared_calls)
+        
+        model_stats = self.models.stats()
+        self.metrics.model_clients.set(model_stats["clients"] + model_stats["bound_clients"])
+        self.metrics.model_registry_hits_total.set_total(model_stats["hits"])
+        self.metrics.model_registry_misses_total.set_total(model_stats["misses"])
+        
+        client_response_stats = self.client_responses.stats()
+        self.metrics.client_responses_waiting.set(client_response_stats["waiting"])
+        self.metrics.client_response_orphans.set(client_response_stats["orphans"])
+        
+        if self.llm_cache:
+            llm_cache_stats = self.llm_cache.stats()
+            self.metrics.llm_cache_hits_total.set_total(llm_cache_stats["hits"])
+            self.metrics.llm_cache_misses_total.set_total(llm_cache_stats["misses"])
+            self.metrics.llm_cache_entries.set(llm_cache_stats["entries"])
+        
+        subscriber = self.rabbitmq_subscriber
+        self.metrics.max_concurrent_workers.set(subscriber.max_concurrent_workers if subscriber else self.max_concurrent_workers)
+        
+        if self.outbound_queue:
+            self.metrics.outbound_queue_depth.set(self.outbound_queue.depth)
+            self.metrics.outbound_dropped_events_total.set_total(self.outbound_queue.dropped)
         
     def handle_client_response(self, data: ClientResponseData):
         tool_call_id = cast(str, data.get("toolCallId"))
-        keys = self.pending_responses.keys()
-        if tool_call_id in keys:
-            self.response_data[tool_call_id] = data.get("response")
-            if self._loop:
-                self._loop.call_soon_threadsafe(self.pending_responses[tool_call_id].set)
+        response = data.get("response")
+        if self.client_responses.resolve(tool_call_id, response):
+            return
+        
+        # The tool may run in another worker, or not wait for the response yet
+        if not (self.client_response_router and self.client_response_router.forward(tool_call_id, response)):
+            self.client_responses.keep_orphan(tool_call_id, response)
         
-    async def wait_for_client_response(self, tool_call_id: str, timeout: int = 30) -> Any:
+    async def wait_for_client_response(self, tool_call_id: str, timeout: float = 30) -> Any:
         """
         Wait for client response for a specific tool call ID.
-        Returns the response data or None if timeout occurs.
+        Returns the response data or a failed response if timeout occurs.
         """
-        event = asyncio.Event()
-        self.pending_responses[tool_call_id] = event
-        
-        try:
-            await asyncio.wait_for(event.wait(), timeout=timeout)
-            response = self.response_data.get(tool_call_id)
-            return response
-        except asyncio.TimeoutError:
-            return { "success": False, "reason": "Execution timeout" }
-        finally:
-            self.pending_responses.pop(tool_call_id, None)
-            self.response_data.pop(tool_call_id, None)
+        return await self.client_responses.wait(tool_call_id, timeout)
+    
+    async def wait_for_client_responses(self, tool_call_ids: Iterable[str], timeout: float = 30) -> dict[str, Any]:
+        """
+        Wait for the client responses of several tool calls with a shared deadline.
+        Returns the response of every tool call ID, a failed response for the ones not answered in time.
+        """
+        return await self.client_responses.wait_many(tool_call_ids, timeout)
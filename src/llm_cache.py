@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any, final, override
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from .classes import LLMCacheConfig
+from .logger import get_logger
+from .sqlite_store import SQLiteStore
+
+logger = get_logger("llm_cache")
+
+# Set in the generation_info of the generations served from the cache, the callback handler replays them to the ui
+CACHE_HIT_INFO_KEY = "jarvis_kit_cache_hit"
+
+# Fields of a serialized message that change what the model answers, the others (ids, token usage,
+# provider metadata) differ between two runs of the same conversation
+_PROMPT_MESSAGE_FIELDS = ("content", "name", "tool_calls", "tool_call_id")
+
+
+def _normalize_message(message: Any) -> Any:
+    if not isinstance(message, dict) or message.get("type") != "constructor":
+        return message
+
+    kwargs: dict[str, Any] = message.get("kwargs", {})
+    fields = {key: kwargs[key] for key in _PROMPT_MESSAGE_FIELDS if kwargs.get(key)}
+    if "tool_calls" in fields:
+        fields["tool_calls"] = [
+            {"name": tool_call.get("name"), "args": tool_call.get("args"), "id": tool_call.get("id")}
+            for tool_call in fields["tool_calls"]
+        ]
+    # AIMessageChunk and AIMessage are the same message for the model
+    return {"type": message["id"][-1].removesuffix("Chunk"), **fields}
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """
+    Hash of the normalized message list and of the llm string (model, init params and bound tools).
+    The prompt is the serialized message list given by the chat model, plain llms give a text prompt that is hashed as is.
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        normalized = prompt
+    else:
+        normalized = json.dumps([_normalize_message(message) for message in messages], sort_keys=True, default=repr) \
+            if isinstance(messages, list) else prompt
+    return hashlib.sha256(f"{normalized}\n{llm_string}".encode("utf-8")).hexdigest()
+
+
+def _dump_generations(generations: Sequence[Generation]) -> str:
+    return json.dumps([
+        {"message": message_to_dict(generation.message), "generation_info": generation.generation_info}
+        if isinstance(generation, ChatGeneration)
+        else {"text": generation.text, "generation_info": generation.generation_info}
+        for generation in generations
+    ], default=repr)
+
+
+def _load_generations(value: str) -> list[Generation]:
+    return [
+        ChatGeneration(message=messages_from_dict([entry["message"]])[0], generation_info=entry["generation_info"])
+        if "message" in entry
+        else Generation(text=entry["text"], generation_info=entry["generation_info"])
+        for entry in json.loads(value)
+    ]
+
+
+def _mark_hit(generations: Sequence[Generation]) -> list[Generation]:
+    """Copies of the cached generations flagged as cache hits, the cached ones are left untouched"""
+    return [
+        generation.model_copy(update={"generation_info": {**(generation.generation_info or {}), CACHE_HIT_INFO_KEY: True}})
+        for generation in generations
+    ]
+
+
+@dataclass
+class _CacheEntry:
+    generations: list[Generation]
+    expires_at: float
+
+
+@final
+class LLMResponseCache(BaseCache):
+    """
+    LangChain cache of llm responses, installed with set_llm_cache by the runtime.
+
+    A retried or redelivered task rebuilds the same prompt from the thread history and gets the cached response
+    instead of paying the llm again. Responses are kept in memory with LRU eviction and a TTL, and optionally in a
+    SQLite file that the worker processes share. Generations served from the cache are flagged in their
+    generation_info so the callback handler streams them to the ui like a live response.
+    """
+
+    def __init__(self, config: LLMCacheConfig):
+        self.config = config
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._sqlite = SQLiteStore(config.sqlite_path, "llm_cache") if config.sqlite_path else None
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @override
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = cache_key(prompt, llm_string)
+        generations = self._memory_get(key)
+        if generations is None and self._sqlite:
+            generations = self._sqlite_get(key)
+        return self._record_lookup(generations)
+
+    @override
+    async def alookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = cache_key(prompt, llm_string)
+        generations = self._memory_get(key)
+        if generations is None and self._sqlite:
+            # Only the disk tier leaves the event loop
+            generations = await asyncio.get_running_loop().run_in_executor(None, self._sqlite_get, key)
+        return self._record_lookup(generations)
+
+    @override
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        key = cache_key(prompt, llm_string)
+        self._memory_set(key, return_val, self.config.ttl_seconds)
+        if self._sqlite:
+            self._sqlite_set(key, return_val)
+
+    @override
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        key = cache_key(prompt, llm_string)
+        self._memory_set(key, return_val, self.config.ttl_seconds)
+        if self._sqlite:
+            await asyncio.get_running_loop().run_in_executor(None, self._sqlite_set, key, return_val)
+
+    @override
+    def clear(self, **kwargs: Any):
+        with self._lock:
+            self._entries.clear()
+        if self._sqlite:
+            self._sqlite.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def _record_lookup(self, generations: list[Generation] | None) -> RETURN_VAL_TYPE | None:
+        with self._lock:
+            if generations is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return _mark_hit(generations)
+
+    def _memory_get(self, key: str) -> list[Generation] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry.generations
+
+    def _memory_set(self, key: str, generations: Sequence[Generation], ttl: float):
+        with self._lock:
+            self._entries[key] = _CacheEntry(list(generations), time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.config.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _sqlite_get(self, key: str) -> list[Generation] | None:
+        assert self._sqlite is not None
+        try:
+            cached = self._sqlite.get(key)
+        except Exception as e:
+            # A broken disk tier only costs an llm call
+            logger.warning("Failed to read the llm cache: %s", e)
+            return None
+        if cached is None:
+            return None
+
+        value, ttl = cached
+        generations = _load_generations(value)
+        # Promoted to memory for the rest of its time to live
+        self._memory_set(key, generations, ttl)
+        return generations
+
+    def _sqlite_set(self, key: str, generations: Sequence[Generation]):
+        assert self._sqlite is not None
+        try:
+            self._sqlite.set(key, _dump_generations(generations), self.config.ttl_seconds)
+        except Exception as e:
+            logger.warning("Failed to write the llm cache: %s", e)
@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+from typing import Any, final
+
+from .classes import LoggingConfig
+
+ROOT_LOGGER_NAME = "jarvis_kit"
+# Per-thread debug records go through their own logger, so sampled threads are traced whatever the sdk level is
+THREAD_DEBUG_LOGGER_NAME = f"{ROOT_LOGGER_NAME}.thread_debug"
+
+# Attributes of every LogRecord, anything else on a record was passed with `extra=` and is a structured field
+_RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+_SAMPLE_BUCKETS = 10000
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger of an sdk module, a child of the "jarvis_kit" logger"""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def _structured_fields(record: logging.LogRecord) -> dict[str, Any]:
+    return {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES}
+
+
+@final
+class TextFormatter(logging.Formatter):
+    """`time level logger: message key=value ...`"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _structured_fields(record)
+        if not fields:
+            return line
+        return f"{line} " + " ".join(f"{key}={value}" for key, value in fields.items())
+
+
+@final
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with the message, the `extra=` fields and the worker id in multi-process mode"""
+
+    def __init__(self):
+        super().__init__()
+        # Imported here since the supervisor logs through this module. Read once, the worker id of a process does not change
+        from .supervisor import WORKER_ID_ENV
+        self.worker_id = os.getenv(WORKER_ID_ENV)
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_structured_fields(record)
+        }
+        if self.worker_id is not None:
+            entry["worker_id"] = self.worker_id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _StdoutHandler(logging.StreamHandler):  # type: ignore[type-arg]
+    """Writes to the current sys.stdout like print does, so redirections of stdout still apply"""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):  # type: ignore[override]
+        return sys.stdout
+
+
+_config = LoggingConfig()
+_debug_threads: set[str] = set()
+logging.getLogger(THREAD_DEBUG_LOGGER_NAME).setLevel(logging.DEBUG)
+
+
+def configure_logging(config: LoggingConfig):
+    """Set the level, format and thread debug sampling of the sdk loggers"""
+    global _config
+    _config = config
+    _debug_threads.clear()
+    _debug_threads.update(config.debug_threads)
+
+    sdk_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    sdk_logger.setLevel(config.level)
+    if config.install_handler:
+        handler = next((handler for handler in sdk_logger.handlers if isinstance(handler, _StdoutHandler)), None)
+        if handler is None:
+            handler = _StdoutHandler()
+            sdk_logger.addHandler(handler)
+            # The records are already written, do not print them again through the application's root handlers
+            sdk_logger.propagate = False
+        handler.setFormatter(JsonFormatter() if config.format == "json" else TextFormatter())
+
+
+def set_thread_debug(thread_id: str, enabled: bool = True):
+    """Start or stop tracing a thread, it applies to the tasks started afterwards"""
+    if enabled:
+        _debug_threads.add(thread_id)
+    else:
+        _debug_threads.discard(thread_id)
+
+
+def is_thread_debug(thread_id: str) -> bool:
+    """
+    Whether the callbacks of this thread log every event.
+    Decided once per task, so the callbacks of the other threads only check a boolean.
+    """
+    if thread_id in _debug_threads or os.getenv("DEBUG", "false").lower() == "true":
+        return True
+    if _config.debug_sample_rate <= 0:
+        return False
+    # Stable across tasks and processes, a sampled thread is traced from its first to its last task
+    return zlib.crc32(thread_id.encode("utf-8")) % _SAMPLE_BUCKETS < _config.debug_sample_rate * _SAMPLE_BUCKETS
@@ -0,0 +1,324 @@
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, TypeVar, final
+
+from .classes import MetricsConfig
+from .logger import get_logger
+
+logger = get_logger("metrics")
+
+LabelValues = tuple[str, ...]
+
+# Buckets in seconds
+RUN_DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+EMIT_LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        # Updated from the event loop and from the sync socket.io threads
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+@final
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels: str):
+        """Mirror a total counted by another component (a cache, the outbound queue), from the collectors"""
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+@final
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class _HistogramValue:
+    def __init__(self, bucket_count: int):
+        # Per-bucket (non cumulative) counts, the last one is +Inf
+        self.counts = [0] * (bucket_count + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+@final
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: Iterable[float] = RUN_DURATION_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[LabelValues, _HistogramValue] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram_value = self._values.get(key)
+            if histogram_value is None:
+                histogram_value = self._values[key] = _HistogramValue(len(self.buckets))
+            histogram_value.counts[index] += 1
+            histogram_value.sum += value
+            histogram_value.count += 1
+
+    def count(self, **labels: str) -> int:
+        histogram_value = self._values.get(self._label_values(labels))
+        return histogram_value.count if histogram_value else 0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(value.counts), value.sum, value.count) for key, value in self._values.items()]
+
+        samples: list[str] = []
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                labels = _format_labels((*self.labelnames, "le"), (*key, _format_value(bound)))
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            samples.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            samples.append(f"{self.name}_count{labels} {count}")
+        return samples
+
+
+@final
+class MetricsRegistry:
+    """Holds the metrics of a process and renders them in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        # Called before every render, to refresh the gauges computed from other components' stats
+        self._collectors: list[Callable[[], None]] = []
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: Iterable[float] = RUN_DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.exception("Metrics collector failed: %s", e)
+
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+@final
+class RuntimeMetrics:
+    """The metrics recorded by the runtime, the RabbitMQ subscriber and the callback handlers"""
+
+    def __init__(self, prefix: str = "jarvis_kit"):
+        self.registry = registry = MetricsRegistry()
+
+        # Tasks
+        self.tasks_in_flight = registry.gauge(f"{prefix}_tasks_in_flight", "Tasks currently running", ("agent",))
+        self.tasks_waiting = registry.gauge(f"{prefix}_tasks_waiting", "Tasks received and waiting for their thread or a worker slot", ("agent",))
+        self.tasks_total = registry.counter(f"{prefix}_tasks_total", "Finished tasks", ("agent", "status"))
+        self.task_retries_total = registry.counter(f"{prefix}_task_retries_total", "Failed tasks scheduled for a retry", ("agent",))
+        self.tasks_parked_total = registry.counter(f"{prefix}_tasks_parked_total", "Tasks moved to the parking queue", ("agent",))
+        self.run_duration_seconds = registry.histogram(f"{prefix}_run_duration_seconds", "Agent run duration", ("agent",), RUN_DURATION_BUCKETS)
+        self.max_concurrent_workers = registry.gauge(f"{prefix}_max_concurrent_workers", "Current worker limit")
+
+        # Streaming
+        self.time_to_first_token_seconds = registry.histogram(
+            f"{prefix}_llm_time_to_first_token_seconds", "Time from the llm start to its first streamed token", ("model",), TOKEN_LATENCY_BUCKETS
+        )
+        self.inter_token_latency_seconds = registry.histogram(
+            f"{prefix}_llm_inter_token_latency_seconds", "Time between two streamed tokens of the same llm run", ("model",), TOKEN_LATENCY_BUCKETS
+        )
+        self.agui_events_total = registry.counter(f"{prefix}_agui_events_total", "AG-UI events sent to the runtime", ("type", "codec"))
+        self.agui_encode_seconds = registry.histogram(f"{prefix}_agui_encode_seconds", "Time to encode an AG-UI event frame", (), EMIT_LATENCY_BUCKETS)
+        self.agui_emit_seconds = registry.histogram(f"{prefix}_agui_emit_seconds", "Time to emit AG-UI event frames on the socket", (), EMIT_LATENCY_BUCKETS)
+        self.outbound_queue_depth = registry.gauge(f"{prefix}_outbound_queue_depth", "AG-UI events waiting in the outbound queue")
+        self.outbound_dropped_events_total = registry.counter(f"{prefix}_outbound_dropped_events_total", "AG-UI events dropped by the outbound queue")
+
+        # Thread history
+        self.history_fetch_seconds = registry.histogram(
+            f"{prefix}_history_fetch_seconds", "Thread history http request latency, retries included", ("status",), HTTP_LATENCY_BUCKETS
+        )
+        self.history_fetch_saved_requests_total = registry.counter(
+            f"{prefix}_history_fetch_saved_requests_total", "History fetches served by a concurrent caller's request"
+        )
+        self.thread_cache_hits_total = registry.counter(f"{prefix}_thread_cache_hits_total", "Thread history cache hits")
+        self.thread_cache_misses_total = registry.counter(f"{prefix}_thread_cache_misses_total", "Thread history cache misses")
+        self.thread_cache_hit_ratio = registry.gauge(f"{prefix}_thread_cache_hit_ratio", "Thread history cache hit ratio")
+        self.thread_cache_entries = registry.gauge(f"{prefix}_thread_cache_entries", "Threads in the history cache")
+        self.thread_cache_bytes = registry.gauge(f"{prefix}_thread_cache_bytes", "Estimated size of the history cache")
+
+        # Chat model registry
+        self.model_clients = registry.gauge(f"{prefix}_model_clients", "Chat model clients in the registry, with and without bound tools")
+        self.model_registry_hits_total = registry.counter(f"{prefix}_model_registry_hits_total", "Chat model clients reused from the registry")
+        self.model_registry_misses_total = registry.counter(f"{prefix}_model_registry_misses_total", "Chat model clients created by the registry")
+
+        # Client tool responses
+        self.client_responses_waiting = registry.gauge(f"{prefix}_client_responses_waiting", "Client tool calls waiting for their response")
+        self.client_response_orphans = registry.gauge(f"{prefix}_client_response_orphans", "Client responses kept for a tool that does not wait for them")
+
+        # Tool result cache
+        self.tool_cache_lookups_total = registry.counter(f"{prefix}_tool_cache_lookups_total", "Tool result cache lookups", ("tool", "result"))
+
+        # Llm response cache
+        self.llm_cache_hits_total = registry.counter(f"{prefix}_llm_cache_hits_total", "Llm calls answered from the response cache")
+        self.llm_cache_misses_total = registry.counter(f"{prefix}_llm_cache_misses_total", "Llm calls not found in the response cache")
+        self.llm_cache_entries = registry.gauge(f"{prefix}_llm_cache_entries", "Responses in the in-memory llm cache")
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    server: "_MetricsHTTPServer"
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != self.server.path:
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object):
+        # Scrapes are frequent, do not print a line for each of them
+        pass
+
+
+class _MetricsHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], metrics: RuntimeMetrics, path: str):
+        super().__init__(address, _MetricsRequestHandler)
+        self.metrics = metrics
+        self.path = path
+
+
+@final
+class MetricsServer:
+    """Serves the Prometheus text exposition of the metrics from a background thread"""
+
+    def __init__(self, metrics: RuntimeMetrics, config: MetricsConfig, port: int | None = None):
+        self.metrics = metrics
+        self.config = config
+        self.port = config.port if port is None else port
+        self._server: _MetricsHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._server = _MetricsHTTPServer((self.config.host, self.port), self.metrics, self.config.path)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="jarvis-kit-metrics", daemon=True)
+        self._thread.start()
+        logger.info("Metrics available on http://%s:%d%s", self.config.host, self._server.server_address[1], self.config.path)
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,157 @@
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from functools import lru_cache
+from typing import Any, final
+
+from langchain.chat_models import init_chat_model
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from .classes import ModelRegistryConfig
+from .logger import get_logger
+
+logger = get_logger("models")
+
+# Tools recently bound, by object id, so a tool bound on every call is only converted to its schema once
+_MAX_TOOL_KEYS = 1024
+
+
+@lru_cache(maxsize=256)
+def _args_schema_key(args_schema: type) -> str:
+    return json.dumps(args_schema.model_json_schema(), sort_keys=True, default=repr)  # type: ignore[attr-defined]
+
+
+def _schema_key(tool: Any) -> str:
+    """Identifies the schema sent to the model, so new instances of the same tool share the bound client"""
+    if isinstance(tool, BaseTool) and isinstance(tool.args_schema, type) and hasattr(tool.args_schema, "model_json_schema"):
+        # Converting a new tool instance rebuilds its call schema, the schema of its args class is enough to identify it
+        return json.dumps([type(tool).__qualname__, tool.name, tool.description, _args_schema_key(tool.args_schema)])
+    return json.dumps(convert_to_openai_tool(tool), sort_keys=True, default=repr)
+
+
+@final
+class ModelRegistry:
+    """
+    Shared chat model clients, keyed by model, init params and bound tools.
+
+    A client (and its http connection pool) is created once and reused by every task of the worker instead of
+    being built by init_chat_model on every node call, and bind_tools is only called once per set of tools.
+    Chat model clients are safe to share between concurrent tasks, the callbacks are given per call.
+    """
+
+    def __init__(self, config: ModelRegistryConfig):
+        self.config = config
+        self._clients: OrderedDict[str, BaseChatModel] = OrderedDict()
+        self._bound: OrderedDict[tuple[str, str, str], Runnable[LanguageModelInput, BaseMessage]] = OrderedDict()
+        self._tool_keys: OrderedDict[int, tuple[Any, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        model: str,
+        tools: Sequence[Any] = (),
+        tool_choice: str | None = None,
+        **params: Any
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """
+        Chat model client of `model` created with the init_chat_model `params`, with `tools` bound when given.
+        Usage in a graph node: `get_runtime().models.get("openai:gpt-4.1-nano", tools=[my_tool], temperature=0, streaming=True)`
+        """
+        client_key = self._client_key(model, params)
+        if not tools:
+            return self._client(client_key, model, params)
+
+        key = (client_key, self._tools_key(tools), tool_choice or "")
+        with self._lock:
+            bound = self._bound.get(key)
+            if bound is not None:
+                self._bound.move_to_end(key)
+                self.hits += 1
+                return bound
+
+        client = self._client(client_key, model, params)
+        bound = client.bind_tools(list(tools), tool_choice=tool_choice) if tool_choice else client.bind_tools(list(tools))
+        with self._lock:
+            self._bound[key] = bound
+            while len(self._bound) > self.config.max_clients:
+                self._bound.popitem(last=False)
+        return bound
+
+    def _client(self, client_key: str, model: str, params: dict[str, Any]) -> BaseChatModel:
+        with self._lock:
+            client = self._clients.get(client_key)
+            if client is not None:
+                self._clients.move_to_end(client_key)
+                self.hits += 1
+                return client
+            self.misses += 1
+
+        # Built outside the lock, two tasks missing the same key at once only build one extra client
+        client = init_chat_model(model=model, **params)
+        with self._lock:
+            client = self._clients.setdefault(client_key, client)
+            while len(self._clients) > self.config.max_clients:
+                self._clients.popitem(last=False)
+        return client
+
+    @staticmethod
+    def _client_key(model: str, params: dict[str, Any]) -> str:
+        return json.dumps({"model": model, **params}, sort_keys=True, default=repr)
+
+    def _tools_key(self, tools: Sequence[Any]) -> str:
+        return "|".join(self._tool_key(tool) for tool in tools)
+
+    def _tool_key(self, tool: Any) -> str:
+        with self._lock:
+            cached = self._tool_keys.get(id(tool))
+            # The tool is referenced by the entry, so its id cannot be reused by another object
+            if cached is not None and cached[0] is tool:
+                self._tool_keys.move_to_end(id(tool))
+                return cached[1]
+
+        key = _schema_key(tool)
+        with self._lock:
+            self._tool_keys[id(tool)] = (tool, key)
+            while len(self._tool_keys) > _MAX_TOOL_KEYS:
+                self._tool_keys.popitem(last=False)
+        return key
+
+    async def warmup(self):
+        """Create the preloaded clients and open their connections, on the event loop that will use them"""
+        for spec in self.config.preload:
+            client = self._client(self._client_key(spec.model, spec.params), spec.model, spec.params)
+            if spec.tools:
+                self.get(spec.model, tools=spec.tools, **spec.params)
+            if not self.config.warm_connections:
+                continue
+            try:
+                if await self._warm_connection(client):
+                    logger.info("Connection of %s warmed up", spec.model)
+            except Exception as e:
+                # A failed warmup only means the first call opens the connection
+                logger.warning("Failed to warm up the connection of %s: %s", spec.model, e)
+
+    @staticmethod
+    async def _warm_connection(client: BaseChatModel) -> bool:
+        # OpenAI compatible clients expose their sdk client, listing the models opens a pooled connection without using tokens
+        models = getattr(getattr(client, "root_async_client", None), "models", None)
+        if models is None:
+            return False
+        await models.list()
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "bound_clients": len(self._bound),
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,264 @@
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, IO, final
+from ag_ui.core.events import Event, CustomEvent
+
+from .classes import OutboundQueueConfig
+from .agui_util import encode_event
+from .logger import get_logger
+
+logger = get_logger("outbound")
+
+# A JSON `agui_event` frame, or a msgpack frame once the runtime accepted that codec
+AguiPayload = dict[str, Any] | bytes
+
+
+@dataclass
+class OutboundEvent:
+    thread_id: str
+    session_id: str
+    event: Event
+    order: int
+    enqueued_at: float
+
+
+def build_agui_payload(thread_id: str, session_id: str, event: Event, order: int) -> dict[str, Any]:
+    """Build the `agui_event` frame sent to the runtime"""
+    return {
+        "threadId": thread_id,
+        "sessionId": session_id,
+        "event": encode_event(event),
+        "order": order
+    }
+
+
+@final
+class OutboundEventQueue:
+    """
+    Bounded queue between the callback handlers and the runtime socket.
+    Callbacks put already-ordered events and a single drainer task encodes and emits them in batches,
+    so agent execution never waits on network I/O unless the queue is full and the policy is "block".
+    """
+
+    def __init__(
+        self,
+        config: OutboundQueueConfig,
+        emit_batch: Callable[[list[AguiPayload]], Awaitable[None]],
+        build_payload: Callable[[str, str, Event, int], AguiPayload] = build_agui_payload
+    ):
+        self.config = config
+        self.emit_batch = emit_batch
+        self.build_payload = build_payload
+
+        self._queue: deque[OutboundEvent] = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._drainer: asyncio.Task[None] | None = None
+        self._in_flight = 0
+
+        # Spill file state, once something is spilled every new event goes to the file until it is drained
+        self._spill_file: IO[str] | None = None
+        self._spill_read_offset = 0
+        self._spilled = 0
+
+        # Stats
+        self.emitted = 0
+        self.dropped = 0
+        self.spilled_total = 0
+        self.last_drain_latency = 0.0
+        self.max_drain_latency = 0.0
+        self.avg_drain_latency = 0.0
+
+    # Lifecycle
+    def start(self):
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.get_running_loop().create_task(self._drain())
+
+    async def close(self):
+        """Emit everything still waiting and stop the drainer"""
+        while (self.depth > 0 or self._in_flight > 0) and self._drainer and not self._drainer.done():
+            await asyncio.sleep(0.01)
+
+        if self._drainer:
+            self._drainer.cancel()
+            await asyncio.gather(self._drainer, return_exceptions=True)
+            self._drainer = None
+
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
+
+    @property
+    def depth(self) -> int:
+        """Number of events waiting to be emitted, in memory and on disk"""
+        return len(self._queue) + self._spilled
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "spilled": self._spilled,
+            "spilled_total": self.spilled_total,
+            "emitted": self.emitted,
+            "dropped": self.dropped,
+            "last_drain_latency_ms": self.last_drain_latency * 1000,
+            "max_drain_latency_ms": self.max_drain_latency * 1000,
+            "avg_drain_latency_ms": self.avg_drain_latency * 1000,
+        }
+
+    # Producers
+    async def put(self, thread_id: str, session_id: str, event: Event, order: int):
+        self.start()
+        item = OutboundEvent(thread_id, session_id, event, order, time.monotonic())
+
+        while not self._try_put(item):
+            # Only the "block" policy (or a custom event that can not be dropped) ends up here
+            self._not_full.clear()
+            await self._not_full.wait()
+
+    def put_nowait(self, thread_id: str, session_id: str, event: Event, order: int):
+        """
+        Put an event from sync code.
+        Sync callers can not wait, so a full queue with the "block" policy grows past max_size.
+        """
+        self.start()
+        item = OutboundEvent(thread_id, session_id, event, order, time.monotonic())
+
+        if not self._try_put(item):
+            self._append(item)
+
+    def _try_put(self, item: OutboundEvent) -> bool:
+        if self._spilled > 0:
+            self._spill(item)
+            return True
+
+        if len(self._queue) < self.config.max_size:
+            self._append(item)
+            return True
+
+        if self.config.overflow_policy == "spill":
+            self._spill(item)
+            return True
+
+        if self.config.overflow_policy == "drop_superseded" and self._drop_superseded(item):
+            self._append(item)
+            return True
+
+        return False
+
+    def _append(self, item: OutboundEvent):
+        self._queue.append(item)
+        self._not_empty.set()
+
+    def _drop_superseded(self, item: OutboundEvent) -> bool:
+        """Drop the oldest queued custom event that the new event replaces"""
+        if not self._is_replace_event(item.event):
+            return False
+
+        name = item.event.name  # type: ignore[attr-defined]
+        for queued in self._queue:
+            if (
+                queued.thread_id == item.thread_id
+                and self._is_replace_event(queued.event)
+                and queued.event.name == name  # type: ignore[attr-defined]
+            ):
+                self._queue.remove(queued)
+                self.dropped += 1
+                return True
+        return False
+
+    @staticmethod
+    def _is_replace_event(event: Event) -> bool:
+        return (
+            isinstance(event, CustomEvent)
+            and isinstance(event.value, dict)
+            and event.value.get("strategy") == "replace"
+        )
+
+    # Spill to disk
+    def _spill(self, item: OutboundEvent):
+        if self._spill_file is None:
+            if self.config.spill_path:
+                self._spill_file = open(self.config.spill_path, "w+", encoding="utf-8")
+            else:
+                self._spill_file = tempfile.TemporaryFile("w+", encoding="utf-8")
+
+        payload = self.build_payload(item.thread_id, item.session_id, item.event, item.order)
+        self._spill_file.seek(0, os.SEEK_END)
+        # Binary frames are kept as base64 in the JSON lines of the file
+        record = {"enqueued_at": item.enqueued_at, "frame": base64.b64encode(payload).decode("ascii")} \
+            if isinstance(payload, bytes) else {"enqueued_at": item.enqueued_at, "payload": payload}
+        self._spill_file.write(json.dumps(record, default=str) + "\n")
+        self._spilled += 1
+        self.spilled_total += 1
+        self._not_empty.set()
+
+    def _read_spilled(self, limit: int) -> list[tuple[float, AguiPayload]]:
+        assert self._spill_file is not None
+
+        self._spill_file.seek(self._spill_read_offset)
+        records: list[tuple[float, AguiPayload]] = []
+        while len(records) < limit:
+            line = self._spill_file.readline()
+            if not line:
+                break
+            record = json.loads(line)
+            records.append((record["enqueued_at"], base64.b64decode(record["frame"]) if "frame" in record else record["payload"]))
+        self._spill_read_offset = self._spill_file.tell()
+        self._spilled -= len(records)
+
+        if self._spilled <= 0:
+            # Everything on disk has been read, start over with an empty file
+            self._spilled = 0
+            self._spill_read_offset = 0
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+
+        return records
+
+    # Consumer
+    async def _drain(self):
+        while True:
+            await self._not_empty.wait()
+
+            batch: list[tuple[float, AguiPayload]] = []
+            while self._queue and len(batch) < self.config.batch_size:
+                item = self._queue.popleft()
+                batch.append((item.enqueued_at, self.build_payload(item.thread_id, item.session_id, item.event, item.order)))
+
+            # The memory queue only holds events older than the spilled ones
+            if not batch and self._spilled > 0:
+                batch = self._read_spilled(self.config.batch_size)
+
+            if not self._queue and self._spilled == 0:
+                self._not_empty.clear()
+            self._not_full.set()
+
+            if not batch:
+                continue
+
+            self._in_flight = len(batch)
+            try:
+                await self.emit_batch([payload for _, payload in batch])
+                self.emitted += len(batch)
+            except Exception as e:
+                logger.error("Failed to emit %d agui events: %s", len(batch), e)
+                self.dropped += len(batch)
+            finally:
+                self._in_flight = 0
+
+            now = time.monotonic()
+            for enqueued_at, _ in batch:
+                self._record_latency(now - enqueued_at)
+
+    def _record_latency(self, latency: float):
+        self.last_drain_latency = latency
+        self.max_drain_latency = max(self.max_drain_latency, latency)
+        # Exponential moving average to smooth out single slow batches
+        self.avg_drain_latency = latency if self.avg_drain_latency == 0 else self.avg_drain_latency * 0.9 + latency * 0.1
@@ -1,9 +1,23 @@
 import asyncio
 import aio_pika
 import json
+import math
 import ssl
+import time
+from collections.abc import Sequence
 from typing import Callable, final, Awaitable, cast
-from .classes import MessageEvent
+from urllib.parse import urlsplit
+from .classes import MessageEvent, RetryConfig, ConcurrencyConfig, AgentSchedulingConfig
+from .scheduler import KeyedScheduler
+from .retry import DelayedRetry
+from .concurrency import AdaptiveConcurrencyController
+from .metrics import RuntimeMetrics
+from .logger import get_logger
+
+logger = get_logger("rabbitmq")
+
+# Default prefetch_count per worker slot
+PREFETCH_PER_WORKER = 4
 
 @final
 class AsyncRabbitMQSubscriber:
@@ -11,7 +25,12 @@ class AsyncRabbitMQSubscriber:
         self, 
         url: str,
         ssl_context: ssl.SSLContext | None = None,
-        max_concurrent_workers: int = 1
+        max_concurrent_workers: int = 1,
+        prefetch_count: int | None = None,
+        retry_config: RetryConfig | None = None,
+        concurrency_config: ConcurrencyConfig | None = None,
+        metrics: RuntimeMetrics | None = None,
+        agent_scheduling: dict[str, AgentSchedulingConfig] | None = None
     ):
         self.url = url
         self.ssl_context = ssl_context
@@ -20,8 +39,24 @@ class AsyncRabbitMQSubscriber:
         self.channel: aio_pika.RobustChannel | None = None
         
         self.max_concurrent_workers = max_concurrent_workers
-        self.semaphore = asyncio.Semaphore(max_concurrent_workers)
+        # Messages waiting for their thread also count against the prefetch, so it defaults to a multiple of the worker count:
+        # with only one message per worker, the queued tasks of a busy thread would hold every slot and block the other threads
+        self.prefetch_count = prefetch_count or max_concurrent_workers * PREFETCH_PER_WORKER
+        # Tasks of the same thread run one at a time, different threads run in parallel up to max_concurrent_workers,
+        # the worker slots are shared between the agents by their weight, priority and concurrency cap
+        self.scheduler = KeyedScheduler(max_concurrent_workers, agent_scheduling)
         self.active_tasks: set[asyncio.Task[None]] = set()
+        self.retry_config = retry_config or RetryConfig()
+        self.metrics = metrics or RuntimeMetrics()
+        
+        self.concurrency_controller: AdaptiveConcurrencyController | None = None
+        if concurrency_config:
+            self.concurrency_controller = AdaptiveConcurrencyController(
+                concurrency_config,
+                initial_limit=max_concurrent_workers,
+                resize=self.set_max_concurrent_workers,
+                is_saturated=lambda: self.scheduler.semaphore.waiting > 0 or self.scheduler.semaphore.in_use >= self.scheduler.max_concurrency
+            )
 
     async def connect(self) -> None:
         try:
@@ -39,79 +74,125 @@ class AsyncRabbitMQSubscriber:
             self.channel = await self.connection.channel()
             assert self.channel is not None  # Type narrowing for linter
             
-            await self.channel.set_qos(prefetch_count=self.max_concurrent_workers)
-            print("Connected to RabbitMQ")
+            await self.channel.set_qos(prefetch_count=self.prefetch_count)
+            logger.info("Connected to RabbitMQ")
             
         except aio_pika.exceptions.AMQPConnectionError as e:
-            print(f"AMQP connection failed: {e}. Check if URL uses correct protocol/port (amqp://:5672 or amqps://:5671) and SSL matches server config.")
+            logger.error("AMQP connection failed: %s. Check if URL uses correct protocol/port (amqp://:5672 or amqps://:5671) and SSL matches server config.", e)
             raise
         except Exception as e:
-            print(f"Failed to connect to RabbitMQ: {e}")
-            print(f"Connection details: {self.url}")
+            logger.error("Failed to connect to RabbitMQ at %s: %s", self._redacted_url(), e)
             raise
     
+    def _redacted_url(self) -> str:
+        password = urlsplit(self.url).password
+        return self.url.replace(f":{password}@", ":***@", 1) if password else self.url
+    
+    async def set_max_concurrent_workers(self, max_concurrent_workers: int) -> None:
+        """Resize the worker limit and the channel prefetch while consuming"""
+        # Keep the configured prefetch to workers ratio
+        prefetch_count = max(max_concurrent_workers, math.ceil(max_concurrent_workers * self.prefetch_count / self.max_concurrent_workers))
+        
+        self.max_concurrent_workers = max_concurrent_workers
+        self.prefetch_count = prefetch_count
+        self.scheduler.set_max_concurrency(max_concurrent_workers)
+        if self.concurrency_controller:
+            self.concurrency_controller.limit = max_concurrent_workers
+        
+        if self.channel and not self.channel.is_closed:
+            await self.channel.set_qos(prefetch_count=prefetch_count)
+    
     async def declare_queue(self, queue_name: str, durable: bool = True) -> None:
         if not self.channel:
             raise RuntimeError("Channel not initialized. Call connect() first.")
         
         await self.channel.declare_queue(queue_name, durable=durable)
-        print(f"Queue '{queue_name}' declared")
+        logger.info("Queue '%s' declared", queue_name)
     
     async def subscribe(
         self,
         queue_name: str,
-        callback: Callable[[MessageEvent], Awaitable[bool]]
+        callback: Callable[[MessageEvent], Awaitable[bool]],
+        additional_queue_names: Sequence[str] = ()
     ) -> None:
+        """
+        Consume `queue_name` and `additional_queue_names` until cancelled.
+        Each queue has its own consumer (so its own prefetch window) and its own retry and parking queues.
+        """
         if not self.channel:
             raise RuntimeError("Channel not initialized. Call connect() first.")
 
+        for name in [queue_name, *additional_queue_names]:
+            await self._consume(name, callback)
+        logger.info(
+            "Subscribed to %d queues with %d concurrent workers. Waiting for messages...",
+            1 + len(additional_queue_names), self.max_concurrent_workers
+        )
+        
+        if self.concurrency_controller:
+            self.concurrency_controller.start()
+        
+        # Keep the consumer running indefinitely
+        try:
+            await asyncio.Future()  # Run forever
+        except asyncio.CancelledError:
+            logger.info("Consumer cancelled")
+        except KeyboardInterrupt:
+            logger.info("Consumer interrupted by user")
+        finally:
+            if self.concurrency_controller:
+                await self.concurrency_controller.stop()
+            
+            # Wait for all active tasks to complete
+            if self.active_tasks:
+                logger.info("Waiting for %d active tasks to complete...", len(self.active_tasks))
+                await asyncio.gather(*self.active_tasks, return_exceptions=True)
+
+    async def _consume(self, queue_name: str, callback: Callable[[MessageEvent], Awaitable[bool]]) -> None:
+        assert self.channel is not None
         queue = await self.channel.declare_queue(queue_name, durable=True)
-        print(f"Queue '{queue_name}' declared")
+        logger.info("Queue '%s' declared", queue_name)
+        
+        retry = DelayedRetry(self.retry_config, queue_name)
+        await retry.setup(self.channel)
+        
         async def process_message(message: aio_pika.abc.AbstractIncomingMessage) -> None:
-            async with self.semaphore:
-                async with message.process(ignore_processed=True):
-                    headers = message.headers or {}
-                    retry_count = int(cast(str, headers.get("x-retry", 0)))
-
-                    if retry_count > 2:
-                        print("Max retries reached. Discarding message.")
-                        await message.reject(requeue=False)
-                        return
-
-                    try:
-                        body = message.body.decode("utf-8")
-                        event = MessageEvent(json.loads(body))
-
-                        success = await callback(event)
-
-                        if success:
-                            await message.ack()
-                            print("Message processed successfully")
-                        else:
-                            print("Message processing failed. Retrying...")
-                            await message.ack()  # Acknowledge before re-publish
-                            await asyncio.sleep(3)
-
-                            new_headers = dict(headers)
-                            new_headers["x-retry"] = retry_count + 1
-
-                            if self.channel:
-                                await self.channel.default_exchange.publish( # type: ignore
-                                    aio_pika.Message(
-                                        body=message.body,
-                                        headers=new_headers,
-                                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-                                    ),
-                                    routing_key=queue_name
-                                )
-
-                    except json.JSONDecodeError as e:
-                        print(f"JSON decode error: {e}")
-                        await message.reject(requeue=False)
-
-                    except Exception as e:
-                        print(f"Unhandled exception: {e}")
-                        await message.reject(requeue=True)
+            async with message.process(ignore_processed=True):
+                headers = dict(message.headers or {})
+                retry_count = int(cast(str, headers.get("x-retry", 0)))
+
+                if retry_count > self.retry_config.max_retries and self.channel:
+                    await retry.park(self.channel, message.body, headers)
+                    self.metrics.tasks_parked_total.inc(agent=self._agent_name(message.body))
+                    await message.ack()
+                    return
+
+                try:
+                    body = message.body.decode("utf-8")
+                    event = MessageEvent(json.loads(body))
+
+                    success = await self._run_task(callback, event)
+
+                    if success:
+                        await message.ack()
+                        logger.debug("Message processed successfully", extra={"agent": event.agent_name, "thread_id": event.message["thread"]})
+                    else:
+                        # The worker slot is already released, the retry queue delays the next attempt
+                        logger.warning("Message processing failed. Retrying...", extra={"agent": event.agent_name, "thread_id": event.message["thread"]})
+                        if self.channel:
+                            if await retry.retry(self.channel, message.body, headers, retry_count):
+                                self.metrics.task_retries_total.inc(agent=event.agent_name)
+                            else:
+                                self.metrics.tasks_parked_total.inc(agent=event.agent_name)
+                        await message.ack()  # Acknowledge after the retry is safely published
+
+                except json.JSONDecodeError as e:
+                    logger.error("JSON decode error: %s", e)
+                    await message.reject(requeue=False)
+
+                except Exception as e:
+                    logger.exception("Unhandled exception: %s", e)
+                    await message.reject(requeue=True)
 
         async def wrapper(message: aio_pika.abc.AbstractIncomingMessage) -> None:
             # Create a task for each message to enable concurrent processing
@@ -124,26 +205,47 @@ class AsyncRabbitMQSubscriber:
             
             task.add_done_callback(cleanup_task)
 
+        # The channel prefetch applies to every consumer separately
         await queue.consume(wrapper)
-        print(f"Subscribed to queue '{queue_name}' with {self.max_concurrent_workers} concurrent workers. Waiting for messages...")
-        
-        # Keep the consumer running indefinitely
+
+    async def _run_task(self, callback: Callable[[MessageEvent], Awaitable[bool]], event: MessageEvent) -> bool:
+        agent = event.agent_name
+        self.metrics.tasks_waiting.inc(agent=agent)
+        waiting = True
         try:
-            await asyncio.Future()  # Run forever
-        except asyncio.CancelledError:
-            print("Consumer cancelled")
-        except KeyboardInterrupt:
-            print("Consumer interrupted by user")
+            # Wait for the previous tasks of the same thread before taking a worker slot
+            async with self.scheduler.slot(event.message["thread"], agent):
+                self.metrics.tasks_waiting.dec(agent=agent)
+                waiting = False
+                self.metrics.tasks_in_flight.inc(agent=agent)
+                
+                started_at = time.monotonic()
+                success = False
+                try:
+                    success = await callback(event)
+                    return success
+                finally:
+                    duration = time.monotonic() - started_at
+                    self.metrics.tasks_in_flight.dec(agent=agent)
+                    self.metrics.run_duration_seconds.observe(duration, agent=agent)
+                    self.metrics.tasks_total.inc(agent=agent, status="success" if success else "failure")
+                    if self.concurrency_controller:
+                        self.concurrency_controller.record_run(duration, success)
         finally:
-            # Wait for all active tasks to complete
-            if self.active_tasks:
-                print(f"Waiting for {len(self.active_tasks)} active tasks to complete...")
-                await asyncio.gather(*self.active_tasks, return_exceptions=True)
+            if waiting:
+                self.metrics.tasks_waiting.dec(agent=agent)
+    
+    @staticmethod
+    def _agent_name(body: bytes) -> str:
+        try:
+            return json.loads(body).get("agentName", "unknown")
+        except (ValueError, AttributeError):
+            return "unknown"
 
     async def close(self) -> None:
         # Cancel all active tasks
         if self.active_tasks:
-            print(f"Cancelling {len(self.active_tasks)} active tasks...")
+            logger.info("Cancelling %d active tasks...", len(self.active_tasks))
             for task in self.active_tasks:
                 task.cancel()
             
@@ -157,4 +259,4 @@ class AsyncRabbitMQSubscriber:
         if self.connection and not self.connection.is_closed:
             await self.connection.close()
 
-        print("RabbitMQ connection closed")
+        logger.info("RabbitMQ connection closed")
@@ -0,0 +1,86 @@
+import random
+from typing import Any, final
+import aio_pika
+from aio_pika.abc import AbstractChannel
+
+from .classes import RetryConfig
+from .logger import get_logger
+
+logger = get_logger("retry")
+
+
+@final
+class DelayedRetry:
+    """
+    Delayed retries through RabbitMQ instead of sleeping inside a worker slot.
+
+    Each attempt has its own retry queue `{queue}:retry:{attempt}`. Failed tasks are published there with a
+    per-message TTL (exponential backoff with jitter) and dead-lettered back to the task queue when it expires.
+    All messages of a retry queue share the same base delay, so the jitter only delays a message behind
+    the head of its queue by at most the jitter range. Tasks that run out of attempts go to `{queue}:parking`.
+    """
+
+    def __init__(self, config: RetryConfig, queue_name: str):
+        self.config = config
+        self.queue_name = queue_name
+
+    def retry_queue_name(self, attempt: int) -> str:
+        return f"{self.queue_name}:retry:{attempt}"
+
+    @property
+    def parking_queue_name(self) -> str:
+        return f"{self.queue_name}:parking"
+
+    async def setup(self, channel: AbstractChannel):
+        for attempt in range(1, self.config.max_retries + 1):
+            await channel.declare_queue(
+                self.retry_queue_name(attempt),
+                durable=True,
+                arguments={
+                    # Expired messages go back to the task queue through the default exchange
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self.queue_name,
+                }
+            )
+        await channel.declare_queue(self.parking_queue_name, durable=True)
+
+    def delay_for(self, attempt: int) -> float:
+        """Backoff delay in seconds of a retry attempt (starting at 1)"""
+        delay = min(self.config.max_delay, self.config.base_delay * 2 ** (attempt - 1))
+        return delay * (1 + random.uniform(-self.config.jitter, self.config.jitter))
+
+    async def retry(self, channel: AbstractChannel, body: bytes, headers: dict[str, Any], retry_count: int) -> bool:
+        """
+        Schedule the next attempt of a failed task, or park it when it ran out of attempts.
+        Returns False when the task was parked.
+        """
+        attempt = retry_count + 1
+        if attempt > self.config.max_retries:
+            await self.park(channel, body, headers)
+            return False
+
+        delay = self.delay_for(attempt)
+        # x-death is added by RabbitMQ on every dead-lettering, it is not needed to route the retry
+        retry_headers = {key: value for key, value in headers.items() if key != "x-death"}
+        await channel.default_exchange.publish(
+            aio_pika.Message(
+                body=body,
+                headers={**retry_headers, "x-retry": attempt},
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                expiration=delay
+            ),
+            routing_key=self.retry_queue_name(attempt)
+        )
+        logger.info("Task scheduled for retry %d/%d in %.2fs", attempt, self.config.max_retries, delay)
+        return True
+
+    async def park(self, channel: AbstractChannel, body: bytes, headers: dict[str, Any]):
+        await channel.default_exchange.publish(
+            aio_pika.Message(
+                body=body,
+                headers=headers,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+            ),
+            routing_key=self.parking_queue_name
+        )
+        logger.warning("Max retries reached. Task moved to '%s'", self.parking_queue_name)
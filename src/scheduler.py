@@ -0,0 +1,176 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, final
+
+from .classes import AgentSchedulingConfig
+
+
+class _Flow:
+    def __init__(self, config: AgentSchedulingConfig):
+        self.config = config
+        self.in_use = 0
+        self.waiters: deque[asyncio.Future[None]] = deque()
+        # Virtual time at which the flow's last granted slot "finishes", advanced by 1 / weight per grant
+        self.finish = 0.0
+
+    def can_run(self) -> bool:
+        return self.config.max_concurrency is None or self.in_use < self.config.max_concurrency
+
+
+@final
+class WeightedFairSemaphore:
+    """
+    Semaphore whose slots are shared by flows (the agents), and whose limit can be changed while tasks hold or wait for it.
+
+    When several flows wait, free slots go to the highest priority first, then by start-time fair queuing:
+    each grant advances the flow's virtual finish time by 1 / weight and the flow with the smallest start time is served,
+    so backlogged flows get slots in proportion to their weights. A flow that was idle starts at the current
+    virtual time instead of using the credit of its idle period. Flows never exceed their max_concurrency,
+    and tasks of the same flow are served in arrival order.
+    """
+
+    def __init__(self, limit: int, flows: dict[str, AgentSchedulingConfig] | None = None):
+        self._limit = limit
+        self._in_use = 0
+        self._configs = dict(flows or {})
+        self._flows: dict[str, _Flow] = {}
+        # Start time of the last granted slot
+        self._virtual_time = 0.0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(flow.waiters) for flow in self._flows.values())
+
+    def set_limit(self, limit: int):
+        # Lowering the limit never interrupts running tasks, new tasks wait until enough slots are released
+        self._limit = limit
+        self._wake_up()
+
+    def set_flow_config(self, name: str, config: AgentSchedulingConfig):
+        self._configs[name] = config
+        if name in self._flows:
+            self._flows[name].config = config
+        self._wake_up()
+
+    def _flow(self, name: str) -> _Flow:
+        flow = self._flows.get(name)
+        if flow is None:
+            flow = self._flows[name] = _Flow(self._configs.get(name) or AgentSchedulingConfig())
+        return flow
+
+    def _start_time(self, flow: _Flow) -> float:
+        return max(flow.finish, self._virtual_time)
+
+    def _grant(self, flow: _Flow):
+        start = self._start_time(flow)
+        flow.finish = start + 1 / flow.config.weight
+        self._virtual_time = start
+        flow.in_use += 1
+        self._in_use += 1
+
+    async def acquire(self, flow_name: str = ""):
+        flow = self._flow(flow_name)
+        # Waiters that could run are always woken up as soon as a slot is free, so a free slot means nobody eligible waits
+        if self._in_use < self._limit and flow.can_run() and not flow.waiters:
+            self._grant(flow)
+            return
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        flow.waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over right before the cancellation
+                self.release(flow_name)
+            elif future in flow.waiters:
+                # A release() running before this task resumed may already have popped the cancelled future
+                flow.waiters.remove(future)
+            raise
+
+    def release(self, flow_name: str = ""):
+        flow = self._flows[flow_name]
+        flow.in_use -= 1
+        self._in_use -= 1
+        if flow.in_use == 0 and not flow.waiters and flow.finish <= self._virtual_time:
+            # Idle flows restart at the current virtual time anyway
+            del self._flows[flow_name]
+        self._wake_up()
+
+    def _next_flow(self) -> _Flow | None:
+        eligible = [flow for flow in self._flows.values() if flow.waiters and flow.can_run()]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda flow: (-flow.config.priority, self._start_time(flow)))
+
+    def _wake_up(self):
+        while self._in_use < self._limit:
+            flow = self._next_flow()
+            if flow is None:
+                return
+            future = flow.waiters.popleft()
+            if not future.done():
+                self._grant(flow)
+                future.set_result(None)
+
+    def in_use_by_flow(self) -> dict[str, int]:
+        return {name: flow.in_use for name, flow in self._flows.items() if flow.in_use}
+
+
+class _KeyLock:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+@final
+class KeyedScheduler:
+    """
+    Runs at most one task per key at a time, while tasks of different keys run in parallel up to max_concurrency.
+    Tasks of the same key wait on the key (in arrival order) before taking a worker slot,
+    so a queue of same-thread tasks never holds slots that other threads could use.
+    The worker slots are shared between flows (the agents) by weighted fair queuing, see WeightedFairSemaphore.
+    """
+
+    def __init__(self, max_concurrency: int, flows: dict[str, AgentSchedulingConfig] | None = None):
+        self.semaphore = WeightedFairSemaphore(max_concurrency, flows)
+        self._keys: dict[str, _KeyLock] = {}
+
+    @property
+    def max_concurrency(self) -> int:
+        return self.semaphore.limit
+
+    def set_max_concurrency(self, max_concurrency: int):
+        self.semaphore.set_limit(max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self, key: str, flow: str = "") -> AsyncIterator[None]:
+        key_lock = self._keys.get(key)
+        if key_lock is None:
+            key_lock = self._keys[key] = _KeyLock()
+        key_lock.users += 1
+
+        try:
+            async with key_lock.lock:
+                await self.semaphore.acquire(flow)
+                try:
+                    yield
+                finally:
+                    self.semaphore.release(flow)
+        finally:
+            key_lock.users -= 1
+            if key_lock.users == 0:
+                self._keys.pop(key, None)
+
+    def waiting(self) -> dict[str, int]:
+        """Tasks running or waiting per key"""
+        return {key: key_lock.users for key, key_lock in self._keys.items()}
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, TypeVar, final
+
+T = TypeVar("T")
+
+
+class _SyncCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+@final
+class SingleFlight:
+    """
+    Deduplicate concurrent calls for the same key.
+    The first caller runs the call, the callers arriving while it is in flight wait for and share its result.
+    """
+
+    def __init__(self):
+        self._async_calls: dict[str, asyncio.Future[Any]] = {}
+        self._sync_calls: dict[str, _SyncCall] = {}
+        self._lock = threading.Lock()
+
+        # Number of callers (leader included) currently waiting on each key
+        self._in_flight: dict[str, int] = {}
+        # Number of calls that were served by another caller's result
+        self.shared_calls = 0
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        The call runs in its own task that every caller awaits through a shield, so a cancelled caller (the first one
+        included) only stops waiting: the other callers still get the result. Without callers left the call still completes.
+        """
+        task = self._async_calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._async_calls[key] = task
+            task.add_done_callback(lambda done: self._finish_async(key, done))
+            self._enter(key)
+        else:
+            self._join(key)
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._leave(key)
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync_calls[key] = _SyncCall()
+                self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            else:
+                self._join_locked(key)
+        assert call is not None
+
+        if not leader:
+            try:
+                call.done.wait()
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            finally:
+                self._leave(key)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._sync_calls.pop(key, None)
+            call.done.set()
+            self._leave(key)
+
+    def _finish_async(self, key: str, task: asyncio.Future[Any]):
+        if self._async_calls.get(key) is task:
+            del self._async_calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved so there is no warning when every caller was cancelled
+            task.exception()
+
+    def in_flight(self) -> dict[str, int]:
+        """Callers currently waiting per key, every caller after the first one is a saved request"""
+        with self._lock:
+            return dict(self._in_flight)
+
+    def _enter(self, key: str):
+        with self._lock:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def _join(self, key: str):
+        with self._lock:
+            self._join_locked(key)
+
+    def _join_locked(self, key: str):
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        self.shared_calls += 1
+
+    def _leave(self, key: str):
+        with self._lock:
+            count = self._in_flight.get(key, 0) - 1
+            if count > 0:
+                self._in_flight[key] = count
+            else:
+                self._in_flight.pop(key, None)
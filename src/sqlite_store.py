@@ -0,0 +1,48 @@
+import sqlite3
+import threading
+import time
+from typing import final
+
+# Expired rows are deleted every this many writes
+_PRUNE_INTERVAL = 256
+
+
+@final
+class SQLiteStore:
+    """Text values with an expiry time in a SQLite table, shared by the worker processes and kept across restarts"""
+
+    def __init__(self, path: str, table: str):
+        self.table = table
+        # One connection used from the executor threads, serialized by the lock
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        """Value and remaining time to live of a key, None when it is missing or expired"""
+        with self._lock:
+            row = self._connection.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return None
+        return value, ttl
+
+    def set(self, key: str, value: str, ttl_seconds: float):
+        with self._lock:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl_seconds)
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_INTERVAL == 0:
+                self._connection.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute(f"DELETE FROM {self.table}")
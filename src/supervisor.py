@@ -0,0 +1,173 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from multiprocessing.process import BaseProcess
+from multiprocessing.sharedctypes import Synchronized
+from typing import Any, Awaitable, Callable, final
+
+from .classes import SupervisorConfig, LoggingConfig
+from .logger import configure_logging, get_logger
+
+logger = get_logger("supervisor")
+
+WORKER_ID_ENV = "JARVIS_KIT_WORKER_ID"
+
+
+async def _heartbeat(heartbeat: "Synchronized[float]", interval: float):
+    # Written from the worker's event loop, so a blocked loop stops the heartbeat too
+    while True:
+        heartbeat.value = time.time()
+        await asyncio.sleep(interval)
+
+
+async def _run_worker(bootstrap: Callable[[], Awaitable[Any]], heartbeat: "Synchronized[float]", interval: float):
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+    assert main_task is not None
+
+    # Cancelling the main task lets serve() wait for the active tasks before the worker exits
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, main_task.cancel)
+
+    heartbeat_task = loop.create_task(_heartbeat(heartbeat, interval))
+    try:
+        await bootstrap()
+    except asyncio.CancelledError:
+        logger.info("Worker %s stopped", os.getenv(WORKER_ID_ENV))
+    finally:
+        heartbeat_task.cancel()
+
+
+def _worker_main(
+    bootstrap: Callable[[], Awaitable[Any]],
+    worker_id: int,
+    heartbeat: "Synchronized[float]",
+    heartbeat_interval: float
+):
+    os.environ[WORKER_ID_ENV] = str(worker_id)
+    asyncio.run(_run_worker(bootstrap, heartbeat, heartbeat_interval))
+
+
+class _Worker:
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.process: BaseProcess | None = None
+        self.heartbeat: Synchronized[float] | None = None
+        self.restarts: deque[float] = deque()
+
+
+@final
+class WorkerSupervisor:
+    """
+    Runs the agent runtime in several worker processes to use more than one CPU core.
+
+    `bootstrap` is the async function that builds the runtime and calls `serve()`, it runs once in every worker
+    so each worker has its own socket connection, RabbitMQ channel and event loop.
+    It must be importable by the workers (a module level function).
+    Workers that crash or stop sending heartbeats are restarted, and SIGINT/SIGTERM stops every worker gracefully.
+    Agents must use a checkpointer shared between processes (e.g. Postgres), an in-memory one is per worker.
+    """
+
+    def __init__(self, bootstrap: Callable[[], Awaitable[Any]], config: SupervisorConfig):
+        self.bootstrap = bootstrap
+        self.config = config
+        self.context = multiprocessing.get_context(config.start_method)
+        self.workers = [_Worker(worker_id) for worker_id in range(config.workers)]
+        self._stopping = False
+
+    def run(self) -> int:
+        """Start the workers and supervise them until a stop signal, returns the exit code"""
+        signal.signal(signal.SIGTERM, self._on_stop_signal)
+        signal.signal(signal.SIGINT, self._on_stop_signal)
+
+        for worker in self.workers:
+            self._start(worker)
+        logger.info("Supervisor started %d workers", len(self.workers))
+
+        exit_code = 0
+        while not self._stopping:
+            time.sleep(self.config.check_interval)
+            for worker in self.workers:
+                if self._stopping:
+                    break
+                if not self._check(worker):
+                    exit_code = 1
+                    self._stopping = True
+
+        self.shutdown()
+        return exit_code
+
+    def shutdown(self):
+        """Ask every worker to stop, and kill the ones still running after the shutdown timeout"""
+        alive = [worker.process for worker in self.workers if worker.process and worker.process.is_alive()]
+        logger.info("Stopping %d workers...", len(alive))
+        for process in alive:
+            process.terminate()
+
+        deadline = time.monotonic() + self.config.shutdown_timeout
+        for process in alive:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker pid %s did not stop in time, killing it", process.pid)
+                process.kill()
+                process.join()
+
+        logger.info("All workers stopped")
+
+    def _on_stop_signal(self, signum: int, frame: Any):
+        self._stopping = True
+
+    def _start(self, worker: _Worker):
+        worker.heartbeat = self.context.Value("d", time.time())
+        worker.process = self.context.Process(
+            target=_worker_main,
+            args=(self.bootstrap, worker.worker_id, worker.heartbeat, self.config.heartbeat_interval),
+            name=f"jarvis-kit-worker-{worker.worker_id}",
+            daemon=False
+        )
+        worker.process.start()
+        logger.info("Worker %d started with pid %s", worker.worker_id, worker.process.pid)
+
+    def _check(self, worker: _Worker) -> bool:
+        """Restart the worker when it died or hangs, returns False when it restarts too often"""
+        assert worker.process is not None and worker.heartbeat is not None
+
+        if worker.process.is_alive():
+            silence = time.time() - worker.heartbeat.value
+            if silence < self.config.heartbeat_timeout:
+                return True
+
+            logger.warning("Worker %d sent no heartbeat for %.0fs, restarting it", worker.worker_id, silence)
+            worker.process.kill()
+            worker.process.join()
+        else:
+            logger.warning("Worker %d exited with code %s, restarting it", worker.worker_id, worker.process.exitcode)
+
+        now = time.monotonic()
+        worker.restarts.append(now)
+        while worker.restarts and worker.restarts[0] < now - self.config.restart_window:
+            worker.restarts.popleft()
+
+        if len(worker.restarts) > self.config.max_restarts:
+            logger.error("Worker %d restarted %d times in %ss, giving up", worker.worker_id, len(worker.restarts), self.config.restart_window)
+            return False
+
+        time.sleep(self.config.restart_delay)
+        self._start(worker)
+        return True
+
+
+def serve_multiprocess(
+    bootstrap: Callable[[], Awaitable[Any]],
+    config: SupervisorConfig | None = None,
+    logging_config: LoggingConfig | None = None
+) -> int:
+    """
+    Run `bootstrap` in supervised worker processes, one per CPU core by default.
+    `logging_config` applies to the supervisor, the workers are configured by the runtime they create.
+    """
+    configure_logging(logging_config or LoggingConfig())
+    return WorkerSupervisor(bootstrap, config or SupervisorConfig()).run()
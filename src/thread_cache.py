@@ -0,0 +1,250 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, final
+from langchain_core.messages import BaseMessage
+
+from .classes import ThreadCacheConfig
+
+# Rough per-message overhead (object headers, ids, metadata dicts) added to the content size
+_MESSAGE_OVERHEAD_BYTES = 256
+
+
+def estimate_message_size(message: Any) -> int:
+    """Approximate memory footprint of a message, used for the byte budget of the cache"""
+    if not isinstance(message, BaseMessage):
+        return _MESSAGE_OVERHEAD_BYTES
+
+    content = message.content
+    size = len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        size += len(json.dumps(tool_calls, default=str))
+    return size + _MESSAGE_OVERHEAD_BYTES
+
+
+@final
+class MessageLogView(Sequence[Any]):
+    """
+    Read-only view of the first `length` messages of a thread log.
+    The log is append-only, so the view stays valid without copying the messages.
+    """
+    __slots__ = ("_messages", "_length")
+
+    def __init__(self, messages: list[Any], length: int):
+        self._messages = messages
+        self._length = length
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self._messages[i] for i in range(self._length)[index]]
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("message index out of range")
+        return self._messages[index]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[Any]:
+        return islice(self._messages, self._length)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"MessageLogView({list(self)!r})"
+
+
+@final
+class ThreadMessageLog:
+    """Append-only message history of a thread, appends are O(1) and snapshots share the same list"""
+    __slots__ = ("_messages",)
+
+    def __init__(self, messages: Iterable[Any] = ()):
+        self._messages: list[Any] = list(messages)
+
+    def append(self, message: Any):
+        self._messages.append(message)
+
+    def snapshot(self) -> MessageLogView:
+        return MessageLogView(self._messages, len(self._messages))
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+
+@dataclass
+class _CacheEntry:
+    log: ThreadMessageLog
+    size: int
+    expires_at: float
+
+
+@final
+class ThreadMessageCache:
+    """
+    Thread history cache with a maximum entry count, a total byte budget, per-entry TTL and LRU eviction.
+    Entries of crashed or cancelled runs are evicted eventually instead of being kept forever.
+
+    The synced histories of the incremental history sync (ThreadHistorySync) are kept here too, so they count against
+    the same byte budget. They outlive the runs, and are evicted before the histories of the running threads.
+    """
+
+    def __init__(self, config: ThreadCacheConfig):
+        self.config = config
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        # Thread id -> (synced history state, estimated size)
+        self._synced: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, thread_id: str) -> MessageLogView | None:
+        with self._lock:
+            entry = self._get_entry(thread_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry.log.snapshot()
+
+    def set(self, thread_id: str, messages: Iterable[Any]):
+        with self._lock:
+            self._remove(thread_id)
+            log = ThreadMessageLog(messages)
+            entry = _CacheEntry(
+                log=log,
+                size=sum(estimate_message_size(message) for message in log.snapshot()),
+                expires_at=time.monotonic() + self.config.ttl_seconds
+            )
+            self._entries[thread_id] = entry
+            self._total_bytes += entry.size
+            self._evict()
+
+    def append(self, thread_id: str, message: Any):
+        self.extend(thread_id, (message,))
+
+    def extend(self, thread_id: str, messages: Iterable[Any]):
+        """
+        Append several messages under one lock, a reader sees all of them or none.
+        Nothing is appended to a thread that is not cached (never loaded, expired or evicted): an entry holding only
+        the new messages would be read as the whole history, the next read fetches the full history instead.
+        """
+        with self._lock:
+            entry = self._get_entry(thread_id)
+            if entry is None:
+                return
+
+            for message in messages:
+                size = estimate_message_size(message)
+                entry.log.append(message)
+                entry.size += size
+                self._total_bytes += size
+            entry.expires_at = time.monotonic() + self.config.ttl_seconds
+            self._evict()
+
+    def delete(self, thread_id: str):
+        with self._lock:
+            self._remove(thread_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._synced.clear()
+            self._total_bytes = 0
+
+    # Synced histories
+    def get_synced(self, thread_id: str) -> Any | None:
+        with self._lock:
+            item = self._synced.get(thread_id)
+            if item is None:
+                return None
+            self._synced.move_to_end(thread_id)
+            return item[0]
+
+    def set_synced(self, thread_id: str, state: Any, size: int, max_threads: int):
+        """Keep the synced history of a thread, at most `max_threads` of them"""
+        with self._lock:
+            self._remove_synced(thread_id)
+            self._synced[thread_id] = (state, size)
+            self._total_bytes += size
+            while len(self._synced) > max_threads:
+                self._remove_synced(next(iter(self._synced)))
+            self._evict()
+
+    def delete_synced(self, thread_id: str):
+        with self._lock:
+            self._remove_synced(thread_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "synced_threads": len(self._synced),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    # Internal helpers, the lock must be held
+    def _get_entry(self, thread_id: str) -> _CacheEntry | None:
+        entry = self._entries.get(thread_id)
+        if entry is None:
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(thread_id)
+            self.expirations += 1
+            return None
+
+        self._entries.move_to_end(thread_id)
+        return entry
+
+    def _remove(self, thread_id: str):
+        entry = self._entries.pop(thread_id, None)
+        if entry is not None:
+            self._total_bytes -= entry.size
+
+    def _remove_synced(self, thread_id: str):
+        item = self._synced.pop(thread_id, None)
+        if item is not None:
+            self._total_bytes -= item[1]
+
+    def _evict(self):
+        # Synced histories only save a fetch, they go first
+        while self._synced and self._total_bytes > self.config.max_bytes:
+            self._remove_synced(next(iter(self._synced)))
+            self.evictions += 1
+        # The most recently used entry is never evicted, even when it is bigger than the whole budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.config.max_entries
+            or self._total_bytes > self.config.max_bytes
+        ):
+            thread_id, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry.size
+            self.evictions += 1
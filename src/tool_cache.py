@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, final
+
+from .classes import ToolCacheConfig
+from .logger import get_logger
+from .sqlite_store import SQLiteStore
+
+logger = get_logger("tool_cache")
+
+
+def tool_cache_key(tool_name: str, args: dict[str, Any]) -> str:
+    """Tool name and a hash of the canonical JSON of the args, the same args in any key order give the same key"""
+    canonical_args = json.dumps(args, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=repr)
+    return f"{tool_name}:{hashlib.sha256(canonical_args.encode('utf-8')).hexdigest()}"
+
+
+@final
+class ToolResultCache:
+    """
+    Results of deterministic tools, by tool name and canonical args.
+
+    Only the tools with a policy are cached, each with its own TTL and LRU bound in memory.
+    The optional SQLite tier is shared by the worker processes, so a retried task reuses the results of its first attempt
+    whatever worker runs it. The cached value is the content of the ToolMessage of the tool.
+    """
+
+    def __init__(self, config: ToolCacheConfig):
+        self.config = config
+        self._entries: dict[str, OrderedDict[str, tuple[float, Any]]] = {tool_name: OrderedDict() for tool_name in config.policies}
+        self._lock = threading.Lock()
+        self._sqlite = SQLiteStore(config.sqlite_path, "tool_cache") if config.sqlite_path else None
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+    def is_cached(self, tool_name: str) -> bool:
+        return tool_name in self.config.policies
+
+    def get(self, tool_name: str, args: dict[str, Any]) -> Any | None:
+        """Cached content of a tool call, None on a miss"""
+        key = tool_cache_key(tool_name, args)
+        content = self._memory_get(tool_name, key)
+        if content is None and self._sqlite:
+            content = self._sqlite_get(tool_name, key)
+        self._record_lookup(content)
+        return content
+
+    async def aget(self, tool_name: str, args: dict[str, Any]) -> Any | None:
+        key = tool_cache_key(tool_name, args)
+        content = self._memory_get(tool_name, key)
+        if content is None and self._sqlite:
+            # Only the disk tier leaves the event loop
+            content = await asyncio.get_running_loop().run_in_executor(None, self._sqlite_get, tool_name, key)
+        self._record_lookup(content)
+        return content
+
+    def set(self, tool_name: str, args: dict[str, Any], content: Any):
+        key = tool_cache_key(tool_name, args)
+        ttl = self.config.policies[tool_name].ttl_seconds
+        self._memory_set(tool_name, key, content, ttl)
+        if self._sqlite:
+            self._sqlite_set(key, content, ttl)
+
+    async def aset(self, tool_name: str, args: dict[str, Any], content: Any):
+        key = tool_cache_key(tool_name, args)
+        ttl = self.config.policies[tool_name].ttl_seconds
+        self._memory_set(tool_name, key, content, ttl)
+        if self._sqlite:
+            await asyncio.get_running_loop().run_in_executor(None, self._sqlite_set, key, content, ttl)
+
+    def clear(self):
+        with self._lock:
+            for entries in self._entries.values():
+                entries.clear()
+        if self._sqlite:
+            self._sqlite.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(len(entries) for entries in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _record_lookup(self, content: Any | None):
+        with self._lock:
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def _memory_get(self, tool_name: str, key: str) -> Any | None:
+        with self._lock:
+            entries = self._entries[tool_name]
+            entry = entries.get(key)
+            if entry is None:
+                return None
+            expires_at, content = entry
+            if expires_at <= time.monotonic():
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return content
+
+    def _memory_set(self, tool_name: str, key: str, content: Any, ttl: float):
+        with self._lock:
+            entries = self._entries[tool_name]
+            entries[key] = (time.monotonic() + ttl, content)
+            entries.move_to_end(key)
+            while len(entries) > self.config.policies[tool_name].max_entries:
+                entries.popitem(last=False)
+
+    def _sqlite_get(self, tool_name: str, key: str) -> Any | None:
+        assert self._sqlite is not None
+        try:
+            cached = self._sqlite.get(key)
+        except Exception as e:
+            # A broken disk tier only costs a tool run
+            logger.warning("Failed to read the tool cache: %s", e)
+            return None
+        if cached is None:
+            return None
+
+        value, ttl = cached
+        content = json.loads(value)
+        # Promoted to memory for the rest of its time to live
+        self._memory_set(tool_name, key, content, ttl)
+        return content
+
+    def _sqlite_set(self, key: str, content: Any, ttl: float):
+        assert self._sqlite is not None
+        try:
+            self._sqlite.set(key, json.dumps(content), ttl)
+        except Exception as e:
+            logger.warning("Failed to write the tool cache: %s", e)
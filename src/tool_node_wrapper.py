@@ -1,11 +1,49 @@
+import asyncio
 from collections.abc import Sequence
-from typing import Any, Callable, final, override
+from typing import Any, Callable, cast, final, override
+from uuid import UUID
+from langchain_core.callbacks import AsyncCallbackHandler, AsyncCallbackManagerForToolRun
+from langchain_core.messages import AIMessage, ToolCall, ToolMessage
 from langchain_core.tools import BaseTool
 from langgraph.prebuilt import ToolNode
+from langgraph.types import Command
 from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_async_callback_manager_for_config, get_callback_manager_for_config, patch_config
 
 from .init import get_runtime
 from .jarvis_runtime import JarvisKitRuntime
+from .classes import ToolCacheConfig
+from .tool_cache import ToolResultCache
+from .logger import get_logger
+
+logger = get_logger("tool_node")
+
+
+class _ToolRunRecorder(AsyncCallbackHandler):
+    """Remembers the tool run started by a single tool call, to end it when the call is cancelled by its timeout"""
+
+    def __init__(self):
+        self.run_id: UUID | None = None
+        self.parent_run_id: UUID | None = None
+        self.tags: list[str] | None = None
+
+    @override
+    async def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        # Tools called by the tool are nested runs, only the first one is the run of the tool call
+        if self.run_id is None:
+            self.run_id = run_id
+            self.parent_run_id = parent_run_id
+            self.tags = tags
 
 @final
 class JarvisKitToolNode(ToolNode):
@@ -17,8 +55,17 @@ class JarvisKitToolNode(ToolNode):
         tags: list[str] | None = None,
         handle_tool_errors: bool | str | Callable[..., str] | tuple[type[Exception], ...] = True,
         messages_key: str = "messages",
+        max_concurrency: int | None = None,
+        tool_timeout: float | None = None,
+        cache: ToolCacheConfig | None = None,
         **kwargs: Any
     ):
+        """
+        The tool calls of the last AI message run concurrently, at most `max_concurrency` at a time (no limit when None).
+        A tool call running longer than `tool_timeout` seconds is cancelled and answered with an error ToolMessage,
+        in ainvoke only: the sync invoke runs the tools in threads, which cannot be cancelled.
+        The results of the tools with a policy in `cache` are reused for the tool calls with the same args.
+        """
         super().__init__(
             *args,
             tools=tools,
@@ -29,6 +76,13 @@ class JarvisKitToolNode(ToolNode):
             **kwargs
         )
         self.jarvis_runtime: JarvisKitRuntime | None = None  # Lazy load runtime
+        self.max_concurrency = max_concurrency
+        self.tool_timeout = tool_timeout
+        self.tool_messages_key = messages_key
+        # Timeouts are reported like the tool errors, raised when the errors are not handled
+        self.handle_timeouts = handle_tool_errors is not False
+        self.tool_cache = ToolResultCache(cache) if cache else None
+        self._warned_sync_timeout = False
         
     @override
     def invoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
@@ -43,16 +97,38 @@ class JarvisKitToolNode(ToolNode):
         thread_id = config.get("configurable", {}).get("thread_id", "")
         input_state = self.jarvis_runtime.prepare_tool_input(thread_id, input)
         
-        if len(input_state.get("messages", [])) < 1  or input_state.get("messages", [])[-1].tool_calls[0].get("id") is None:
-            raise ValueError("There is no tool call id in the message history")
+        last_message, tool_calls = self._last_tool_calls(input_state)
+        order = {tool_call["id"]: index for index, tool_call in enumerate(tool_calls)}
         
-        response = super().invoke(
-            input=input_state,
-            config=config,
-            **kwargs
-        )
+        cached_results: list[ToolMessage] = []
+        if self.tool_cache:
+            cached_results = [result for tool_call in tool_calls if (result := self._cached_result(tool_call, config)) is not None]
+            answered = {result.tool_call_id for result in cached_results}
+            tool_calls = [tool_call for tool_call in tool_calls if tool_call["id"] not in answered]
+        
+        if self.tool_timeout is not None and not self._warned_sync_timeout:
+            self._warned_sync_timeout = True
+            logger.warning("tool_timeout is not applied by the sync invoke of the '%s' tool node, use ainvoke", self.name)
         
-        self.jarvis_runtime.put_store_message(thread_id, response.get("messages").pop())
+        response: Any = {self.tool_messages_key: []}
+        if tool_calls:
+            # ToolNode already runs the tool calls of a sync invoke in parallel threads, its executor is bounded by the config
+            response = super().invoke(
+                input={**input_state, "messages": [*input_state["messages"][:-1], last_message.model_copy(update={"tool_calls": tool_calls})]},
+                config=patch_config(config, max_concurrency=self.max_concurrency) if self.max_concurrency else config,
+                **kwargs
+            )
+            if self.tool_cache:
+                for tool_call, result in self._results_by_tool_call(tool_calls, response):
+                    if self._is_cacheable(tool_call, result):
+                        self.tool_cache.set(tool_call["name"], tool_call["args"], result.content)
+        if cached_results:
+            response = self._combine_outputs([{self.tool_messages_key: cached_results}, response])
+            if isinstance(response, dict):
+                # Back in the order of the tool calls
+                response[self.tool_messages_key].sort(key=lambda message: order.get(getattr(message, "tool_call_id", None), len(order)))
+        
+        self.jarvis_runtime.put_store_messages(thread_id, self._tool_messages(response))
         return response
     
     @override
@@ -67,16 +143,180 @@ class JarvisKitToolNode(ToolNode):
         assert self.jarvis_runtime is not None  # Type guard
         
         thread_id = config.get("configurable", {}).get("thread_id", "")
-        input_state = self.jarvis_runtime.prepare_tool_input(thread_id, input)
+        input_state = await self.jarvis_runtime.aprepare_tool_input(thread_id, input)
         
-        if len(input_state.get("messages", [])) < 1  or input_state.get("messages", [])[-1].tool_calls[0].get("id") is None:
-            raise ValueError("There is no tool call id in the message history")
+        last_message, tool_calls = self._last_tool_calls(input_state)
+        semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
         
-        response = await super().ainvoke(
-            input=input_state,
-            config=config,
-            **kwargs
+        async def run_tool_call(tool_call: ToolCall) -> Any:
+            if self.tool_cache and self.tool_cache.is_cached(tool_call["name"]):
+                cached_result = await self._acached_result(tool_call, config)
+                if cached_result is not None:
+                    return {self.tool_messages_key: [cached_result]}
+                output = await run_tool_call_uncached(tool_call)
+                for _, result in self._results_by_tool_call([tool_call], output):
+                    if self._is_cacheable(tool_call, result):
+                        await self.tool_cache.aset(tool_call["name"], tool_call["args"], result.content)
+                return output
+            return await run_tool_call_uncached(tool_call)
+        
+        async def run_tool_call_uncached(tool_call: ToolCall) -> Any:
+            # The other tool calls are removed from the message so the node only runs this one, with the same state
+            call_state = {
+                **input_state,
+                "messages": [*input_state["messages"][:-1], last_message.model_copy(update={"tool_calls": [tool_call]})]
+            }
+            if semaphore is None:
+                return await self._arun_tool_call(tool_call, call_state, config, **kwargs)
+            async with semaphore:
+                return await self._arun_tool_call(tool_call, call_state, config, **kwargs)
+        
+        # Each result is streamed to the ui by the callbacks as soon as its tool call finishes
+        outputs = await asyncio.gather(*(run_tool_call(tool_call) for tool_call in tool_calls))
+        response = self._combine_outputs(outputs)
+        
+        # All the results are stored at once, in the order of the tool calls
+        self.jarvis_runtime.put_store_messages(thread_id, self._tool_messages(response))
+        return response
+    
+    async def _arun_tool_call(self, tool_call: ToolCall, state: dict[str, Any], config: RunnableConfig, **kwargs: Any) -> Any:
+        if self.tool_timeout is None:
+            return await super().ainvoke(input=state, config=config, **kwargs)
+        
+        callback_manager = get_async_callback_manager_for_config(config)
+        recorder = _ToolRunRecorder()
+        callback_manager.add_handler(recorder, inherit=True)
+        try:
+            return await asyncio.wait_for(
+                super().ainvoke(input=state, config=patch_config(config, callbacks=callback_manager), **kwargs),
+                self.tool_timeout
+            )
+        except asyncio.TimeoutError:
+            error = TimeoutError(f"Tool '{tool_call['name']}' timed out after {self.tool_timeout}s")
+            # The cancelled tool does not end its run, the timeout is reported as its error
+            if recorder.run_id is not None:
+                await AsyncCallbackManagerForToolRun(
+                    run_id=recorder.run_id,
+                    handlers=callback_manager.handlers,
+                    inheritable_handlers=callback_manager.inheritable_handlers,
+                    parent_run_id=recorder.parent_run_id,
+                    tags=recorder.tags
+                ).on_tool_error(error, tool_call_id=tool_call["id"])
+            else:
+                # Cancelled before the tool started
+                await self._areport_tool_call(tool_call, config, error=error)
+            if not self.handle_timeouts:
+                raise error
+            return {self.tool_messages_key: [ToolMessage(
+                content=f"Error: {error}",
+                name=tool_call["name"],
+                tool_call_id=cast(str, tool_call["id"]),
+                status="error"
+            )]}
+    
+    # Tool result cache
+    async def _acached_result(self, tool_call: ToolCall, config: RunnableConfig) -> ToolMessage | None:
+        assert self.tool_cache is not None
+        content = await self.tool_cache.aget(tool_call["name"], tool_call["args"])
+        self._record_cache_lookup(tool_call, content is not None)
+        if content is None:
+            return None
+        result = self._cached_message(tool_call, content)
+        await self._areport_tool_call(tool_call, config, output=result)
+        return result
+    
+    def _cached_result(self, tool_call: ToolCall, config: RunnableConfig) -> ToolMessage | None:
+        assert self.tool_cache is not None
+        if not self.tool_cache.is_cached(tool_call["name"]):
+            return None
+        content = self.tool_cache.get(tool_call["name"], tool_call["args"])
+        self._record_cache_lookup(tool_call, content is not None)
+        if content is None:
+            return None
+        result = self._cached_message(tool_call, content)
+        self._report_tool_call(tool_call, config, output=result)
+        return result
+    
+    def _record_cache_lookup(self, tool_call: ToolCall, hit: bool):
+        assert self.jarvis_runtime is not None
+        self.jarvis_runtime.metrics.tool_cache_lookups_total.inc(tool=tool_call["name"], result="hit" if hit else "miss")
+    
+    @staticmethod
+    def _cached_message(tool_call: ToolCall, content: Any) -> ToolMessage:
+        # Answers the new tool call id, not the one the result was first computed for
+        return ToolMessage(content=content, name=tool_call["name"], tool_call_id=cast(str, tool_call["id"]))
+    
+    def _is_cacheable(self, tool_call: ToolCall, result: ToolMessage) -> bool:
+        # Errors are retried, and an artifact cannot be restored from the cached content
+        return (
+            self.tool_cache is not None
+            and self.tool_cache.is_cached(tool_call["name"])
+            and result.status != "error"
+            and result.artifact is None
+            and isinstance(result.content, (str, list))
         )
+    
+    def _results_by_tool_call(self, tool_calls: list[ToolCall], response: Any) -> list[tuple[ToolCall, ToolMessage]]:
+        """
+        Results of the tool calls answered by a plain {messages_key: [ToolMessage]} update.
+        Tool calls answered by a Command are left out, its state update and goto cannot be replayed from a cached content.
+        """
+        updates = response if isinstance(response, list) else [response]
+        results = {
+            message.tool_call_id: message
+            for update in updates if isinstance(update, dict)
+            for message in update.get(self.tool_messages_key, []) if isinstance(message, ToolMessage)
+        }
+        return [(tool_call, results[tool_call["id"]]) for tool_call in tool_calls if tool_call["id"] in results]
+    
+    # Tool calls answered by the node, reported to the callbacks like the runs of their tools
+    async def _areport_tool_call(self, tool_call: ToolCall, config: RunnableConfig, output: ToolMessage | None = None, error: BaseException | None = None):
+        callback_manager = get_async_callback_manager_for_config(config)
+        run_manager = await callback_manager.on_tool_start(
+            {"name": tool_call["name"]},
+            str(tool_call["args"]),
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"]
+        )
+        if error is not None:
+            await run_manager.on_tool_error(error, tool_call_id=tool_call["id"])
+        else:
+            await run_manager.on_tool_end(output)
+    
+    def _report_tool_call(self, tool_call: ToolCall, config: RunnableConfig, output: ToolMessage):
+        callback_manager = get_callback_manager_for_config(config)
+        run_manager = callback_manager.on_tool_start(
+            {"name": tool_call["name"]},
+            str(tool_call["args"]),
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"]
+        )
+        run_manager.on_tool_end(output)
+    
+    def _last_tool_calls(self, input_state: dict[str, Any]) -> tuple[AIMessage, list[ToolCall]]:
+        messages = input_state.get("messages", [])
+        tool_calls = getattr(messages[-1], "tool_calls", None) if messages else None
+        if not tool_calls or any(tool_call.get("id") is None for tool_call in tool_calls):
+            raise ValueError("There is no tool call id in the message history")
+        return messages[-1], tool_calls
+    
+    def _combine_outputs(self, outputs: list[Any]) -> Any:
+        """Merge the outputs of the single tool call runs like ToolNode merges the outputs of its tool calls"""
+        if all(isinstance(output, dict) for output in outputs):
+            return {self.tool_messages_key: [message for output in outputs for message in output[self.tool_messages_key]]}
         
-        self.jarvis_runtime.put_store_message(thread_id, response.get("messages").pop())
-        return response
\ No newline at end of file
+        # Tools returning a Command make the node return a list of updates
+        combined: list[Any] = []
+        for output in outputs:
+            combined.extend(output if isinstance(output, list) else [output])
+        return combined
+    
+    def _tool_messages(self, response: Any) -> list[ToolMessage]:
+        updates = response if isinstance(response, list) else [response]
+        messages: list[ToolMessage] = []
+        for update in updates:
+            if isinstance(update, Command):
+                update = update.update
+            if isinstance(update, dict):
+                messages.extend(message for message in update.get(self.tool_messages_key, []) if isinstance(message, ToolMessage))
+        return messages
\ No newline at end of file
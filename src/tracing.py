@@ -0,0 +1,318 @@
+import json
+import os
+import random
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, final
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointMetadata, CheckpointTuple, ChannelVersions
+
+from .classes import TracingConfig
+from .supervisor import WORKER_ID_ENV
+from .logger import get_logger
+
+logger = get_logger("tracing")
+
+# OTLP span status codes
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+
+AttributeValue = str | bool | int | float
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: str | None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: dict[str, AttributeValue] | None = None
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes: dict[str, AttributeValue] = attributes or {}
+        self.start_time = time.time_ns()
+        self.end_time: int | None = None
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds, up to now if the span is not ended"""
+        return ((self.end_time or time.time_ns()) - self.start_time) / 1e9
+
+    def set_attribute(self, key: str, value: AttributeValue | None):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        self.status_code = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> dict[str, Any]:
+        span: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status_code, "message": self.status_message} if self.status_message else {"code": self.status_code}
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_value(value: AttributeValue) -> dict[str, Any]:
+    # bool is checked first because it is a subclass of int
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, AttributeValue]) -> list[dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+@final
+class JsonLinesSpanExporter:
+    """
+    Writes spans as OTLP JSON (one ExportTraceServiceRequest per line), the format of the OpenTelemetry collector
+    file exporter, so traces can be inspected offline or replayed into a collector.
+    """
+
+    def __init__(self, path: str, service_name: str):
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Span]):
+        if not spans:
+            return
+
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes(self._resource_attributes())},
+                "scopeSpans": [{
+                    "scope": {"name": "jarvis-kit"},
+                    "spans": [span.to_otlp() for span in spans]
+                }]
+            }]
+        }
+        line = json.dumps(request, separators=(",", ":"), default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(line)
+
+    def _resource_attributes(self) -> dict[str, AttributeValue]:
+        attributes: dict[str, AttributeValue] = {"service.name": self.service_name, "process.pid": os.getpid()}
+        worker_id = os.getenv(WORKER_ID_ENV)
+        if worker_id is not None:
+            attributes["service.instance.id"] = worker_id
+        return attributes
+
+
+_current_span: ContextVar[Span | None] = ContextVar("jarvis_kit_current_span", default=None)
+
+
+@final
+class Tracer:
+    """
+    Creates spans and hands the ended ones to the exporter.
+    Ended spans are buffered and written when their trace's root span ends, or when batch_size spans are buffered.
+    """
+
+    def __init__(self, config: TracingConfig):
+        self.config = config
+        self.exporter = JsonLinesSpanExporter(self._exporter_path(config.path), config.service_name)
+        self._buffer: list[Span] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _exporter_path(path: str) -> str:
+        # Workers of the multi-process mode write to their own file
+        worker_id = os.getenv(WORKER_ID_ENV)
+        if worker_id is None:
+            return path
+        root, extension = os.path.splitext(path)
+        return f"{root}.{worker_id}{extension}"
+
+    @staticmethod
+    def current_span() -> Span | None:
+        return _current_span.get()
+
+    def start_span(
+        self,
+        name: str,
+        parent: Span | None = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: dict[str, AttributeValue] | None = None
+    ) -> Span:
+        """Start a span under `parent`, or under the current span when no parent is given"""
+        parent = parent or _current_span.get()
+        if parent is None:
+            return Span(name, f"{random.getrandbits(128):032x}", None, kind, attributes)
+        return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+
+    def end_span(self, span: Span, error: BaseException | None = None):
+        if span.end_time is not None:
+            return
+
+        span.end_time = time.time_ns()
+        if error is not None:
+            span.set_error(error)
+
+        with self._lock:
+            self._buffer.append(span)
+            if span.parent_span_id is not None and len(self._buffer) < self.config.batch_size:
+                return
+            spans, self._buffer = self._buffer, []
+
+        try:
+            self.exporter.export(spans)
+        except Exception as e:
+            logger.error("Failed to export %d spans: %s", len(spans), e)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: dict[str, AttributeValue] | None = None,
+        set_current: bool = True
+    ) -> Iterator[Span]:
+        """
+        Run the block in a new span.
+        With set_current, the span is the current span (the parent of new spans) inside the block,
+        it must be False in generators since the block is suspended at every yield.
+        """
+        span = self.start_span(name, kind=kind, attributes=attributes)
+        token = _current_span.set(span) if set_current else None
+        try:
+            yield span
+        except GeneratorExit:
+            # The consumer stopped iterating early, not an error
+            self.end_span(span)
+            raise
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            if token is not None:
+                _current_span.reset(token)
+
+    def flush(self):
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        self.exporter.export(spans)
+
+
+@final
+class TracedCheckpointSaver(BaseCheckpointSaver[Any]):
+    """Checkpointer wrapper recording a span for every checkpoint read and write of the wrapped checkpointer"""
+
+    def __init__(self, saver: BaseCheckpointSaver[Any], tracer: Tracer):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.tracer = tracer
+
+    @property
+    def config_specs(self) -> list[Any]:
+        return self.saver.config_specs
+
+    def __getattr__(self, name: str) -> Any:
+        # Checkpointer specific methods (setup, ...) are served by the wrapped checkpointer
+        return getattr(self.saver, name)
+
+    @contextmanager
+    def _span(self, operation: str, config: RunnableConfig) -> Iterator[Span]:
+        configurable = config.get("configurable", {})
+        with self.tracer.span(f"checkpoint.{operation}", kind=SPAN_KIND_CLIENT, attributes={
+            "checkpoint.operation": operation,
+            "checkpoint.saver": type(self.saver).__name__,
+            "thread.id": str(configurable.get("thread_id", "")),
+            "checkpoint.ns": str(configurable.get("checkpoint_ns", ""))
+        }, set_current=False) as span:
+            yield span
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        with self._span("get_tuple", config) as span:
+            checkpoint_tuple = self.saver.get_tuple(config)
+            span.set_attribute("checkpoint.found", checkpoint_tuple is not None)
+            return checkpoint_tuple
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        with self._span("get_tuple", config) as span:
+            checkpoint_tuple = await self.saver.aget_tuple(config)
+            span.set_attribute("checkpoint.found", checkpoint_tuple is not None)
+            return checkpoint_tuple
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None
+    ) -> Iterator[CheckpointTuple]:
+        with self._span("list", config or {}):
+            yield from self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        with self._span("list", config or {}):
+            async for checkpoint_tuple in self.saver.alist(config, filter=filter, before=before, limit=limit):
+                yield checkpoint_tuple
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        with self._span("put", config):
+            return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        with self._span("put", config):
+            return await self.saver.aput(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        with self._span("put_writes", config) as span:
+            span.set_attribute("checkpoint.writes", len(writes))
+            self.saver.put_writes(config, writes, task_id, task_path)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        with self._span("put_writes", config) as span:
+            span.set_attribute("checkpoint.writes", len(writes))
+            await self.saver.aput_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.saver.delete_thread(thread_id)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.saver.adelete_thread(thread_id)
+
+    def get_next_version(self, current: Any, channel: Any) -> Any:
+        return self.saver.get_next_version(current, channel)
@@ -0,0 +1,28 @@
+import unittest
+
+from src import JarvisKitRuntime, OutboundQueueConfig, SocketConfig
+
+
+class RuntimeMetricsTest(unittest.TestCase):
+    def test_render_with_an_outbound_queue(self):
+        runtime = JarvisKitRuntime(
+            namespace="test",
+            namespace_api_key="secret",
+            runtime_endpoint="http://runtime",
+            # The async client only connects in serve()
+            socket_config=SocketConfig(url="http://runtime", transport_mode="async"),
+            agents={},
+            max_concurrent_workers=1,
+            rabbitmq_config=None,
+            outbound_queue_config=OutboundQueueConfig()
+        )
+
+        with self.assertNoLogs("jarvis_kit", level="ERROR"):
+            output = runtime.metrics.render()
+        self.assertIn("jarvis_kit_outbound_queue_depth 0", output)
+        self.assertIn("jarvis_kit_outbound_dropped_events_total 0", output)
+        self.assertIn("# TYPE jarvis_kit_thread_cache_hits_total counter", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
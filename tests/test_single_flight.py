@@ -0,0 +1,65 @@
+"""
+Run with:
+    uv run python -m unittest discover -s tests -t .
+"""
+import asyncio
+import unittest
+
+from src.single_flight import SingleFlight
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_shares_the_result(self):
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def fetch() -> str:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "history"
+
+        results = await asyncio.gather(*(single_flight.ado("thread", fetch) for _ in range(3)))
+        self.assertEqual(results, ["history"] * 3)
+        self.assertEqual(calls, 1)
+        self.assertEqual(single_flight.shared_calls, 2)
+        self.assertEqual(single_flight.in_flight(), {})
+
+    async def test_cancelled_leader_does_not_cancel_the_followers(self):
+        single_flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def fetch() -> str:
+            started.set()
+            await asyncio.sleep(0.01)
+            return "history"
+
+        leader = asyncio.create_task(single_flight.ado("thread", fetch))
+        await started.wait()
+        follower = asyncio.create_task(single_flight.ado("thread", fetch))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(await follower, "history")
+        self.assertEqual(single_flight.in_flight(), {})
+
+    async def test_error_is_shared_and_the_next_call_runs_again(self):
+        single_flight = SingleFlight()
+
+        async def fail() -> str:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("runtime unavailable")
+
+        results = await asyncio.gather(single_flight.ado("thread", fail), single_flight.ado("thread", fail), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+        async def fetch() -> str:
+            return "history"
+
+        self.assertEqual(await single_flight.ado("thread", fetch), "history")
+
+
+if __name__ == "__main__":
+    unittest.main()
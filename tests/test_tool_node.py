@@ -0,0 +1,82 @@
+"""
+Run with:
+    uv run python -m unittest discover -s tests -t .
+"""
+import asyncio
+import unittest
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from langgraph.graph import START, MessagesState, StateGraph
+from langgraph.types import Command
+
+from src.classes import ToolCacheConfig, ToolCachePolicy
+from src.tool_node_wrapper import JarvisKitToolNode
+
+
+@tool
+async def slow_tool(query: str) -> str:
+    """Answers after a second"""
+    await asyncio.sleep(1)
+    return query
+
+
+class _ToolEvents(AsyncCallbackHandler):
+    def __init__(self):
+        self.events: list[tuple[str, Any]] = []
+
+    async def on_tool_start(self, serialized: Any, input_str: str, *, run_id: Any, **kwargs: Any):
+        self.events.append(("start", run_id))
+
+    async def on_tool_end(self, output: Any, *, run_id: Any, **kwargs: Any):
+        self.events.append(("end", run_id))
+
+    async def on_tool_error(self, error: BaseException, *, run_id: Any, **kwargs: Any):
+        self.events.append(("error", run_id))
+
+
+class ToolTimeoutTest(unittest.IsolatedAsyncioTestCase):
+    async def test_timeout_ends_the_tool_run(self):
+        tool_node = JarvisKitToolNode([slow_tool], tool_timeout=0.05)
+        tool_call = {"name": "slow_tool", "args": {"query": "weather"}, "id": "call_1", "type": "tool_call"}
+
+        async def run_tool(state: MessagesState, config: RunnableConfig):
+            return await tool_node._arun_tool_call(tool_call, dict(state), config)
+
+        graph = StateGraph(MessagesState)
+        graph.add_node("tools", run_tool)
+        graph.add_edge(START, "tools")
+        handler = _ToolEvents()
+        result = await graph.compile().ainvoke(
+            {"messages": [AIMessage(content="", tool_calls=[tool_call])]},
+            {"callbacks": [handler], "configurable": {"thread_id": "thread"}}
+        )
+
+        self.assertEqual(result["messages"][-1].status, "error")
+        # A single run, started by the tool and ended by the timeout
+        (start, start_run_id), (error, error_run_id) = handler.events
+        self.assertEqual((start, error), ("start", "error"))
+        self.assertEqual(start_run_id, error_run_id)
+
+
+class ToolCacheTest(unittest.TestCase):
+    def test_command_results_are_not_cached(self):
+        tool_node = JarvisKitToolNode([slow_tool], cache=ToolCacheConfig(policies={"slow_tool": ToolCachePolicy()}))
+        tool_calls = [
+            {"name": "slow_tool", "args": {"query": "weather"}, "id": "call_1", "type": "tool_call"},
+            {"name": "slow_tool", "args": {"query": "news"}, "id": "call_2", "type": "tool_call"},
+        ]
+        response = [
+            Command(update={"messages": [ToolMessage(content="sunny", tool_call_id="call_1")], "city": "Paris"}, goto="weather"),
+            {"messages": [ToolMessage(content="no news", tool_call_id="call_2")]},
+        ]
+
+        results = tool_node._results_by_tool_call(tool_calls, response)
+        self.assertEqual([tool_call["id"] for tool_call, _ in results], ["call_2"])
+
+
+if __name__ == "__main__":
+    unittest.main()